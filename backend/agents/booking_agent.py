@@ -2,7 +2,7 @@
 Booking Agent - Handles appointment booking, rescheduling, and cancellation.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from backend.core.orchestrator import orchestrator
 import logging
 
@@ -19,17 +19,28 @@ def book_appointment(appointment_data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Result from the booking agent
     """
+    task, context = _book_task(appointment_data)
+    logger.info(f"Booking Agent: Executing booking task for appointment")
+    result = orchestrator.execute_booking_task(task, context, cacheable=False)
+    
+    return result
+
+
+async def abook_appointment(appointment_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of book_appointment; the agent runs off the event loop."""
+    task, context = _book_task(appointment_data)
+    logger.info(f"Booking Agent: Executing booking task for appointment")
+    return await orchestrator.aexecute("booking", task, context, cacheable=False)
+
+
+def _book_task(appointment_data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
     task = f"Book an appointment for {appointment_data.get('patient_name', 'patient')} with {appointment_data.get('doctor_name', 'doctor')} on {appointment_data.get('date', 'date')} at {appointment_data.get('time', 'time')}"
     
     context = {
         "action": "book",
         "appointment_data": appointment_data
     }
-    
-    logger.info(f"Booking Agent: Executing booking task for appointment")
-    result = orchestrator.execute_booking_task(task, context)
-    
-    return result
+    return task, context
 
 
 def reschedule_appointment(appointment_id: str, new_date: str, new_time: str, reason: str = "") -> Dict[str, Any]:
@@ -45,6 +56,21 @@ def reschedule_appointment(appointment_id: str, new_date: str, new_time: str, re
     Returns:
         Result from the booking agent
     """
+    task, context = _reschedule_task(appointment_id, new_date, new_time, reason)
+    logger.info(f"Booking Agent: Executing reschedule task for appointment {appointment_id}")
+    result = orchestrator.execute_booking_task(task, context, cacheable=False)
+    
+    return result
+
+
+async def areschedule_appointment(appointment_id: str, new_date: str, new_time: str, reason: str = "") -> Dict[str, Any]:
+    """Async variant of reschedule_appointment."""
+    task, context = _reschedule_task(appointment_id, new_date, new_time, reason)
+    logger.info(f"Booking Agent: Executing reschedule task for appointment {appointment_id}")
+    return await orchestrator.aexecute("booking", task, context, cacheable=False)
+
+
+def _reschedule_task(appointment_id: str, new_date: str, new_time: str, reason: str) -> Tuple[str, Dict[str, Any]]:
     task = f"Reschedule appointment {appointment_id} to {new_date} at {new_time}"
     if reason:
         task += f". Reason: {reason}"
@@ -56,11 +82,7 @@ def reschedule_appointment(appointment_id: str, new_date: str, new_time: str, re
         "new_time": new_time,
         "reason": reason
     }
-    
-    logger.info(f"Booking Agent: Executing reschedule task for appointment {appointment_id}")
-    result = orchestrator.execute_booking_task(task, context)
-    
-    return result
+    return task, context
 
 
 def cancel_appointment(appointment_id: str, reason: str = "") -> Dict[str, Any]:
@@ -74,6 +96,21 @@ def cancel_appointment(appointment_id: str, reason: str = "") -> Dict[str, Any]:
     Returns:
         Result from the booking agent
     """
+    task, context = _cancel_task(appointment_id, reason)
+    logger.info(f"Booking Agent: Executing cancellation task for appointment {appointment_id}")
+    result = orchestrator.execute_booking_task(task, context, cacheable=False)
+    
+    return result
+
+
+async def acancel_appointment(appointment_id: str, reason: str = "") -> Dict[str, Any]:
+    """Async variant of cancel_appointment."""
+    task, context = _cancel_task(appointment_id, reason)
+    logger.info(f"Booking Agent: Executing cancellation task for appointment {appointment_id}")
+    return await orchestrator.aexecute("booking", task, context, cacheable=False)
+
+
+def _cancel_task(appointment_id: str, reason: str) -> Tuple[str, Dict[str, Any]]:
     task = f"Cancel appointment {appointment_id}"
     if reason:
         task += f". Reason: {reason}"
@@ -83,9 +120,5 @@ def cancel_appointment(appointment_id: str, reason: str = "") -> Dict[str, Any]:
         "appointment_id": appointment_id,
         "reason": reason
     }
-    
-    logger.info(f"Booking Agent: Executing cancellation task for appointment {appointment_id}")
-    result = orchestrator.execute_booking_task(task, context)
-    
-    return result
+    return task, context
 
@@ -2,45 +2,149 @@
 Pre-Visit Agent - Handles questionnaire collection and summarization.
 """
 
-from typing import Dict, Any, Optional
+import hashlib
+import json
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
 from backend.core.orchestrator import orchestrator
-from backend.core.config import settings
+from backend.core.llm_gateway import llm_gateway, LLMUnavailable
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Gemini integration for summarization
-gemini_model = None
+# Patient answers a summary is based on
+CLINICAL_FIELDS = (
+    "chief_complaint", "symptoms", "medical_history",
+    "current_medications", "allergies", "additional_notes",
+)
+# Bump when the summary prompt changes so stored summaries are regenerated
+SUMMARY_VERSION = 1
+EMPTY_SUMMARY = "No summary available"
+
+
+def questionnaire_hash(questionnaire_data: Dict[str, Any]) -> str:
+    """Hash of the clinical answers, stored as summary_hash next to the summary."""
+    fields = [SUMMARY_VERSION] + [
+        " ".join(str(questionnaire_data.get(field) or "").split()) for field in CLINICAL_FIELDS
+    ]
+    return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+
+def has_clinical_content(questionnaire_data: Dict[str, Any]) -> bool:
+    """
+    Whether any clinical field is filled in; empty questionnaires need no summary.
+    A placeholder the patient hasn't submitted yet only carries the booking
+    reason, so it counts as empty.
+    """
+    if questionnaire_data.get("placeholder"):
+        return False
+    return any(str(questionnaire_data.get(field) or "").strip() for field in CLINICAL_FIELDS)
 
-if settings.GEMINI_API_KEY:
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Use FREE Gemini model (not pro)
-        gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-        logger.info("Gemini API initialized successfully")
-    except ImportError:
-        logger.warning("google-generativeai not installed. Gemini summarization will be disabled.")
-    except Exception as e:
-        logger.warning(f"Failed to initialize Gemini: {e}")
 
+def summary_is_current(questionnaire_doc: Dict[str, Any]) -> bool:
+    """Whether a stored questionnaire's summary was made from its current answers."""
+    if not questionnaire_doc.get("summary"):
+        return False
+    summary_hash = questionnaire_doc.get("summary_hash")
+    # Summaries stored before hashing are trusted
+    return summary_hash is None or summary_hash == questionnaire_hash(questionnaire_doc)
 
-def summarize_questionnaire(questionnaire_data: Dict[str, Any]) -> str:
+
+def placeholder_questionnaire(appointment_id: str, patient_id: str, reason: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Empty questionnaire for a patient to fill in. Automatic booking and
+    trigger-agents record it on the appointment as questionnaire_placeholder;
+    it's only written to questionnaires when the patient opens it.
+    """
+    return {
+        "appointment_id": appointment_id,
+        "patient_id": patient_id,
+        "chief_complaint": reason or "",
+        "symptoms": "",
+        "medical_history": "",
+        "current_medications": "",
+        "allergies": "",
+        "additional_notes": "",
+    }
+
+
+def summarize_questionnaire(questionnaire_data: Dict[str, Any], fallback: bool = True) -> str:
     """
     Summarize questionnaire data using Gemini API if available.
     
     Args:
         questionnaire_data: Dictionary containing questionnaire responses
+        fallback: Return the simple summary if the Gemini call fails, instead
+            of raising LLMUnavailable
         
     Returns:
         Summary string
     """
-    if gemini_model is None:
+    if not has_clinical_content(questionnaire_data):
+        return EMPTY_SUMMARY
+    if not llm_gateway.available:
         # Fallback to simple summary if Gemini is not available
         return _create_simple_summary(questionnaire_data)
     
     try:
-        prompt = f"""
+        summary = llm_gateway.generate_sync(_summary_prompt(questionnaire_data), purpose="summary")
+        logger.info("Questionnaire summarized using Gemini API")
+        return summary
+    except LLMUnavailable as e:
+        if not fallback:
+            raise
+        logger.error(f"Error using Gemini API: {e}, falling back to simple summary")
+        return _create_simple_summary(questionnaire_data)
+
+
+async def asummarize_questionnaire(questionnaire_data: Dict[str, Any], fallback: bool = True) -> str:
+    """
+    Async variant of summarize_questionnaire.
+    With fallback=False a failed Gemini call raises LLMUnavailable instead of
+    returning the simple summary (the simple summary is still used when no
+    Gemini model is configured).
+    """
+    if not has_clinical_content(questionnaire_data):
+        return EMPTY_SUMMARY
+    if not llm_gateway.available:
+        return _create_simple_summary(questionnaire_data)
+    
+    try:
+        summary = await llm_gateway.generate(_summary_prompt(questionnaire_data), purpose="summary")
+        logger.info("Questionnaire summarized using Gemini API")
+        return summary
+    except LLMUnavailable as e:
+        if not fallback:
+            raise
+        logger.error(f"Error using Gemini API: {e}, falling back to simple summary")
+        return _create_simple_summary(questionnaire_data)
+
+
+async def astream_questionnaire_summary(questionnaire_data: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Yield the summary as Gemini writes it, or the simple summary in one chunk
+    if Gemini can't be used. Raises LLMUnavailable if Gemini fails mid-stream.
+    """
+    if not has_clinical_content(questionnaire_data):
+        yield EMPTY_SUMMARY
+        return
+    if not llm_gateway.available:
+        yield _create_simple_summary(questionnaire_data)
+        return
+    
+    started = False
+    try:
+        async for chunk in llm_gateway.stream(_summary_prompt(questionnaire_data), purpose="summary"):
+            started = True
+            yield chunk
+    except LLMUnavailable as e:
+        if started:
+            raise
+        logger.error(f"Error using Gemini API: {e}, falling back to simple summary")
+        yield _create_simple_summary(questionnaire_data)
+
+
+def _summary_prompt(questionnaire_data: Dict[str, Any]) -> str:
+    return f"""
         Summarize the following pre-visit medical questionnaire in a concise, professional format:
         
         {questionnaire_data}
@@ -54,14 +158,6 @@ def summarize_questionnaire(questionnaire_data: Dict[str, Any]) -> str:
         
         Keep the summary under 300 words.
         """
-        
-        response = gemini_model.generate_content(prompt)
-        summary = response.text
-        logger.info("Questionnaire summarized using Gemini API")
-        return summary
-    except Exception as e:
-        logger.error(f"Error using Gemini API: {e}, falling back to simple summary")
-        return _create_simple_summary(questionnaire_data)
 
 
 def _create_simple_summary(questionnaire_data: Dict[str, Any]) -> str:
@@ -80,7 +176,7 @@ def _create_simple_summary(questionnaire_data: Dict[str, Any]) -> str:
     if questionnaire_data.get("current_medications"):
         summary_parts.append(f"Current Medications: {questionnaire_data['current_medications']}")
     
-    return "\n".join(summary_parts) if summary_parts else "No summary available"
+    return "\n".join(summary_parts) if summary_parts else EMPTY_SUMMARY
 
 
 def process_questionnaire(questionnaire_data: Dict[str, Any], appointment_id: str) -> Dict[str, Any]:
@@ -94,14 +190,7 @@ def process_questionnaire(questionnaire_data: Dict[str, Any], appointment_id: st
     Returns:
         Result from the pre-visit agent including summary
     """
-    task = f"Process pre-visit questionnaire for appointment {appointment_id}"
-    
-    context = {
-        "action": "process_questionnaire",
-        "appointment_id": appointment_id,
-        "questionnaire_data": questionnaire_data
-    }
-    
+    task, context = _process_task(questionnaire_data, appointment_id)
     logger.info(f"Pre-Visit Agent: Processing questionnaire for appointment {appointment_id}")
     
     # Execute agent task
@@ -109,13 +198,45 @@ def process_questionnaire(questionnaire_data: Dict[str, Any], appointment_id: st
     
     # Generate AI summary
     try:
-        summary = summarize_questionnaire(questionnaire_data)
+        summary = summarize_questionnaire(questionnaire_data, fallback=False)
         result["summary"] = summary
         result["summarized"] = True
     except Exception as e:
         logger.error(f"Error generating summary: {e}")
         result["summary"] = _create_simple_summary(questionnaire_data)
         result["summarized"] = False
+    # Only a Gemini summary counts as current; the summarize worker retries fallbacks
+    result["summary_hash"] = questionnaire_hash(questionnaire_data) if result["summarized"] else None
     
     return result
 
+
+async def aprocess_questionnaire(questionnaire_data: Dict[str, Any], appointment_id: str) -> Dict[str, Any]:
+    """Async variant of process_questionnaire; the agent and Gemini run off the event loop."""
+    task, context = _process_task(questionnaire_data, appointment_id)
+    logger.info(f"Pre-Visit Agent: Processing questionnaire for appointment {appointment_id}")
+    result = await orchestrator.aexecute("previsit", task, context)
+    
+    try:
+        summary = await asummarize_questionnaire(questionnaire_data, fallback=False)
+        result["summary"] = summary
+        result["summarized"] = True
+    except Exception as e:
+        logger.error(f"Error generating summary: {e}")
+        result["summary"] = _create_simple_summary(questionnaire_data)
+        result["summarized"] = False
+    # Only a Gemini summary counts as current; the summarize worker retries fallbacks
+    result["summary_hash"] = questionnaire_hash(questionnaire_data) if result["summarized"] else None
+    
+    return result
+
+
+def _process_task(questionnaire_data: Dict[str, Any], appointment_id: str) -> Tuple[str, Dict[str, Any]]:
+    task = f"Process pre-visit questionnaire for appointment {appointment_id}"
+    
+    context = {
+        "action": "process_questionnaire",
+        "appointment_id": appointment_id,
+        "questionnaire_data": questionnaire_data
+    }
+    return task, context
@@ -2,7 +2,7 @@
 Reminder Agent - Handles appointment reminders via SMS/Email.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 from backend.core.orchestrator import orchestrator
 from backend.core.config import settings
@@ -29,6 +29,30 @@ def schedule_reminder(appointment_id: str, patient_name: str, doctor_name: str,
     Returns:
         Result from the reminder agent
     """
+    task, context = _schedule_task(appointment_id, patient_name, doctor_name, appointment_date,
+                                   appointment_time, reminder_type, hours_before)
+    logger.info(f"Reminder Agent: Scheduling {reminder_type} reminder for appointment {appointment_id}")
+    
+    # Execute agent task
+    result = orchestrator.execute_reminder_task(task, context)
+    return _scheduled_result(result, patient_name, doctor_name, appointment_date, appointment_time,
+                             reminder_type, hours_before)
+
+
+async def aschedule_reminder(appointment_id: str, patient_name: str, doctor_name: str,
+                             appointment_date: str, appointment_time: str,
+                             reminder_type: str = "sms", hours_before: int = 24) -> Dict[str, Any]:
+    """Async variant of schedule_reminder; the agent runs off the event loop."""
+    task, context = _schedule_task(appointment_id, patient_name, doctor_name, appointment_date,
+                                   appointment_time, reminder_type, hours_before)
+    logger.info(f"Reminder Agent: Scheduling {reminder_type} reminder for appointment {appointment_id}")
+    result = await orchestrator.aexecute("reminder", task, context)
+    return _scheduled_result(result, patient_name, doctor_name, appointment_date, appointment_time,
+                             reminder_type, hours_before)
+
+
+def _schedule_task(appointment_id: str, patient_name: str, doctor_name: str, appointment_date: str,
+                   appointment_time: str, reminder_type: str, hours_before: int) -> Tuple[str, Dict[str, Any]]:
     task = f"Schedule a {reminder_type} reminder for appointment on {appointment_date} at {appointment_time}, {hours_before} hours before"
     
     context = {
@@ -41,12 +65,11 @@ def schedule_reminder(appointment_id: str, patient_name: str, doctor_name: str,
         "reminder_type": reminder_type,
         "hours_before": hours_before
     }
-    
-    logger.info(f"Reminder Agent: Scheduling {reminder_type} reminder for appointment {appointment_id}")
-    
-    # Execute agent task
-    result = orchestrator.execute_reminder_task(task, context)
-    
+    return task, context
+
+
+def _scheduled_result(result: Dict[str, Any], patient_name: str, doctor_name: str, appointment_date: str,
+                      appointment_time: str, reminder_type: str, hours_before: int) -> Dict[str, Any]:
     # Simulate sending reminder (mock)
     if settings.USE_MOCK_SMS or settings.USE_MOCK_EMAIL:
         logger.info(f"[MOCK {reminder_type.upper()}] Sending reminder to {patient_name}")
@@ -80,6 +103,27 @@ def send_immediate_reminder(appointment_id: str, patient_name: str,
     Returns:
         Result from the reminder agent
     """
+    task, context = _immediate_task(appointment_id, patient_name, doctor_name, appointment_date,
+                                    appointment_time, reminder_type)
+    logger.info(f"Reminder Agent: Sending immediate {reminder_type} reminder for appointment {appointment_id}")
+    
+    result = orchestrator.execute_reminder_task(task, context, cacheable=False)
+    return _immediate_result(result, patient_name, doctor_name, appointment_date, appointment_time, reminder_type)
+
+
+async def asend_immediate_reminder(appointment_id: str, patient_name: str,
+                                   doctor_name: str, appointment_date: str,
+                                   appointment_time: str, reminder_type: str = "sms") -> Dict[str, Any]:
+    """Async variant of send_immediate_reminder."""
+    task, context = _immediate_task(appointment_id, patient_name, doctor_name, appointment_date,
+                                    appointment_time, reminder_type)
+    logger.info(f"Reminder Agent: Sending immediate {reminder_type} reminder for appointment {appointment_id}")
+    result = await orchestrator.aexecute("reminder", task, context, cacheable=False)
+    return _immediate_result(result, patient_name, doctor_name, appointment_date, appointment_time, reminder_type)
+
+
+def _immediate_task(appointment_id: str, patient_name: str, doctor_name: str, appointment_date: str,
+                    appointment_time: str, reminder_type: str) -> Tuple[str, Dict[str, Any]]:
     task = f"Send immediate {reminder_type} reminder for appointment on {appointment_date} at {appointment_time}"
     
     context = {
@@ -91,11 +135,11 @@ def send_immediate_reminder(appointment_id: str, patient_name: str,
         "appointment_time": appointment_time,
         "reminder_type": reminder_type
     }
-    
-    logger.info(f"Reminder Agent: Sending immediate {reminder_type} reminder for appointment {appointment_id}")
-    
-    result = orchestrator.execute_reminder_task(task, context)
-    
+    return task, context
+
+
+def _immediate_result(result: Dict[str, Any], patient_name: str, doctor_name: str, appointment_date: str,
+                      appointment_time: str, reminder_type: str) -> Dict[str, Any]:
     # Simulate sending reminder (mock)
     if settings.USE_MOCK_SMS or settings.USE_MOCK_EMAIL:
         logger.info(f"[MOCK {reminder_type.upper()}] Sending immediate reminder to {patient_name}")
@@ -0,0 +1,100 @@
+"""
+Agent runs: CrewAI agent tasks triggered by routes.
+
+With AGENT_RUNS_BACKGROUND enabled, routes commit their Firestore write
+first and hand the agent task to run_agent(), which records an
+agent_runs/{id} document, runs the agent in the background and stores its
+result there for the client to poll (GET /api/agent-runs/{id}). Otherwise
+the agent runs inline and its result is returned directly, as before.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from backend.core.config import settings
+from backend.core.firestore_client import get_async_firestore
+import logging
+
+logger = logging.getLogger(__name__)
+
+AGENT_RUNS_COLLECTION = "agent_runs"
+
+# Background runs, referenced so they aren't garbage collected
+_tasks: Set[asyncio.Task] = set()
+
+
+def _to_record(result: Any) -> Any:
+    """Make an agent result safe to store (datetimes and other objects become strings)."""
+    return json.loads(json.dumps(result, default=str))
+
+
+async def _execute(agent: Callable[[], Awaitable[Dict[str, Any]]], operation: str) -> Dict[str, Any]:
+    try:
+        return await agent()
+    except Exception as e:
+        # Agent output is informational; the domain write already committed
+        logger.error(f"Agent run for {operation} failed: {e}")
+        return {"status": "error", "error": str(e)}
+
+
+async def run_agent(
+    operation: str,
+    agent: Callable[[], Awaitable[Dict[str, Any]]],
+    user_id: str,
+    appointment_id: Optional[str] = None,
+    on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Run an agent task for a route.
+
+    Args:
+        operation: What the agent does, e.g. "book" or "process_questionnaire"
+        agent: Starts the agent call, e.g. lambda: abook_appointment(...)
+        user_id: User who triggered the run (allowed to read it)
+        appointment_id: Appointment the run belongs to, for listing runs
+        on_complete: Awaited with the agent result once it finishes
+
+    Returns:
+        The agent result, or {"status": "pending", "agent_run_id": ...} when
+        the agent runs in the background.
+    """
+    if not settings.AGENT_RUNS_BACKGROUND:
+        result = await _execute(agent, operation)
+        if on_complete is not None:
+            await on_complete(result)
+        return result
+
+    db = get_async_firestore()
+    run_ref = db.collection(AGENT_RUNS_COLLECTION).document()
+    await run_ref.set({
+        "operation": operation,
+        "appointment_id": appointment_id,
+        "user_id": user_id,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc),
+    })
+
+    async def finish():
+        result = await _execute(agent, operation)
+        update = {
+            "status": "failed" if result.get("status") in ("error", "timeout") else "completed",
+            "result": _to_record(result),
+        }
+        if on_complete is not None:
+            try:
+                await on_complete(result)
+            except Exception as e:
+                # The run must still reach a terminal status for pollers
+                logger.error(f"Completion handler for agent run {run_ref.id} failed: {e}")
+                update.update({"status": "failed", "error": str(e)})
+        update["completed_at"] = datetime.now(timezone.utc)
+        try:
+            await run_ref.update(update)
+        except Exception as e:
+            logger.error(f"Failed to record agent run {run_ref.id}: {e}")
+
+    task = asyncio.create_task(finish())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return {"status": "pending", "agent_run_id": run_ref.id}
@@ -4,7 +4,8 @@ Loads environment variables and sets up application configuration.
 """
 
 import os
-from typing import Optional, List
+import tempfile
+from typing import Optional, List, Dict
 try:
     from pydantic_settings import BaseSettings
 except ImportError:
@@ -19,19 +20,68 @@ class Settings(BaseSettings):
     FIREBASE_PRIVATE_KEY: str = ""
     FIREBASE_CLIENT_EMAIL: str = ""
     FIREBASE_CREDENTIALS_PATH: Optional[str] = None
+
+    # Threads used to run blocking Firestore calls off the event loop
+    FIRESTORE_MAX_WORKERS: int = 32
+
+    # Datastore backend: "firebase" (real Firestore) or "memory" (in-process stand-in)
+    FIRESTORE_BACKEND: str = "firebase"
+    MEMORY_FIRESTORE_PATH: Optional[str] = None  # SQLite file to persist the memory backend
+    MEMORY_FIRESTORE_LATENCY_MS: float = 0  # Simulated round-trip latency
+    MEMORY_FIRESTORE_INDEXED_FIELDS: List[str] = [
+        "patient_id", "doctor_id", "appointment_id", "email", "role", "status", "date",
+    ]
     
     # Gemini API
     GEMINI_API_KEY: str = ""
+    LLM_MODEL: str = "gemini-2.5-flash"
+    LLM_MAX_CONCURRENCY: int = 8  # Concurrent Gemini calls across all purposes
+    LLM_PURPOSE_CONCURRENCY: Dict[str, int] = {"email": 4, "summary": 4}
+    LLM_TIMEOUT_SECONDS: float = 20  # Deadline per call, including the wait for a slot
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive failures before calls stop
+    LLM_CIRCUIT_RESET_SECONDS: float = 30
     
     # JWT Configuration
     SECRET_KEY: str = "medical-scheduler-jwt-secret-key-2024-arya-aditya-rv-32-chars"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
+    # bcrypt work factor; existing hashes are upgraded at the user's next login
+    BCRYPT_ROUNDS: int = 12
+    # Threads hashing passwords off the event loop (bcrypt releases the GIL, so up to one per core)
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 2
+    # Fall back to email queries for users missing from email_index; disable once
+    # scripts/backfill_email_index.py has run
+    EMAIL_INDEX_LEGACY_FALLBACK: bool = True
     
     # CrewAI Configuration
     USE_MOCK_AI: bool = True
     CREWAI_MODEL: str = "ollama/llama2"
     CREWAI_API_KEY: Optional[str] = None
+    AGENT_MAX_CONCURRENCY: int = 4  # Concurrent kickoffs (and prebuilt crews) per agent type
+    AGENT_EXECUTOR_WORKERS: int = 12  # Threads shared by all agent kickoffs
+    AGENT_TIMEOUT_SECONDS: float = 60
+    # Reuse successful agent results for identical tasks; seconds per agent type, 0 disables
+    AGENT_RESULT_CACHE_TTLS: Dict[str, float] = {"booking": 0, "reminder": 600, "previsit": 3600}
+    AGENT_RESULT_CACHE_SIZE: int = 512
+    # Run route-triggered agent tasks in the background, recording results in agent_runs
+    AGENT_RUNS_BACKGROUND: bool = False
+
+    # Offline questionnaire summarization worker (python -m backend.workers.summarize)
+    SUMMARY_WORKER_PAGE_SIZE: int = 200
+    SUMMARY_WORKER_CONCURRENCY: int = 4
+    SUMMARY_WORKER_RATE_PER_SECOND: float = 2.0  # Gemini calls started per second
+
+    # Dashboard counters are spread over this many shard documents (don't lower once in use)
+    COUNTER_SHARDS: int = 10
+    # Each independent analytics read gets this long before the dashboard returns without it
+    ANALYTICS_BRANCH_TIMEOUT_SECONDS: float = 5
+
+    # Cached GET responses (dashboard, slots, appointment lists): "memory" or "redis"
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_REDIS_URL: Optional[str] = None
+    RESPONSE_CACHE_SIZE: int = 2000  # Entries kept by the in-process store
+    RESPONSE_CACHE_TTL_SECONDS: float = 15  # Served as fresh
+    RESPONSE_CACHE_STALE_SECONDS: float = 60  # Then served while recomputed in the background
     
     # Email/SMS Mock
     USE_MOCK_SMS: bool = True
@@ -43,6 +93,39 @@ class Settings(BaseSettings):
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     SMTP_FROM: Optional[str] = None
+    SMTP_STARTTLS: bool = True
+    SMTP_POOL_SIZE: int = 4  # Persistent authenticated sessions kept open
+    SMTP_POOL_IDLE_SECONDS: int = 60  # Idle sessions are closed after this long
+
+    # Email outbox: background delivery of queued emails
+    EMAIL_OUTBOX_WORKERS: int = 4
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+    EMAIL_OUTBOX_POLL_SECONDS: float = 30
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 120  # A claimed message is retried if not finished by then
+    EMAIL_OUTBOX_BACKOFF_SECONDS: float = 30  # Doubles after every failed attempt
+    EMAIL_OUTBOX_MAX_BACKOFF_SECONDS: float = 3600
+
+    # Reminder bursts are generated several emails per Gemini call; 1 disables batching
+    EMAIL_BATCH_SIZE: int = 8
+    EMAIL_BATCH_MAX_WAIT_MS: float = 250
+    EMAIL_BATCH_TIMEOUT_SECONDS: float = 60
+
+    # Cache of Gemini-generated email content (memory LRU in front of a SQLite file)
+    EMAIL_CONTENT_CACHE_SIZE: int = 1000
+    EMAIL_CONTENT_CACHE_DISK_SIZE: int = 20000
+    EMAIL_CONTENT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # SQLite file for the on-disk tier; empty disables it
+    EMAIL_CONTENT_CACHE_PATH: Optional[str] = os.path.join(tempfile.gettempdir(), "medscheduler_email_cache.sqlite3")
+
+    # Reminder scheduler: how far ahead scheduled reminders are loaded into memory
+    REMINDER_SCHEDULER_HORIZON_SECONDS: int = 3600
+    # A failed reminder send is retried after this long, doubling per failure (up to half the horizon)
+    REMINDER_RETRY_SECONDS: float = 60
+    # How long background jobs reuse a fetched user profile
+    USER_PROFILE_CACHE_TTL_SECONDS: int = 300
+    # In-memory doctor directory: full reload interval, and how often the version document is checked
+    DOCTOR_DIRECTORY_TTL_SECONDS: float = 600
+    DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS: float = 10
 
     # Clinic details used in emails
     CLINIC_NAME: str = "Aurora Health Clinic"
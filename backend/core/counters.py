@@ -0,0 +1,137 @@
+"""
+Sharded aggregate counters for the dashboards.
+
+Totals per collection, status and role are kept in COUNTER_SHARDS shard
+documents (counter_shards/{counter}_{n}). Every create or status change
+increments a random shard in the same write as the document itself, so
+concurrent writers rarely touch the same shard document. Reading a counter
+is one batched read of its shards (aggregate_shards()).
+
+Appointments are also rolled up per creation day and doctor
+(appointment_rollups/{day}_{doctor_id}, counts per specialty), so windowed
+statistics read one document per doctor and day instead of every
+appointment ever booked.
+
+The counters are maintained incrementally. python -m
+backend.workers.reconcile_counters recounts the collections from scratch,
+reports drift and corrects it.
+"""
+
+import random
+from datetime import datetime
+from typing import Any, Dict, Optional
+from firebase_admin.firestore import Increment
+from backend.core.config import settings
+
+COUNTER_SHARDS_COLLECTION = "counter_shards"
+DASHBOARD_COUNTER = "dashboard"
+ROLLUPS_COLLECTION = "appointment_rollups"
+
+
+def shard_id(counter: str, index: int) -> str:
+    return f"{counter}_{index}"
+
+
+def stage_counters(writer, client, deltas: Dict[str, int], counter: str = DASHBOARD_COUNTER):
+    """
+    Stage increments of a counter's fields on a transaction or write batch.
+
+    Args:
+        writer: Transaction or write batch (sync, or the async facade's batch)
+        client: The matching Firestore client or async facade
+        deltas: Field -> amount, e.g. {"appointments_total": 1}
+        counter: Counter document group
+    """
+    increments = {field: Increment(amount) for field, amount in deltas.items() if amount}
+    if not increments:
+        return
+    shard_ref = client.collection(COUNTER_SHARDS_COLLECTION).document(
+        shard_id(counter, random.randrange(settings.COUNTER_SHARDS))
+    )
+    writer.set(shard_ref, {"counter": counter, **increments}, merge=True)
+
+
+def created_deltas(collection: str, status: Optional[str] = None) -> Dict[str, int]:
+    """Counter changes for a new document; status is a role for users."""
+    deltas = {f"{collection}_total": 1}
+    if status:
+        deltas[f"{collection}_{status}"] = 1
+    return deltas
+
+
+def status_deltas(collection: str, old_status: Optional[str], new_status: str) -> Dict[str, int]:
+    """Counter changes for a document moving from old_status to new_status."""
+    if old_status == new_status:
+        return {}
+    deltas = {f"{collection}_{new_status}": 1}
+    if old_status:
+        deltas[f"{collection}_{old_status}"] = -1
+    return deltas
+
+
+async def create_with_counters(db, reference, document_data: Dict[str, Any], deltas: Dict[str, int]):
+    """Create a document and count it in one batched write."""
+    batch = db.batch()
+    batch.set(reference, document_data)
+    stage_counters(batch, db, deltas)
+    await batch.commit()
+
+
+async def update_with_counters(db, reference, field_updates: Dict[str, Any], deltas: Dict[str, int]):
+    """Update a document and adjust the counters in one batched write."""
+    batch = db.batch()
+    batch.update(reference, field_updates)
+    stage_counters(batch, db, deltas)
+    await batch.commit()
+
+
+async def aggregate_shards(db, counter: str = DASHBOARD_COUNTER) -> Dict[str, int]:
+    """Sum a counter's shards with one batched read."""
+    refs = [
+        db.collection(COUNTER_SHARDS_COLLECTION).document(shard_id(counter, index))
+        for index in range(settings.COUNTER_SHARDS)
+    ]
+    totals: Dict[str, int] = {}
+    for snapshot in await db.get_all(refs):
+        if not snapshot.exists:
+            continue
+        for field, value in snapshot.to_dict().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[field] = totals.get(field, 0) + value
+    return totals
+
+
+def rollup_day(created_at: Any) -> Optional[str]:
+    """The rollup day (UTC date) of an appointment's created_at."""
+    return created_at.date().isoformat() if isinstance(created_at, datetime) else None
+
+
+def rollup_id(day: str, doctor_id: str) -> str:
+    return f"{day}_{doctor_id}"
+
+
+def stage_appointment_rollup(writer, client, appointment_doc: Dict[str, Any]):
+    """Stage counting a new appointment in its day's rollup on a transaction or write batch."""
+    day = rollup_day(appointment_doc.get("created_at"))
+    if day is None:
+        return
+    doctor_id = appointment_doc.get("doctor_id", "")
+    specialty = appointment_doc.get("specialty") or "General"
+    rollup_ref = client.collection(ROLLUPS_COLLECTION).document(rollup_id(day, doctor_id))
+    writer.set(rollup_ref, {
+        "day": day,
+        "doctor_id": doctor_id,
+        "by_specialty": {specialty: Increment(1)},
+    }, merge=True)
+
+
+async def specialty_counts(db, start_day: str, doctor_id: Optional[str] = None) -> Dict[str, int]:
+    """Appointments per specialty created on or after start_day, from the daily rollups."""
+    query = db.collection(ROLLUPS_COLLECTION).where("day", ">=", start_day)
+    if doctor_id is not None:
+        query = query.where("doctor_id", "==", doctor_id)
+    totals: Dict[str, int] = {}
+    for snapshot in await query.get():
+        for specialty, count in (snapshot.to_dict().get("by_specialty") or {}).items():
+            totals[specialty] = totals.get(specialty, 0) + count
+    return totals
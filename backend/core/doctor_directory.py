@@ -0,0 +1,138 @@
+"""
+In-memory directory of doctors.
+
+Slot listings and automatic booking used to query users where role ==
+doctor on every call. The directory loads all doctors once and answers
+from memory: by ID, by specialty and by name prefix.
+
+It reloads when:
+- the TTL expires (DOCTOR_DIRECTORY_TTL_SECONDS), or
+- the doctors version document (directory_versions/doctors) changes.
+
+The version document is bumped whenever a doctor is added (registration,
+seed_doctors.py), so other replicas notice within
+DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS, at the cost of one point read.
+"""
+
+import asyncio
+import bisect
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from firebase_admin.firestore import Increment, SERVER_TIMESTAMP
+from backend.core.config import settings
+from backend.core.firestore_client import AsyncFirestore
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "directory_versions"
+DOCTORS_VERSION_ID = "doctors"
+
+
+def version_bump() -> Dict[str, Any]:
+    """Fields that mark the doctor list as changed; set with merge=True."""
+    return {"version": Increment(1), "updated_at": SERVER_TIMESTAMP}
+
+
+def bump_version(client):
+    """Mark the doctor list as changed, with a synchronous Firestore client (scripts)."""
+    client.collection(VERSIONS_COLLECTION).document(DOCTORS_VERSION_ID).set(version_bump(), merge=True)
+
+
+class DoctorDirectory:
+    """All doctors in memory, indexed by ID, specialty and name prefix."""
+
+    def __init__(self, ttl_seconds: float, version_check_seconds: float):
+        self.ttl = ttl_seconds
+        self.version_check = version_check_seconds
+        self._doctors: Dict[str, Dict[str, Any]] = {}
+        self._ordered: List[str] = []  # Doctor IDs in document ID order, like the old query
+        self._by_specialty: Dict[str, List[str]] = {}
+        self._name_index: List[Tuple[str, str]] = []  # Sorted (lowercase name word, doctor ID)
+        self._version: Optional[int] = None
+        self._loaded_at: Optional[float] = None
+        self._checked_at = 0.0
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {"loads": 0, "version_checks": 0}
+
+    async def invalidate(self, db: AsyncFirestore):
+        """Reload on next use here, and tell other replicas through the version document."""
+        self._stale = True
+        await db.collection(VERSIONS_COLLECTION).document(DOCTORS_VERSION_ID).set(version_bump(), merge=True)
+
+    async def _read_version(self, db: AsyncFirestore) -> int:
+        self.stats["version_checks"] += 1
+        snapshot = await db.collection(VERSIONS_COLLECTION).document(DOCTORS_VERSION_ID).get()
+        return (snapshot.to_dict() or {}).get("version", 0) if snapshot.exists else 0
+
+    async def _load(self, db: AsyncFirestore, version: int):
+        docs = await db.collection("users").where("role", "==", "doctor").get()
+        doctors = {doc.id: doc.to_dict() for doc in docs}
+        ordered = sorted(doctors)
+        by_specialty: Dict[str, List[str]] = {}
+        name_index = []
+        for doctor_id in ordered:
+            data = doctors[doctor_id]
+            by_specialty.setdefault(data.get("specialty"), []).append(doctor_id)
+            for word in (data.get("full_name") or "").lower().split():
+                name_index.append((word, doctor_id))
+        name_index.sort()
+
+        self._doctors = doctors
+        self._ordered = ordered
+        self._by_specialty = by_specialty
+        self._name_index = name_index
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+        self._stale = False
+        self.stats["loads"] += 1
+        logger.info(f"Doctor directory loaded: {len(doctors)} doctor(s), version {version}")
+
+    async def ensure_fresh(self, db: AsyncFirestore):
+        """Reload if invalidated, expired, or changed elsewhere (checked every few seconds)."""
+        now = time.monotonic()
+        if not self._stale and now - self._checked_at < self.version_check and now - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if not self._stale and now - self._checked_at < self.version_check and now - self._loaded_at < self.ttl:
+                return
+            version = await self._read_version(db)
+            if self._stale or version != self._version or now - self._loaded_at >= self.ttl:
+                await self._load(db, version)
+            else:
+                self._checked_at = now
+
+    def get(self, doctor_id: str) -> Optional[Dict[str, Any]]:
+        return self._doctors.get(doctor_id)
+
+    def all(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(doctor_id, self._doctors[doctor_id]) for doctor_id in self._ordered]
+
+    def by_specialty(self, specialty: str) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(doctor_id, self._doctors[doctor_id]) for doctor_id in self._by_specialty.get(specialty, [])]
+
+    def search_name(self, prefix: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Doctors with a word of their name starting with prefix (case-insensitive)."""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._name_index, (prefix, ""))
+        found = []
+        for word, doctor_id in self._name_index[start:]:
+            if not word.startswith(prefix):
+                break
+            if doctor_id not in found:
+                found.append(doctor_id)
+        return [(doctor_id, self._doctors[doctor_id]) for doctor_id in sorted(found)]
+
+    def __len__(self) -> int:
+        return len(self._doctors)
+
+
+# Global doctor directory instance
+doctor_directory = DoctorDirectory(
+    ttl_seconds=settings.DOCTOR_DIRECTORY_TTL_SECONDS,
+    version_check_seconds=settings.DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS,
+)
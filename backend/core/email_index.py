@@ -0,0 +1,92 @@
+"""
+Email -> user ID index.
+
+Each email_index/{normalized email} document points to the user registered
+with that address. It is written in the same transaction as the user, so
+two concurrent registrations of one address can't both succeed, and login
+finds the user with point reads instead of an email query.
+
+Users registered before the index existed are added by
+scripts/backfill_email_index.py. Until it has run, set
+EMAIL_INDEX_LEGACY_FALLBACK so index misses fall back to the email query
+(and index the user found).
+
+The function taking a ``transaction`` is synchronous and meant to run
+inside AsyncFirestore.run_transaction().
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from firebase_admin.firestore import SERVER_TIMESTAMP
+from backend.core.config import settings
+from backend.core.counters import created_deltas, stage_counters
+from backend.core.firestore_client import AsyncFirestore, get_in_transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMAIL_INDEX_COLLECTION = "email_index"
+
+
+class EmailAlreadyRegisteredError(Exception):
+    """Raised when registering an email address that already has a user."""
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def index_entry(user_id: str) -> Dict[str, Any]:
+    return {"user_id": user_id, "created_at": SERVER_TIMESTAMP}
+
+
+def register_user(transaction, client, index_ref, user_ref, user_doc: Dict[str, Any]):
+    """Claim the email address and create the user (and count it) atomically."""
+    if get_in_transaction(transaction, index_ref).exists:
+        raise EmailAlreadyRegisteredError(user_doc.get("email", ""))
+    transaction.set(index_ref, index_entry(user_ref.id))
+    transaction.set(user_ref, user_doc)
+    stage_counters(transaction, client, created_deltas("users", user_doc.get("role")))
+
+
+async def _legacy_lookup(db: AsyncFirestore, email: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Find a user with an email query and index it. Users are stored with
+    normalized addresses now, but older ones as typed, so the address as
+    given is tried too; other capitalizations are only found once the
+    backfill has indexed them.
+    """
+    docs = []
+    for candidate in dict.fromkeys([normalize_email(email), email.strip()]):
+        docs = await db.collection("users").where("email", "==", candidate).limit(1).get()
+        if docs:
+            break
+    if not docs:
+        return None
+    user_id = docs[0].id
+    try:
+        await db.collection(EMAIL_INDEX_COLLECTION).document(normalize_email(email)).set(index_entry(user_id))
+    except Exception as e:
+        logger.warning(f"Could not index email for user {user_id}: {e}")
+    return user_id, docs[0].to_dict()
+
+
+async def find_user_by_email(db: AsyncFirestore, email: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Return (user_id, user document) for an email address, or None."""
+    entry = await db.collection(EMAIL_INDEX_COLLECTION).document(normalize_email(email)).get()
+    if entry.exists:
+        user_id = entry.to_dict().get("user_id")
+        user = await db.collection("users").document(user_id).get() if user_id else None
+        if user is not None and user.exists:
+            return user_id, user.to_dict()
+        logger.warning(f"Email index entry for {email} points to missing user {user_id}")
+        return None
+    if settings.EMAIL_INDEX_LEGACY_FALLBACK:
+        return await _legacy_lookup(db, email)
+    return None
+
+
+async def email_registered(db: AsyncFirestore, email: str) -> bool:
+    """Whether a user already has this address, counting users not yet in the index."""
+    if (await db.collection(EMAIL_INDEX_COLLECTION).document(normalize_email(email)).get()).exists:
+        return True
+    return settings.EMAIL_INDEX_LEGACY_FALLBACK and await _legacy_lookup(db, email) is not None
@@ -0,0 +1,208 @@
+"""
+Durable email outbox.
+
+Requests don't render or send email themselves: they write a message to the
+email_outbox collection, in the same transaction as the change it announces,
+and a pool of background workers renders (Gemini or template) and delivers it
+over SMTP with retries and exponential backoff.
+
+Workers claim a message by pushing its next_attempt_at forward by a lease, so
+a message whose worker died becomes due again once the lease expires; this
+also recovers messages left in flight by a crash or restart.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Set
+from backend.core.config import settings
+from backend.core.firestore_client import get_async_firestore, get_in_transaction, run_blocking
+from backend.core.user_cache import user_profile_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "email_outbox"
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Firestore treats naive datetimes as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def outbox_message(kind: str, patient_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build an outbox record. The recipient's address is resolved from
+    users/{patient_id} at delivery time.
+    """
+    now = datetime.now(timezone.utc)
+    return {
+        "kind": kind,
+        "patient_id": patient_id,
+        "params": params,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "last_error": None,
+    }
+
+
+def with_outbox(fn: Callable) -> Callable:
+    """
+    Wrap a transaction function so it also stages an outbox message.
+    The wrapped function is called as wrapped(transaction, outbox_ref, message, *args).
+    """
+    def wrapped(transaction, outbox_ref, message, *args):
+        result = fn(transaction, *args)
+        transaction.set(outbox_ref, message)
+        return result
+    return wrapped
+
+
+def _claim(transaction, message_ref, now: datetime, lease_until: datetime) -> Optional[Dict[str, Any]]:
+    """Lease a due message to this worker, or return None if it isn't due."""
+    snapshot = get_in_transaction(transaction, message_ref)
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    next_attempt_at = data.get("next_attempt_at")
+    if data.get("status") != "pending" or (next_attempt_at and _as_utc(next_attempt_at) > now):
+        return None
+    data["attempts"] = data.get("attempts", 0) + 1
+    transaction.update(message_ref, {"next_attempt_at": lease_until, "attempts": data["attempts"]})
+    return data
+
+
+def _deliver(kind: str, patient_email: str, params: Dict[str, Any]) -> bool:
+    """Render and send one message (runs in a worker thread)."""
+    from backend.core.email_service import send_appointment_confirmation
+    senders = {
+        "appointment_confirmation": send_appointment_confirmation,
+    }
+    if kind not in senders:
+        raise ValueError(f"Unknown outbox message kind: {kind}")
+    return senders[kind](patient_email=patient_email, **params)
+
+
+class EmailOutbox:
+    """Dispatcher plus a pool of delivery workers for the email outbox."""
+
+    def __init__(self, workers: int, max_attempts: int, poll_seconds: float, lease_seconds: float,
+                 backoff_seconds: float, max_backoff_seconds: float, batch_size: int = 50):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: Set[str] = set()
+
+    def notify(self):
+        """Wake the dispatcher after a message was enqueued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """Dispatch due messages to the worker pool. Runs until cancelled."""
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            while True:
+                self._wakeup.clear()
+                timeout = self.poll_seconds
+                try:
+                    next_due = await self._dispatch_due()
+                    if next_due is not None:
+                        # Wake up for the next retry instead of waiting a full poll interval
+                        timeout = min(timeout, max(0.0, (next_due - datetime.now(timezone.utc)).total_seconds()))
+                except Exception as e:
+                    logger.warning(f"Email outbox dispatch error: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in worker_tasks:
+                task.cancel()
+
+    async def _dispatch_due(self) -> Optional[datetime]:
+        """Queue pending messages that are due; return when the next one comes due."""
+        db = get_async_firestore()
+        query = (
+            db.collection(OUTBOX_COLLECTION)
+            .where("status", "==", "pending")
+            .order_by("next_attempt_at")
+            .limit(self.batch_size)
+        )
+        now = datetime.now(timezone.utc)
+        for doc in await query.get():
+            next_attempt_at = _as_utc(doc.to_dict().get("next_attempt_at") or now)
+            if next_attempt_at > now:
+                return next_attempt_at
+            if doc.id not in self._in_flight:
+                self._in_flight.add(doc.id)
+                self._queue.put_nowait(doc.id)
+        return None
+
+    async def _worker(self):
+        while True:
+            message_id = await self._queue.get()
+            try:
+                await self._process(message_id)
+            except Exception as e:
+                logger.warning(f"Email outbox worker error for {message_id}: {e}")
+            finally:
+                self._in_flight.discard(message_id)
+                if self._queue.empty():
+                    # Drained this batch; pick up anything else that is due
+                    self.notify()
+
+    async def _process(self, message_id: str):
+        db = get_async_firestore()
+        message_ref = db.collection(OUTBOX_COLLECTION).document(message_id)
+        now = datetime.now(timezone.utc)
+        message = await db.run_transaction(_claim, message_ref.sync, now, now + self.lease)
+        if message is None:
+            return
+
+        error = None
+        try:
+            profiles, _ = await user_profile_cache.get_many(db, [message.get("patient_id", "")])
+            patient_email = profiles.get(message.get("patient_id", ""), {}).get("email", "")
+            if not patient_email:
+                await message_ref.update({"status": "skipped", "last_error": "Patient has no email address"})
+                return
+            if await run_blocking(_deliver, message["kind"], patient_email, message.get("params") or {}):
+                await message_ref.update({"status": "sent", "sent_at": datetime.now(timezone.utc), "last_error": None})
+                logger.info(f"Outbox message {message_id} ({message['kind']}) sent to {patient_email}")
+                return
+            error = "Email delivery failed"
+        except Exception as e:
+            error = str(e)
+
+        attempts = message.get("attempts", 1)
+        if attempts >= self.max_attempts:
+            await message_ref.update({"status": "failed", "last_error": error})
+            logger.error(f"Outbox message {message_id} failed after {attempts} attempt(s): {error}")
+            return
+        delay = min(self.backoff_seconds * (2 ** (attempts - 1)), self.max_backoff_seconds)
+        await message_ref.update({
+            "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+            "last_error": error,
+        })
+        logger.warning(f"Outbox message {message_id} attempt {attempts} failed ({error}); retrying in {delay:.0f}s")
+
+
+# Global email outbox instance
+email_outbox = EmailOutbox(
+    workers=settings.EMAIL_OUTBOX_WORKERS,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    poll_seconds=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+    backoff_seconds=settings.EMAIL_OUTBOX_BACKOFF_SECONDS,
+    max_backoff_seconds=settings.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS,
+)
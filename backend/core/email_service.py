@@ -4,11 +4,18 @@ Uses Gemini AI to generate personalized email content.
 Uses SMTP for email delivery.
 """
 
-import smtplib
+import asyncio
+import hashlib
+import json
+import re
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple
 from backend.core.config import settings
+from backend.core.smtp_pool import get_smtp_pool
+from backend.core.cache import DiskCache, LRUCache, TieredCache
+from backend.core.firestore_client import run_blocking
+from backend.core.llm_gateway import llm_gateway, LLMUnavailable
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,20 +23,18 @@ logger = logging.getLogger(__name__)
 # Mock email sending if not configured
 USE_MOCK_EMAIL = settings.USE_MOCK_EMAIL
 
-# Gemini integration for email content generation
-gemini_model = None
+# Bump when the prompts change so cached emails are regenerated
+EMAIL_PROMPT_VERSION = 1
 
-if settings.GEMINI_API_KEY:
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Use FREE Gemini model (not pro)
-        gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-        logger.info("Gemini API initialized successfully for email generation")
-    except ImportError:
-        logger.warning("google-generativeai not installed. Email content will use templates.")
-    except Exception as e:
-        logger.warning(f"Failed to initialize Gemini for emails: {e}")
+# Generated emails depend only on their inputs, so resends and retries reuse them
+email_content_cache = TieredCache(
+    LRUCache(max_entries=settings.EMAIL_CONTENT_CACHE_SIZE, ttl_seconds=settings.EMAIL_CONTENT_CACHE_TTL_SECONDS),
+    DiskCache(
+        settings.EMAIL_CONTENT_CACHE_PATH,
+        max_entries=settings.EMAIL_CONTENT_CACHE_DISK_SIZE,
+        ttl_seconds=settings.EMAIL_CONTENT_CACHE_TTL_SECONDS
+    ) if settings.EMAIL_CONTENT_CACHE_PATH else None
+)
 
 
 def generate_email_content_with_gemini(
@@ -58,16 +63,99 @@ def generate_email_content_with_gemini(
     Returns:
         Dictionary with "subject" and "body" keys
     """
-    if gemini_model is None:
+    if not llm_gateway.available:
         # Fallback to template-based content
         return _get_template_content(
             email_type, patient_name, doctor_name, appointment_date,
             appointment_time, specialty, reason, questionnaire_required
         )
-    
+
+    cache_key = _email_content_cache_key(
+        email_type, patient_name, doctor_name, appointment_date,
+        appointment_time, specialty, reason, questionnaire_required
+    )
+    cached = email_content_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Email content served from cache")
+        return dict(cached)
+
+    content = _generate_email_content(
+        email_type, patient_name, doctor_name, appointment_date,
+        appointment_time, specialty, reason, questionnaire_required
+    )
+    if content is None:
+        # Template fallbacks are not cached, so the next send tries Gemini again
+        return _get_template_content(
+            email_type, patient_name, doctor_name, appointment_date,
+            appointment_time, specialty, reason, questionnaire_required
+        )
+    email_content_cache.set(cache_key, content)
+    return content
+
+
+def _email_content_cache_key(
+    email_type: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str],
+    questionnaire_required: bool
+) -> str:
+    """Hash of every input the generated email depends on, normalized."""
+    def norm(value) -> str:
+        return " ".join(str(value or "").split())
+
+    fields = [
+        EMAIL_PROMPT_VERSION, llm_gateway.model_name, settings.CLINIC_NAME, settings.CLINIC_PHONE,
+        norm(email_type).lower(), norm(patient_name), norm(doctor_name), norm(appointment_date),
+        " ".join(norm(appointment_time).upper().split()), norm(specialty), norm(reason),
+        # Reminders never mention the questionnaire
+        bool(questionnaire_required) if email_type == "confirmation" else False,
+    ]
+    return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+
+def _generate_email_content(
+    email_type: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None,
+    questionnaire_required: bool = False
+) -> Optional[Dict[str, str]]:
+    """Ask Gemini for the email; returns None if generation or parsing fails."""
     try:
-        if email_type == "confirmation":
-            prompt = f"""Generate a warm, professional appointment confirmation email for a medical appointment.
+        prompt = _email_prompt(
+            email_type, patient_name, doctor_name, appointment_date,
+            appointment_time, specialty, reason, questionnaire_required
+        )
+        content = llm_gateway.generate_sync(prompt, purpose="email")
+        return _parse_email_content(content, email_type, doctor_name, appointment_date)
+    except LLMUnavailable as e:
+        logger.warning(f"Gemini unavailable for email content: {e}, using template")
+        return None
+    except Exception as e:
+        logger.error(f"Error generating email with Gemini: {e}, using template")
+        return None
+
+
+def _email_prompt(
+    email_type: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None,
+    questionnaire_required: bool = False
+) -> str:
+    """Gemini prompt for one confirmation or reminder email."""
+    if email_type == "confirmation":
+        return f"""Generate a warm, professional appointment confirmation email for a medical appointment.
 
 Patient Name: {patient_name}
 Doctor: {doctor_name} ({specialty})
@@ -98,8 +186,8 @@ Format the response as:
 SUBJECT: [subject line]
 BODY: [HTML body - use proper HTML formatting with inline styles for email clients]
 """
-        else:  # reminder
-            prompt = f"""Generate a friendly appointment reminder email for a medical appointment happening in 24 hours.
+    else:  # reminder
+        return f"""Generate a friendly appointment reminder email for a medical appointment happening in 24 hours.
 
 Patient Name: {patient_name}
 Doctor: {doctor_name} ({specialty})
@@ -128,66 +216,204 @@ Format the response as:
 SUBJECT: [subject line]
 BODY: [HTML body - use proper HTML formatting with inline styles for email clients]
 """
-        
-        response = gemini_model.generate_content(prompt)
-        content = response.text
-        
-        # Parse response
-        subject = ""
-        body = ""
-        
-        lines = content.split("\n")
-        in_body = False
-        body_lines = []
-        
-        for line in lines:
-            if line.startswith("SUBJECT:"):
-                subject = line.replace("SUBJECT:", "").strip()
-            elif line.startswith("BODY:"):
-                in_body = True
-                body_text = line.replace("BODY:", "").strip()
-                if body_text:
-                    body_lines.append(body_text)
-            elif in_body:
-                body_lines.append(line)
-        
-        if subject and body_lines:
-            body = "\n".join(body_lines)
-            # Post-process to enforce clinic name/phone and remove links
-            try:
-                import re
-                # Replace common placeholders
-                body = body.replace("[Your Clinic Name]", settings.CLINIC_NAME)
-                body = body.replace("[Your Clinic Phone Number]", settings.CLINIC_PHONE)
-                # Replace any 'Click here' prompts with instruction text
-                body = re.sub(r"<a[^>]*>(.*?)</a>", r"\\1", body)
-                body = re.sub(r"(?i)click here[^.<]*", "Please complete the pre-visit questionnaire in the app before your appointment.", body)
-                # Remove Markdown code fences like ```html ... ```
-                body = re.sub(r"^```[a-zA-Z]*\s*", "", body.strip())
-                body = re.sub(r"```\s*$", "", body)
-            except Exception:
-                pass
-            # Enforce deterministic subjects per email type
-            if email_type == "confirmation":
-                subject = f"Appointment Booked: {doctor_name} on {appointment_date}"
-            else:
-                subject = f"24-Hour Reminder: {doctor_name} Appt Tomorrow 🩺"
-            logger.info("Email content generated using Gemini AI")
-            return {"subject": subject, "body": body}
+
+
+def _parse_email_content(
+    content: str,
+    email_type: str,
+    doctor_name: str,
+    appointment_date: str
+) -> Optional[Dict[str, str]]:
+    """Parse a SUBJECT:/BODY: response; returns None if it doesn't parse."""
+    # Parse response
+    subject = ""
+    body = ""
+    
+    lines = content.split("\n")
+    in_body = False
+    body_lines = []
+    
+    for line in lines:
+        if line.startswith("SUBJECT:"):
+            subject = line.replace("SUBJECT:", "").strip()
+        elif line.startswith("BODY:"):
+            in_body = True
+            body_text = line.replace("BODY:", "").strip()
+            if body_text:
+                body_lines.append(body_text)
+        elif in_body:
+            body_lines.append(line)
+    
+    if subject and body_lines:
+        body = "\n".join(body_lines)
+        # Post-process to enforce clinic name/phone and remove links
+        try:
+            import re
+            # Replace common placeholders
+            body = body.replace("[Your Clinic Name]", settings.CLINIC_NAME)
+            body = body.replace("[Your Clinic Phone Number]", settings.CLINIC_PHONE)
+            # Replace any 'Click here' prompts with instruction text
+            body = re.sub(r"<a[^>]*>(.*?)</a>", r"\\1", body)
+            body = re.sub(r"(?i)click here[^.<]*", "Please complete the pre-visit questionnaire in the app before your appointment.", body)
+            # Remove Markdown code fences like ```html ... ```
+            body = re.sub(r"^```[a-zA-Z]*\s*", "", body.strip())
+            body = re.sub(r"```\s*$", "", body)
+        except Exception:
+            pass
+        # Enforce deterministic subjects per email type
+        if email_type == "confirmation":
+            subject = f"Appointment Booked: {doctor_name} on {appointment_date}"
         else:
-            # Fallback if parsing fails
-            logger.warning("Failed to parse Gemini response, using template")
-            return _get_template_content(
-                email_type, patient_name, doctor_name, appointment_date,
-                appointment_time, specialty, reason, questionnaire_required
-            )
-            
-    except Exception as e:
-        logger.error(f"Error generating email with Gemini: {e}, using template")
-        return _get_template_content(
-            email_type, patient_name, doctor_name, appointment_date,
-            appointment_time, specialty, reason, questionnaire_required
-        )
+            subject = f"24-Hour Reminder: {doctor_name} Appt Tomorrow 🩺"
+        logger.info("Email content generated using Gemini AI")
+        return {"subject": subject, "body": body}
+    else:
+        logger.warning("Failed to parse Gemini response, using template")
+        return None
+
+
+def _batch_marker(index: int) -> str:
+    return f"=== ITEM {index} ==="
+
+
+def _batch_prompt(items: List[Tuple]) -> str:
+    """One prompt asking for several emails; items are _email_prompt() arguments."""
+    sections = "\n".join(
+        f"{_batch_marker(index)}\n{_email_prompt(*item)}" for index, item in enumerate(items, 1)
+    )
+    return f"""You will write {len(items)} separate emails. Each item below has its own instructions.
+
+Answer every item, in order. Start each answer with its marker line exactly as given
+(for example "{_batch_marker(1)}"), followed by that item's SUBJECT: and BODY: lines.
+Do not add any other text before, between or after the items.
+
+{sections}"""
+
+
+def _split_batch_response(content: str, count: int) -> List[Optional[str]]:
+    """Split a batched response into per-item texts; missing items are None."""
+    parts = re.split(r"^\s*=== ITEM (\d+) ===\s*$", content, flags=re.MULTILINE)
+    blocks = {int(number): block.strip() for number, block in zip(parts[1::2], parts[2::2])}
+    return [blocks.get(index) or None for index in range(1, count + 1)]
+
+
+class EmailBatcher:
+    """
+    Packs concurrent email generations into one multi-item Gemini prompt.
+
+    A batch goes out once batch_size requests are waiting, or max_wait_seconds
+    after its first request, whichever comes first. Items whose part of the
+    response doesn't parse come back as None, so the caller uses its template.
+    A batch_size of 1 sends every request on its own.
+    """
+
+    def __init__(self, batch_size: int, max_wait_seconds: float, timeout: float):
+        self.batch_size = max(1, batch_size)
+        self.max_wait_seconds = max_wait_seconds
+        self.timeout = timeout
+        self._pending: List[Tuple[Tuple, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches, referenced so they aren't garbage collected
+        self._batches: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "batches": 0, "llm_calls_saved": 0, "item_fallbacks": 0}
+
+    async def generate(self, item: Tuple) -> Optional[Dict[str, str]]:
+        """Generate one email; item holds _email_prompt() arguments."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Tuple, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            contents = await self._generate_contents(items)
+        except Exception as e:
+            logger.error(f"Batched email generation failed: {e}, using templates")
+            contents = [None] * len(items)
+        self.stats["batches"] += 1
+        self.stats["llm_calls_saved"] += len(items) - 1
+        self.stats["item_fallbacks"] += sum(1 for content in contents if content is None)
+        for (_, future), content in zip(batch, contents):
+            if not future.done():
+                future.set_result(content)
+
+    async def _generate_contents(self, items: List[Tuple]) -> List[Optional[Dict[str, str]]]:
+        # (email_type, patient_name, doctor_name, appointment_date, ...)
+        try:
+            if len(items) == 1:
+                content = await llm_gateway.generate(_email_prompt(*items[0]), purpose="email")
+                blocks = [content]
+            else:
+                content = await llm_gateway.generate(_batch_prompt(items), purpose="email", timeout=self.timeout)
+                blocks = _split_batch_response(content, len(items))
+                logger.info(f"Generated {len(items)} emails in one Gemini call")
+        except LLMUnavailable as e:
+            logger.warning(f"Gemini unavailable for {len(items)} email(s): {e}, using templates")
+            return [None] * len(items)
+        return [
+            _parse_email_content(block, item[0], item[2], item[3]) if block else None
+            for item, block in zip(items, blocks)
+        ]
+
+
+# Global email batcher instance
+email_batcher = EmailBatcher(
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    max_wait_seconds=settings.EMAIL_BATCH_MAX_WAIT_MS / 1000,
+    timeout=settings.EMAIL_BATCH_TIMEOUT_SECONDS
+)
+
+
+async def agenerate_email_content(
+    email_type: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None,
+    questionnaire_required: bool = False
+) -> Dict[str, str]:
+    """
+    Async variant of generate_email_content_with_gemini.
+    Concurrent calls are generated together through email_batcher.
+    """
+    item = (
+        email_type, patient_name, doctor_name, appointment_date,
+        appointment_time, specialty, reason, questionnaire_required
+    )
+    if not llm_gateway.available:
+        return _get_template_content(*item)
+
+    cache_key = _email_content_cache_key(*item)
+    # The cache's disk tier is SQLite; keep it off the event loop
+    cached = await run_blocking(email_content_cache.get, cache_key)
+    if cached is not None:
+        logger.info("Email content served from cache")
+        return dict(cached)
+
+    content = await email_batcher.generate(item)
+    if content is None:
+        return _get_template_content(*item)
+    await run_blocking(email_content_cache.set, cache_key, content)
+    return content
 
 
 def _get_template_content(
@@ -257,7 +483,7 @@ def send_email(
     text_body: Optional[str] = None
 ) -> bool:
     """
-    Send an email using SMTP.
+    Send an email over a pooled SMTP session.
     
     Args:
         to_email: Recipient email address
@@ -289,10 +515,7 @@ def send_email(
         msg.attach(MIMEText(text_body or html_body, 'plain'))
         msg.attach(MIMEText(html_body, 'html'))
 
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        get_smtp_pool().send_message(msg)
 
         logger.info(f"Email sent successfully to {to_email}")
         return True
@@ -302,8 +525,19 @@ def send_email(
         return False
 
 
-def send_appointment_confirmation(
-    patient_email: str,
+def _render(email_content: Dict[str, str]) -> Dict[str, str]:
+    """Turn generated content into subject, HTML body and plain text body."""
+    import re
+    html_body = email_content["body"]
+    return {
+        "subject": email_content["subject"],
+        "html_body": html_body,
+        # Generate plain text version
+        "text_body": re.sub('<[^<]+?>', '', html_body),
+    }
+
+
+def render_appointment_confirmation(
     patient_name: str,
     doctor_name: str,
     appointment_date: str,
@@ -311,13 +545,9 @@ def send_appointment_confirmation(
     specialty: str,
     reason: Optional[str] = None,
     questionnaire_required: bool = True
-) -> bool:
-    """
-    Send appointment confirmation email to patient.
-    Uses Gemini AI to generate personalized content.
-    """
-    # Generate email content using Gemini
-    email_content = generate_email_content_with_gemini(
+) -> Dict[str, str]:
+    """Render the confirmation email (Gemini or template) without sending it."""
+    return _render(generate_email_content_with_gemini(
         email_type="confirmation",
         patient_name=patient_name,
         doctor_name=doctor_name,
@@ -326,33 +556,40 @@ def send_appointment_confirmation(
         specialty=specialty,
         reason=reason,
         questionnaire_required=questionnaire_required
-    )
-    
-    subject = email_content["subject"]
-    html_body = email_content["body"]
-    
-    # Generate plain text version
-    import re
-    text_body = re.sub('<[^<]+?>', '', html_body)
-    
-    return send_email(patient_email, subject, html_body, text_body)
+    ))
 
 
-def send_appointment_reminder(
-    patient_email: str,
+def render_appointment_reminder(
     patient_name: str,
     doctor_name: str,
     appointment_date: str,
     appointment_time: str,
     specialty: str,
     reason: Optional[str] = None
-) -> bool:
-    """
-    Send appointment reminder email 24 hours before appointment.
-    Uses Gemini AI to generate personalized content.
-    """
-    # Generate email content using Gemini
-    email_content = generate_email_content_with_gemini(
+) -> Dict[str, str]:
+    """Render the reminder email (Gemini or template) without sending it."""
+    return _render(generate_email_content_with_gemini(
+        email_type="reminder",
+        patient_name=patient_name,
+        doctor_name=doctor_name,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        specialty=specialty,
+        reason=reason,
+        questionnaire_required=False
+    ))
+
+
+async def arender_appointment_reminder(
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None
+) -> Dict[str, str]:
+    """Async variant of render_appointment_reminder; concurrent renders share Gemini calls."""
+    return _render(await agenerate_email_content(
         email_type="reminder",
         patient_name=patient_name,
         doctor_name=doctor_name,
@@ -361,13 +598,49 @@ def send_appointment_reminder(
         specialty=specialty,
         reason=reason,
         questionnaire_required=False
+    ))
+
+
+def send_rendered_email(to_email: str, content: Dict[str, str]) -> bool:
+    """Send pre-rendered content from render_appointment_*(); no generation involved."""
+    return send_email(to_email, content["subject"], content["html_body"], content.get("text_body"))
+
+
+def send_appointment_confirmation(
+    patient_email: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None,
+    questionnaire_required: bool = True
+) -> bool:
+    """
+    Send appointment confirmation email to patient.
+    Uses Gemini AI to generate personalized content.
+    """
+    content = render_appointment_confirmation(
+        patient_name, doctor_name, appointment_date, appointment_time,
+        specialty, reason, questionnaire_required
     )
-    
-    subject = email_content["subject"]
-    html_body = email_content["body"]
-    
-    # Generate plain text version
-    import re
-    text_body = re.sub('<[^<]+?>', '', html_body)
-    
-    return send_email(patient_email, subject, html_body, text_body)
+    return send_rendered_email(patient_email, content)
+
+
+def send_appointment_reminder(
+    patient_email: str,
+    patient_name: str,
+    doctor_name: str,
+    appointment_date: str,
+    appointment_time: str,
+    specialty: str,
+    reason: Optional[str] = None
+) -> bool:
+    """
+    Send appointment reminder email 24 hours before appointment.
+    Uses Gemini AI to generate personalized content.
+    """
+    content = render_appointment_reminder(
+        patient_name, doctor_name, appointment_date, appointment_time, specialty, reason
+    )
+    return send_rendered_email(patient_email, content)
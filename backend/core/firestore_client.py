@@ -1,17 +1,31 @@
 """
 Firebase Admin SDK and Firestore client setup.
+
+Route handlers should use get_async_firestore(), which wraps the synchronous
+client in an async facade so Firestore round trips never block the event loop.
+With FIRESTORE_BACKEND=memory an in-process stand-in is used instead of Firebase.
 """
 
 import os
 import json
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, firestore
-from typing import Optional
+from typing import Optional, Any, Callable, Dict, Iterable, List
 from backend.core.config import settings
+from backend.core.memory_firestore import MemoryFirestoreClient
 
 # Global Firestore client
 db: Optional[firestore.Client] = None
 
+# Global async facade over the Firestore client
+async_db: Optional["AsyncFirestore"] = None
+
+# Thread pool for blocking Firestore calls
+_executor: Optional[ThreadPoolExecutor] = None
+
 
 def initialize_firebase() -> firestore.Client:
     """
@@ -22,6 +36,14 @@ def initialize_firebase() -> firestore.Client:
     
     if db is not None:
         return db
+
+    if settings.FIRESTORE_BACKEND == "memory":
+        db = MemoryFirestoreClient(
+            indexed_fields=settings.MEMORY_FIRESTORE_INDEXED_FIELDS,
+            sqlite_path=settings.MEMORY_FIRESTORE_PATH,
+            latency_ms=settings.MEMORY_FIRESTORE_LATENCY_MS
+        )
+        return db
     
     try:
         # Check if Firebase is already initialized
@@ -76,3 +98,154 @@ def get_firestore() -> firestore.Client:
         db = initialize_firebase()
     return db
 
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for blocking Firestore calls."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FIRESTORE_MAX_WORKERS,
+            thread_name_prefix="firestore"
+        )
+    return _executor
+
+
+def get_in_transaction(transaction, reference):
+    """Read one document inside a transaction, returning its snapshot."""
+    result = transaction.get(reference)
+    # The Firestore client yields snapshots even for single document reads
+    return result if hasattr(result, "exists") else next(iter(result))
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Firestore call on the Firestore thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+class AsyncQuery:
+    """
+    Async view over a Firestore query.
+    Builder methods (where/order_by/limit) are local; get() and count() perform the round trip.
+    """
+
+    def __init__(self, query):
+        self.sync = query
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "AsyncQuery":
+        return AsyncQuery(self.sync.where(field_path, op_string, value))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "AsyncQuery":
+        return AsyncQuery(self.sync.order_by(field_path, direction=direction))
+
+    def limit(self, count: int) -> "AsyncQuery":
+        return AsyncQuery(self.sync.limit(count))
+
+    async def get(self) -> List[Any]:
+        """Execute the query and return all matching document snapshots."""
+        return await run_blocking(lambda: list(self.sync.stream()))
+
+    async def count(self) -> int:
+        """Count matching documents with an aggregation query, without fetching them."""
+        def _count():
+            results = self.sync.count(alias="count").get()
+            return int(results[0][0].value)
+        return await run_blocking(_count)
+
+
+class AsyncDocumentReference:
+    """Async view over a Firestore document reference."""
+
+    def __init__(self, reference):
+        self.sync = reference
+
+    @property
+    def id(self) -> str:
+        return self.sync.id
+
+    async def get(self):
+        return await run_blocking(self.sync.get)
+
+    async def set(self, document_data: Dict[str, Any], merge: bool = False):
+        return await run_blocking(self.sync.set, document_data, merge=merge)
+
+    async def update(self, field_updates: Dict[str, Any]):
+        return await run_blocking(self.sync.update, field_updates)
+
+    async def delete(self):
+        return await run_blocking(self.sync.delete)
+
+
+class AsyncCollectionReference(AsyncQuery):
+    """Async view over a Firestore collection reference."""
+
+    @property
+    def id(self) -> str:
+        return self.sync.id
+
+    def document(self, document_id: Optional[str] = None) -> AsyncDocumentReference:
+        """Get a document reference; a random ID is generated when none is given."""
+        return AsyncDocumentReference(self.sync.document(document_id))
+
+
+class AsyncWriteBatch:
+    """Async view over a Firestore write batch. Writes are staged locally until commit()."""
+
+    def __init__(self, batch):
+        self.sync = batch
+
+    def set(self, reference: AsyncDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self.sync.set(reference.sync, document_data, merge=merge)
+
+    def update(self, reference: AsyncDocumentReference, field_updates: Dict[str, Any]):
+        self.sync.update(reference.sync, field_updates)
+
+    def delete(self, reference: AsyncDocumentReference):
+        self.sync.delete(reference.sync)
+
+    async def commit(self):
+        return await run_blocking(self.sync.commit)
+
+
+class AsyncFirestore:
+    """
+    Async facade over a synchronous Firestore client.
+    Every network round trip runs on a bounded thread pool, so a slow
+    Firestore call only occupies a worker thread instead of the event loop.
+    """
+
+    def __init__(self, client):
+        self.sync = client
+
+    def collection(self, collection_id: str) -> AsyncCollectionReference:
+        return AsyncCollectionReference(self.sync.collection(collection_id))
+
+    def batch(self) -> AsyncWriteBatch:
+        return AsyncWriteBatch(self.sync.batch())
+
+    async def run_transaction(self, fn: Callable, *args) -> Any:
+        """
+        Run ``fn(transaction, *args)`` in a transaction on the Firestore thread pool.
+        ``fn`` is synchronous and works with sync references (``ref.sync``);
+        Firestore retries it on contention, so it must not have side effects.
+        """
+        def _run():
+            if isinstance(self.sync, MemoryFirestoreClient):
+                return self.sync.run_transaction(fn, *args)
+            return firestore.transactional(fn)(self.sync.transaction(), *args)
+        return await run_blocking(_run)
+
+    async def get_all(self, references: Iterable[AsyncDocumentReference]) -> List[Any]:
+        """Fetch several documents in a single round trip (order is not guaranteed)."""
+        sync_refs = [ref.sync for ref in references]
+        if not sync_refs:
+            return []
+        return await run_blocking(lambda: list(self.sync.get_all(sync_refs)))
+
+
+def get_async_firestore() -> AsyncFirestore:
+    """Get the async Firestore facade, initializing the client if necessary."""
+    global async_db
+    if async_db is None:
+        async_db = AsyncFirestore(get_firestore())
+    return async_db
@@ -0,0 +1,333 @@
+"""
+Gateway for every Gemini call made by the backend.
+
+The gateway owns the single GenerativeModel and wraps each call with:
+- a global concurrency limit and a per-purpose limit ("email", "summary", ...)
+- a hard deadline covering both the wait for a slot and the request itself
+  (the SDK call runs on the gateway's request threads and is abandoned at
+  the deadline; its slots stay taken until it actually returns)
+- a circuit breaker that stops calling Gemini for LLM_CIRCUIT_RESET_SECONDS
+  after LLM_CIRCUIT_FAILURE_THRESHOLD consecutive failures
+- per-purpose latency (of successful calls) and token metrics
+
+generate_sync() blocks the calling thread, generate() awaits the result and
+stream() yields text chunks as they arrive.
+
+Every failure is raised as LLMUnavailable so callers can fall back to their
+templates or simple summaries right away.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from backend.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stream() response on its chunk queue
+_END_OF_STREAM = object()
+
+
+class LLMUnavailable(Exception):
+    """The LLM call was not made or did not succeed in time; use a fallback."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    Closed: calls pass. Open: calls are rejected until reset_seconds have
+    passed. Half-open: one trial call decides whether to close or reopen.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            # Open, or half-open with the trial call still running
+            return False
+
+    def release(self):
+        """A permitted call ended without reaching the LLM; let the next call try."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"LLM circuit opened after {self._failures} consecutive failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LLMGateway:
+    """
+    Rate-limited, deadline-bound access to one Gemini model.
+
+    Args:
+        model: Anything with generate_content(prompt, stream=...);
+            defaults to the configured Gemini model (None when no API key is set)
+        model_name: Gemini model name
+        max_concurrency: Concurrent LLM calls across all purposes
+        purpose_limits: Concurrent calls per purpose; purposes not listed only
+            share the global limit
+        timeout: Default deadline in seconds for a call
+        breaker: Circuit breaker shared by all purposes
+    """
+
+    def __init__(
+        self,
+        model: Any = None,
+        model_name: str = settings.LLM_MODEL,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        purpose_limits: Optional[Dict[str, int]] = None,
+        timeout: float = settings.LLM_TIMEOUT_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.model_name = model_name
+        self.model = model if model is not None else self._create_model(model_name)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(
+            settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._purpose_slots = {
+            purpose: threading.BoundedSemaphore(limit)
+            for purpose, limit in (settings.LLM_PURPOSE_CONCURRENCY if purpose_limits is None else purpose_limits).items()
+        }
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        # Runs the SDK calls themselves; a free worker is guaranteed by holding a global slot
+        self._requests = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-request")
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _create_model(model_name: str):
+        if not settings.GEMINI_API_KEY:
+            return None
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            model = genai.GenerativeModel(model_name)
+            logger.info(f"Gemini API initialized successfully ({model_name})")
+            return model
+        except ImportError:
+            logger.warning("google-generativeai not installed. LLM features will use fallbacks.")
+        except Exception as e:
+            logger.warning(f"Failed to initialize Gemini: {e}")
+        return None
+
+    @property
+    def available(self) -> bool:
+        """Whether a model is configured (the circuit may still be open)."""
+        return self.model is not None
+
+    def generate_sync(self, prompt: str, purpose: str, timeout: Optional[float] = None,
+                      deadline: Optional[float] = None) -> str:
+        """
+        Generate text for a prompt, blocking the calling thread.
+
+        Args:
+            prompt: Prompt text
+            purpose: What the call is for, e.g. "email" or "summary"
+            timeout: Seconds allowed for the call (defaults to LLM_TIMEOUT_SECONDS)
+            deadline: Absolute time.monotonic() deadline; overrides timeout
+
+        Raises:
+            LLMUnavailable: No model, circuit open, deadline exceeded or the call failed
+        """
+        if deadline is None:
+            deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        def request():
+            response = self.model.generate_content(prompt)
+            return response.text, getattr(response, "usage_metadata", None)
+
+        return self._call(purpose, deadline, request)
+
+    def _call(self, purpose: str, deadline: float, request: Callable[[], Tuple[str, Any]]) -> str:
+        """
+        Run request() -> (text, usage_metadata) under the breaker, the
+        concurrency limits and the deadline.
+        """
+        if self.model is None:
+            raise LLMUnavailable("LLM is not configured")
+        if not self.breaker.allow():
+            self._record(purpose, "rejected")
+            raise LLMUnavailable("LLM circuit is open")
+
+        purpose_slot = self._purpose_slots.get(purpose)
+        acquired = []
+        try:
+            for slot in (purpose_slot, self._slots):
+                if slot is None:
+                    continue
+                if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    self._record(purpose, "timeouts")
+                    # Waiting for a slot isn't the LLM's fault; don't trip the breaker
+                    self.breaker.release()
+                    raise LLMUnavailable(f"Timed out waiting for an LLM slot ({purpose})")
+                acquired.append(slot)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._record(purpose, "timeouts")
+                self.breaker.release()
+                raise LLMUnavailable(f"LLM deadline exceeded before the call ({purpose})")
+
+            started = time.monotonic()
+            future = self._requests.submit(request)
+            try:
+                text, usage = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # The SDK call can't be interrupted: its slots are freed when it returns
+                held, acquired = acquired, []
+                future.add_done_callback(lambda _: self._release(held))
+                self.breaker.record_failure()
+                self._record(purpose, "timeouts")
+                raise LLMUnavailable(f"LLM deadline exceeded ({purpose})")
+            except Exception as e:
+                self.breaker.record_failure()
+                timed_out = time.monotonic() >= deadline
+                self._record(purpose, "timeouts" if timed_out else "failures")
+                raise LLMUnavailable(f"LLM call failed ({purpose}): {e}") from e
+
+            self.breaker.record_success()
+            self._record(purpose, "calls", time.monotonic() - started, usage)
+            return text
+        finally:
+            self._release(acquired)
+
+    @staticmethod
+    def _release(slots):
+        for slot in slots:
+            slot.release()
+
+    async def generate(self, prompt: str, purpose: str, timeout: Optional[float] = None) -> str:
+        """
+        Async variant of generate_sync; the call runs on the gateway's threads.
+        The caller gets LLMUnavailable at the deadline even if the request
+        is still in flight.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, lambda: self.generate_sync(prompt, purpose, deadline=deadline)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # The worker thread records the timeout when it reaches the same deadline
+            raise LLMUnavailable(f"LLM deadline exceeded ({purpose})")
+
+    async def stream(self, prompt: str, purpose: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield text chunks as Gemini produces them. The deadline covers the
+        whole stream; limits, breaker and metrics work as for generate().
+
+        Raises:
+            LLMUnavailable: Before or after some chunks were yielded
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def emit(item: Any):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                # The event loop is gone
+                stopped.set()
+
+        def request():
+            response = self.model.generate_content(prompt, stream=True)
+            parts = []
+            for chunk in response:
+                if stopped.is_set():
+                    break
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("LLM stream deadline exceeded")
+                parts.append(chunk.text)
+                emit(chunk.text)
+            return "".join(parts), getattr(response, "usage_metadata", None)
+
+        def produce():
+            try:
+                self._call(purpose, deadline, request)
+                emit(_END_OF_STREAM)
+            except BaseException as e:
+                emit(e)
+
+        self._executor.submit(produce)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(chunks.get(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    raise LLMUnavailable(f"LLM deadline exceeded ({purpose})")
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop reading the response if the consumer went away
+            stopped.set()
+
+    def _record(self, purpose: str, outcome: str, latency: Optional[float] = None, usage: Any = None):
+        with self._lock:
+            metrics = self._metrics.setdefault(purpose, {
+                "calls": 0, "failures": 0, "timeouts": 0, "rejected": 0,
+                "latency_ms_total": 0.0, "latency_ms_max": 0.0,
+                "prompt_tokens": 0, "output_tokens": 0,
+            })
+            metrics[outcome] += 1
+            if latency is not None:
+                metrics["latency_ms_total"] += latency * 1000
+                metrics["latency_ms_max"] = max(metrics["latency_ms_max"], latency * 1000)
+            if usage is not None:
+                metrics["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+                metrics["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            purposes = {}
+            for purpose, metrics in self._metrics.items():
+                calls = metrics["calls"]
+                purposes[purpose] = {
+                    **metrics,
+                    "latency_ms_total": round(metrics["latency_ms_total"], 1),
+                    "latency_ms_max": round(metrics["latency_ms_max"], 1),
+                    "latency_ms_avg": round(metrics["latency_ms_total"] / calls, 1) if calls else 0.0,
+                }
+        return {"model": self.model_name, "available": self.available, "circuit": self.breaker.state,
+                "purposes": purposes}
+
+
+# Global gateway instance
+llm_gateway = LLMGateway()
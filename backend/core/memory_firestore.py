@@ -0,0 +1,609 @@
+"""
+In-process stand-in for the Firestore client, for local load testing and CI.
+
+Implements the subset of the Firestore API used by the backend:
+collection().where().order_by().limit().stream()/get()/count(), document().get/set/
+update/delete, get_all, write batches and transactions. Equality fields listed
+in MEMORY_FIRESTORE_INDEXED_FIELDS get hash indexes, so filtered queries don't
+scan whole collections. Documents can optionally be persisted to SQLite.
+
+Select it with FIRESTORE_BACKEND=memory.
+"""
+
+import copy
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+try:
+    from google.cloud.firestore_v1 import transforms
+except ImportError:  # pragma: no cover - google-cloud-firestore ships with firebase-admin
+    transforms = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class NotFound(Exception):
+    """Raised when updating a document that does not exist."""
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:20]
+
+
+def _ref_id(value: Any) -> Any:
+    """Document references compare by ID when used as __name__ filter values."""
+    return getattr(value, "id", value)
+
+
+def _normalize(value: Any) -> Any:
+    """Firestore stores timestamps in UTC and returns timezone-aware datetimes."""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    """Read a (possibly dotted) field path, returning _MISSING if absent."""
+    current: Any = data
+    for part in field_path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _apply_value(container: Dict[str, Any], key: str, value: Any):
+    """Write one value into a dict, resolving Firestore sentinels and transforms."""
+    if transforms is not None:
+        if value is transforms.DELETE_FIELD:
+            container.pop(key, None)
+            return
+        if value is transforms.SERVER_TIMESTAMP:
+            container[key] = datetime.now(timezone.utc)
+            return
+        if isinstance(value, transforms.Increment):
+            current = container.get(key)
+            container[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+            return
+        if isinstance(value, transforms.ArrayUnion):
+            current = list(container.get(key) or [])
+            current.extend(v for v in value.values if v not in current)
+            container[key] = current
+            return
+        if isinstance(value, transforms.ArrayRemove):
+            container[key] = [v for v in (container.get(key) or []) if v not in value.values]
+            return
+    if isinstance(value, dict):
+        nested: Dict[str, Any] = {}
+        for nested_key, nested_value in value.items():
+            _apply_value(nested, nested_key, nested_value)
+        container[key] = nested
+        return
+    container[key] = _normalize(copy.deepcopy(value))
+
+
+def _merge_into(target: Dict[str, Any], updates: Dict[str, Any]):
+    """Deep-merge updates into target (set(..., merge=True) semantics)."""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_into(target[key], value)
+        else:
+            _apply_value(target, key, value)
+
+
+def _update_field_paths(target: Dict[str, Any], updates: Dict[str, Any]):
+    """Apply update() semantics, where dotted keys address nested fields."""
+    for field_path, value in updates.items():
+        parts = field_path.split(".")
+        container = target
+        for part in parts[:-1]:
+            if not isinstance(container.get(part), dict):
+                container[part] = {}
+            container = container[part]
+        _apply_value(container, parts[-1], value)
+
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    """Evaluate one filter against a field value."""
+    if value is _MISSING:
+        # Documents missing the field never match, not even != / not-in
+        return False
+    try:
+        if op == "==":
+            return value == expected
+        if op == "!=":
+            return value != expected
+        if op == "<":
+            return value < expected
+        if op == "<=":
+            return value <= expected
+        if op == ">":
+            return value > expected
+        if op == ">=":
+            return value >= expected
+        if op == "in":
+            return value in expected
+        if op == "not-in":
+            return value not in expected
+        if op == "array-contains":
+            return isinstance(value, list) and expected in value
+        if op == "array-contains-any":
+            return isinstance(value, list) and any(v in value for v in expected)
+    except TypeError:
+        # Firestore never matches values of different types
+        return False
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Order values by type first (as Firestore does), then by value."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    return (5, str(value))
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+class _CollectionStore:
+    """Documents of one collection plus hash indexes on equality fields."""
+
+    def __init__(self, indexed_fields: Iterable[str]):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in indexed_fields}
+        # Documents whose indexed value can't be hashed (e.g. lists); always candidates
+        self.unindexed: Dict[str, Set[str]] = {field: set() for field in indexed_fields}
+
+    def _unindex(self, doc_id: str, data: Dict[str, Any]):
+        for field, index in self.indexes.items():
+            value = data.get(field, _MISSING)
+            if value is _MISSING:
+                continue
+            if _hashable(value):
+                ids = index.get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del index[value]
+            else:
+                self.unindexed[field].discard(doc_id)
+
+    def _index(self, doc_id: str, data: Dict[str, Any]):
+        for field, index in self.indexes.items():
+            value = data.get(field, _MISSING)
+            if value is _MISSING:
+                continue
+            if _hashable(value):
+                index.setdefault(value, set()).add(doc_id)
+            else:
+                self.unindexed[field].add(doc_id)
+
+    def put(self, doc_id: str, data: Dict[str, Any]):
+        previous = self.docs.get(doc_id)
+        if previous is not None:
+            self._unindex(doc_id, previous)
+        self.docs[doc_id] = data
+        self._index(doc_id, data)
+
+    def remove(self, doc_id: str):
+        previous = self.docs.pop(doc_id, None)
+        if previous is not None:
+            self._unindex(doc_id, previous)
+
+    def candidates(self, filters: List[Tuple[str, str, Any]]) -> Iterable[str]:
+        """Pick the smallest candidate ID set an index can provide for the filters."""
+        best: Optional[Set[str]] = None
+        for field, op, value in filters:
+            if field not in self.indexes or op not in ("==", "in"):
+                continue
+            values = value if op == "in" else [value]
+            if not all(_hashable(v) for v in values):
+                continue
+            ids: Set[str] = set(self.unindexed[field])
+            for v in values:
+                ids |= self.indexes[field].get(v, set())
+            if best is None or len(ids) < len(best):
+                best = ids
+        return list(best) if best is not None else list(self.docs.keys())
+
+
+class MemoryDocumentSnapshot:
+    """Snapshot of a document at read time."""
+
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        return None if value is _MISSING else copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    """Reference to a document in the in-memory store."""
+
+    def __init__(self, client: "MemoryFirestoreClient", collection_path: str, document_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, *args, **kwargs) -> MemoryDocumentSnapshot:
+        self._client._round_trip()
+        with self._client._lock:
+            self._client.stats["reads"] += 1
+            return self._client._snapshot(self)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._write([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._write([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any]):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._write([("update", self, field_updates, False)])
+
+    def delete(self):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._write([("delete", self, None, False)])
+
+
+class MemoryQuery:
+    """Immutable query over one collection."""
+
+    def __init__(self, client: "MemoryFirestoreClient", collection_path: str,
+                 filters: Optional[List[Tuple[str, str, Any]]] = None,
+                 orders: Optional[List[Tuple[str, str]]] = None,
+                 limit_count: Optional[int] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit_count
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        params = {
+            "filters": list(self._filters),
+            "orders": list(self._orders),
+            "limit_count": self._limit,
+        }
+        params.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **params)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Any = None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if field_path == "__name__":
+            value = [_ref_id(v) for v in value] if op_string in ("in", "not-in") else _ref_id(value)
+        elif op_string in ("in", "not-in", "array-contains-any"):
+            value = [_normalize(v) for v in value]
+        else:
+            value = _normalize(value)
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit_count=count)
+
+    def _field(self, doc_id: str, data: Dict[str, Any], field_path: str) -> Any:
+        return doc_id if field_path == "__name__" else _get_field(data, field_path)
+
+    def _results(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        """Matching (doc_id, data) pairs and the number of documents scanned; needs the client lock."""
+        store = self._client._store(self._collection_path)
+        results: List[Tuple[str, Dict[str, Any]]] = []
+        scanned = 0
+        for doc_id in store.candidates(self._filters):
+            data = store.docs.get(doc_id)
+            if data is None:
+                continue
+            scanned += 1
+            if all(_matches(self._field(doc_id, data, f), op, v) for f, op, v in self._filters):
+                results.append((doc_id, data))
+
+        # Firestore excludes documents missing an order_by field
+        for field_path, _ in self._orders:
+            results = [r for r in results if self._field(r[0], r[1], field_path) is not _MISSING]
+        for field_path, direction in reversed(self._orders):
+            results.sort(
+                key=lambda r: _sort_key(self._field(r[0], r[1], field_path)),
+                reverse=str(direction).upper() == "DESCENDING"
+            )
+        if not self._orders:
+            results.sort(key=lambda r: r[0])
+        if self._limit is not None:
+            results = results[:self._limit]
+        return results, scanned
+
+    def _execute(self) -> List[MemoryDocumentSnapshot]:
+        """Run the query; the caller must hold the client lock."""
+        results, scanned = self._results()
+        self._client.stats["queries"] += 1
+        self._client.stats["documents_scanned"] += scanned
+        self._client.stats["reads"] += len(results)
+        return [
+            MemoryDocumentSnapshot(
+                MemoryDocumentReference(self._client, self._collection_path, doc_id),
+                copy.deepcopy(data)
+            )
+            for doc_id, data in results
+        ]
+
+    def stream(self, *args, **kwargs):
+        self._client._round_trip()
+        with self._client._lock:
+            return iter(self._execute())
+
+    def get(self, *args, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self, alias or "count")
+
+
+class MemoryAggregationResult:
+    """One aggregation value, like google.cloud.firestore's AggregationResult."""
+
+    def __init__(self, alias: str, value: int):
+        self.alias = alias
+        self.value = value
+
+
+class MemoryAggregationQuery:
+    """count() over a query; matching documents are counted, not returned."""
+
+    def __init__(self, query: MemoryQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self, *args, **kwargs) -> List[List[MemoryAggregationResult]]:
+        client = self._query._client
+        client._round_trip()
+        with client._lock:
+            results, scanned = self._query._results()
+            client.stats["queries"] += 1
+            client.stats["documents_scanned"] += scanned
+            # Firestore bills count() per 1000 index entries, not per document
+            client.stats["reads"] += 1 + len(results) // 1000
+        return [[MemoryAggregationResult(self._alias, len(results))]]
+
+
+class MemoryCollectionReference(MemoryQuery):
+    """Reference to a collection in the in-memory store."""
+
+    def __init__(self, client: "MemoryFirestoreClient", collection_path: str):
+        super().__init__(client, collection_path)
+
+    @property
+    def id(self) -> str:
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, document_id or _new_id())
+
+
+class MemoryWriteBatch:
+    """Batch of writes applied atomically on commit()."""
+
+    def __init__(self, client: "MemoryFirestoreClient"):
+        self._client = client
+        self._writes: List[Tuple[str, MemoryDocumentReference, Any, bool]] = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference: MemoryDocumentReference, document_data: Dict[str, Any]):
+        self._writes.append(("create", reference, document_data, False))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any]):
+        self._writes.append(("update", reference, field_updates, False))
+
+    def delete(self, reference: MemoryDocumentReference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._write(self._writes)
+        self._writes = []
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Transaction for the in-memory store.
+    run_transaction() holds the store lock for the whole function, so
+    transactions are serialized instead of retried on contention.
+    """
+
+    def get(self, ref_or_query, *args, **kwargs):
+        if isinstance(ref_or_query, MemoryQuery):
+            return iter(ref_or_query._execute())
+        self._client.stats["reads"] += 1
+        return self._client._snapshot(ref_or_query)
+
+
+class MemoryFirestoreClient:
+    """
+    Thread-safe in-memory Firestore client.
+
+    Args:
+        indexed_fields: Fields that get equality hash indexes in every collection
+        sqlite_path: Optional SQLite file to persist documents across restarts
+        latency_ms: Artificial latency added to each round trip to simulate the network
+    """
+
+    def __init__(self, indexed_fields: Iterable[str] = (), sqlite_path: Optional[str] = None,
+                 latency_ms: float = 0):
+        self.indexed_fields = list(indexed_fields)
+        self.latency = latency_ms / 1000
+        self._lock = threading.RLock()
+        self._collections: Dict[str, _CollectionStore] = {}
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+
+        self._sqlite: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._sqlite = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._sqlite.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection TEXT NOT NULL, id TEXT NOT NULL, data BLOB NOT NULL, "
+                "PRIMARY KEY (collection, id))"
+            )
+            self._sqlite.commit()
+            for collection_path, doc_id, blob in self._sqlite.execute(
+                "SELECT collection, id, data FROM documents"
+            ):
+                self._store(collection_path).put(doc_id, pickle.loads(blob))
+            logger.info(f"Loaded in-memory Firestore from {sqlite_path}")
+
+    def reset_stats(self):
+        """Reset the round trip / query / read / write counters."""
+        with self._lock:
+            self.stats.update({
+                "round_trips": 0,
+                "queries": 0,
+                "reads": 0,
+                "writes": 0,
+                "documents_scanned": 0,
+            })
+
+    def _round_trip(self):
+        with self._lock:
+            self.stats["round_trips"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _store(self, collection_path: str) -> _CollectionStore:
+        store = self._collections.get(collection_path)
+        if store is None:
+            store = _CollectionStore(self.indexed_fields)
+            self._collections[collection_path] = store
+        return store
+
+    def _snapshot(self, reference: MemoryDocumentReference) -> MemoryDocumentSnapshot:
+        data = self._store(reference._collection_path).docs.get(reference.id)
+        return MemoryDocumentSnapshot(reference, copy.deepcopy(data) if data is not None else None)
+
+    def _write(self, writes: List[Tuple[str, MemoryDocumentReference, Any, bool]]):
+        """Apply writes atomically; the caller must hold the lock."""
+        # Validate first so a failing write leaves the store untouched
+        for kind, reference, _, _ in writes:
+            exists = reference.id in self._store(reference._collection_path).docs
+            if kind == "update" and not exists:
+                raise NotFound(f"No document to update: {reference.path}")
+            if kind == "create" and exists:
+                raise ValueError(f"Document already exists: {reference.path}")
+
+        for kind, reference, data, merge in writes:
+            store = self._store(reference._collection_path)
+            if kind == "delete":
+                store.remove(reference.id)
+                self._persist(reference, None)
+            else:
+                if kind in ("set", "create") and not merge:
+                    new_data: Dict[str, Any] = {}
+                    _merge_into(new_data, data)
+                elif kind == "set":
+                    new_data = copy.deepcopy(store.docs.get(reference.id) or {})
+                    _merge_into(new_data, data)
+                else:
+                    new_data = copy.deepcopy(store.docs[reference.id])
+                    _update_field_paths(new_data, data)
+                store.put(reference.id, new_data)
+                self._persist(reference, new_data)
+            self.stats["writes"] += 1
+        if self._sqlite is not None:
+            self._sqlite.commit()
+
+    def _persist(self, reference: MemoryDocumentReference, data: Optional[Dict[str, Any]]):
+        if self._sqlite is None:
+            return
+        if data is None:
+            self._sqlite.execute(
+                "DELETE FROM documents WHERE collection = ? AND id = ?",
+                (reference._collection_path, reference.id)
+            )
+        else:
+            self._sqlite.execute(
+                "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+                (reference._collection_path, reference.id, pickle.dumps(data))
+            )
+
+    def collection(self, collection_id: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_id)
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        collection_path, document_id = document_path.rsplit("/", 1)
+        return MemoryDocumentReference(self, collection_path, document_id)
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], *args, **kwargs):
+        self._round_trip()
+        with self._lock:
+            snapshots = [self._snapshot(ref) for ref in references]
+            self.stats["reads"] += len(snapshots)
+        return iter(snapshots)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    def run_transaction(self, fn, *args) -> Any:
+        """Run fn(transaction, *args) and commit its writes atomically."""
+        self._round_trip()
+        with self._lock:
+            transaction = MemoryTransaction(self)
+            result = fn(transaction, *args)
+            self._write(transaction._writes)
+            return result
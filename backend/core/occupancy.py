@@ -0,0 +1,215 @@
+"""
+Per-doctor, per-day slot occupancy records.
+
+Each doctor_day_occupancy/{doctor_id}_{date} document keeps a bitmap of the
+17 half-hour slots between 9:00 AM and 5:00 PM. Booking, rescheduling and
+cancellation update it in the same transaction as the appointment, so slot
+lookups are a handful of point reads instead of a scan of every confirmed
+appointment on that date. Documents are only created by those write
+transactions; lookups of days without one compute the bitmap from the
+appointments without writing.
+
+The functions taking a ``transaction`` are synchronous and meant to run
+inside AsyncFirestore.run_transaction().
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from backend.core.firestore_client import AsyncFirestore, get_in_transaction
+from backend.core.counters import created_deltas, stage_appointment_rollup, stage_counters, status_deltas
+
+OCCUPANCY_COLLECTION = "doctor_day_occupancy"
+
+
+class SlotUnavailableError(Exception):
+    """Raised when a slot is already booked for the doctor."""
+
+
+def generate_day_slots() -> List[str]:
+    """Generate continuous time slots: 9:00 AM to 5:00 PM, 30-minute intervals."""
+    all_times = []
+    start_hour = 9
+    end_hour = 17
+    for hour in range(start_hour, end_hour + 1):
+        for minute in [0, 30]:
+            if hour == end_hour and minute == 30:  # Skip 5:30 PM
+                break
+            time_str = f"{hour}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+            if hour > 12:
+                time_str = f"{hour-12}:{minute:02d} PM"
+            elif hour == 12:
+                time_str = f"12:{minute:02d} PM"
+            all_times.append(time_str)
+    return all_times
+
+
+DAY_SLOTS = generate_day_slots()
+_SLOT_INDEX = {time_str: index for index, time_str in enumerate(DAY_SLOTS)}
+
+
+def slot_index(time_str: str) -> Optional[int]:
+    """Bit position of a time slot, or None for times outside the slot grid."""
+    if not time_str:
+        return None
+    return _SLOT_INDEX.get(" ".join(time_str.split()).upper())
+
+
+def occupancy_doc_id(doctor_id: str, date: str) -> str:
+    return f"{doctor_id}_{date}"
+
+
+def booked_times(bitmap: int) -> Set[str]:
+    """Time slots marked as booked in a bitmap."""
+    return {time_str for index, time_str in enumerate(DAY_SLOTS) if bitmap & (1 << index)}
+
+
+def bitmap_from_appointments(appointments: List[Dict[str, Any]]) -> int:
+    """Build a bitmap from confirmed appointment documents."""
+    bitmap = 0
+    for appointment in appointments:
+        index = slot_index(appointment.get("time", ""))
+        if index is not None:
+            bitmap |= 1 << index
+    return bitmap
+
+
+class DayOccupancy:
+    """Occupancy of one doctor's day, as read inside a transaction."""
+
+    def __init__(self, reference, doctor_id: str, date: str, bitmap: int, exists: bool):
+        self.reference = reference
+        self.doctor_id = doctor_id
+        self.date = date
+        self.bitmap = bitmap
+        self.exists = exists
+        self.changed = False
+
+    def is_booked(self, time_str: str) -> bool:
+        index = slot_index(time_str)
+        return index is not None and bool(self.bitmap & (1 << index))
+
+    def book(self, time_str: str):
+        """Mark a slot as booked, raising SlotUnavailableError if it is taken."""
+        index = slot_index(time_str)
+        if index is None:
+            # Free-form times outside the grid can't be tracked in the bitmap
+            return
+        if self.bitmap & (1 << index):
+            raise SlotUnavailableError(f"{time_str} on {self.date} is already booked")
+        self.bitmap |= 1 << index
+        self.changed = True
+
+    def release(self, time_str: str):
+        index = slot_index(time_str)
+        if index is not None and self.bitmap & (1 << index):
+            self.bitmap &= ~(1 << index)
+            self.changed = True
+
+    def stage(self, transaction):
+        """Stage the occupancy write if it changed or has not been materialized yet."""
+        if self.changed or not self.exists:
+            transaction.set(self.reference, {
+                "doctor_id": self.doctor_id,
+                "date": self.date,
+                "bitmap": self.bitmap,
+                "updated_at": datetime.utcnow()
+            })
+
+
+def read_occupancy(transaction, client, doctor_id: str, date: str) -> DayOccupancy:
+    """
+    Read a doctor's occupancy for a day inside a transaction.
+    Days without an occupancy document yet are rebuilt from confirmed appointments.
+    """
+    reference = client.collection(OCCUPANCY_COLLECTION).document(occupancy_doc_id(doctor_id, date))
+    snapshot = get_in_transaction(transaction, reference)
+    if snapshot.exists:
+        return DayOccupancy(reference, doctor_id, date, snapshot.get("bitmap") or 0, exists=True)
+
+    query = (
+        client.collection("appointments")
+        .where("doctor_id", "==", doctor_id)
+        .where("date", "==", date)
+        .where("status", "==", "confirmed")
+    )
+    appointments = [doc.to_dict() for doc in transaction.get(query)]
+    return DayOccupancy(reference, doctor_id, date, bitmap_from_appointments(appointments), exists=False)
+
+
+def book_slot(transaction, client, appointment_ref, appointment_doc: Dict[str, Any]):
+    """Claim the doctor's slot and create the appointment atomically."""
+    occupancy = read_occupancy(transaction, client, appointment_doc["doctor_id"], appointment_doc["date"])
+    occupancy.book(appointment_doc["time"])
+    occupancy.stage(transaction)
+    transaction.set(appointment_ref, appointment_doc)
+    stage_counters(transaction, client, created_deltas("appointments", appointment_doc.get("status")))
+    stage_appointment_rollup(transaction, client, appointment_doc)
+
+
+def reschedule_slot(transaction, client, appointment_ref, new_date: str, new_time: str):
+    """Move a confirmed appointment's slot and update the appointment atomically."""
+    appointment = get_in_transaction(transaction, appointment_ref).to_dict() or {}
+    if appointment.get("status") == "confirmed":
+        doctor_id = appointment.get("doctor_id", "")
+        old_occupancy = read_occupancy(transaction, client, doctor_id, appointment.get("date", ""))
+        if appointment.get("date") == new_date:
+            new_occupancy = old_occupancy
+        else:
+            new_occupancy = read_occupancy(transaction, client, doctor_id, new_date)
+        old_occupancy.release(appointment.get("time", ""))
+        new_occupancy.book(new_time)
+        old_occupancy.stage(transaction)
+        if new_occupancy is not old_occupancy:
+            new_occupancy.stage(transaction)
+    transaction.update(appointment_ref, {
+        "date": new_date,
+        "time": new_time,
+        "updated_at": datetime.utcnow()
+    })
+
+
+def cancel_slot(transaction, client, appointment_ref):
+    """Free a confirmed appointment's slot and mark the appointment cancelled atomically."""
+    appointment = get_in_transaction(transaction, appointment_ref).to_dict() or {}
+    if appointment.get("status") == "confirmed":
+        occupancy = read_occupancy(transaction, client, appointment.get("doctor_id", ""), appointment.get("date", ""))
+        occupancy.release(appointment.get("time", ""))
+        occupancy.stage(transaction)
+    transaction.update(appointment_ref, {
+        "status": "cancelled",
+        "updated_at": datetime.utcnow()
+    })
+    stage_counters(transaction, client, status_deltas("appointments", appointment.get("status"), "cancelled"))
+
+
+async def get_day_bitmaps(db: AsyncFirestore, doctor_ids: List[str], date: str) -> Dict[str, int]:
+    """
+    Fetch the occupancy bitmaps of several doctors for one day in a single batched read.
+    Doctors without an occupancy document for the day are covered by one
+    query of the day's confirmed appointments; nothing is written.
+    """
+    refs = [db.collection(OCCUPANCY_COLLECTION).document(occupancy_doc_id(doctor_id, date)) for doctor_id in doctor_ids]
+    bitmaps: Dict[str, int] = {}
+    for snapshot in await db.get_all(refs):
+        if snapshot.exists:
+            data = snapshot.to_dict()
+            bitmaps[data.get("doctor_id", "")] = data.get("bitmap") or 0
+
+    missing = {doctor_id for doctor_id in doctor_ids if doctor_id not in bitmaps}
+    if missing:
+        docs = await (
+            db.collection("appointments")
+            .where("date", "==", date)
+            .where("status", "==", "confirmed")
+            .get()
+        )
+        appointments: Dict[str, List[Dict[str, Any]]] = {doctor_id: [] for doctor_id in missing}
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get("doctor_id") in missing:
+                appointments[data["doctor_id"]].append(data)
+        bitmaps.update(
+            (doctor_id, bitmap_from_appointments(doctor_appointments))
+            for doctor_id, doctor_appointments in appointments.items()
+        )
+    return bitmaps
@@ -1,27 +1,88 @@
 """
 CrewAI Orchestrator setup for multi-agent coordination.
+
+Crews are built once and reused: each agent type has a pool of prebuilt
+crews whose single task takes its description from kickoff(inputs=...).
+aexecute() runs kickoffs on a bounded thread pool with a per-agent
+concurrency limit and a timeout, so a slow LLM round trip never blocks the
+event loop.
+
+Results of idempotent tasks are memoized per (agent type, task text,
+canonical context) with a per-agent TTL, so repeated identical tasks don't
+pay for another LLM round trip.
 """
 
-from typing import List, Dict, Any, Optional
+import asyncio
+import copy
+import hashlib
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
 from backend.core.config import settings
+from backend.core.cache import LRUCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Agent definitions shared by the mock and CrewAI setups
+AGENT_PROFILES: Dict[str, Dict[str, str]] = {
+    "booking": {
+        "name": "BookingAgent",
+        "role": "Appointment Manager",
+        "goal": "Book, reschedule, and cancel appointments efficiently.",
+        "backstory": "You are an expert appointment scheduler with years of experience managing medical appointments.",
+        "expected_output": "Appointment booking operation result",
+    },
+    "reminder": {
+        "name": "ReminderAgent",
+        "role": "Notification Handler",
+        "goal": "Send timely and appropriate appointment reminders.",
+        "backstory": "You specialize in patient communication and ensure patients never miss their appointments.",
+        "expected_output": "Reminder scheduling operation result",
+    },
+    "previsit": {
+        "name": "PreVisitAgent",
+        "role": "Questionnaire Coordinator",
+        "goal": "Collect and summarize pre-consultation patient data effectively.",
+        "backstory": "You help prepare patients for their visits by collecting and organizing their pre-visit information.",
+        "expected_output": "Questionnaire processing result",
+    },
+}
+
+
+# Timestamps that vary between otherwise identical tasks; ignored in cache keys
+_VOLATILE_CONTEXT_KEYS = {"created_at", "updated_at", "submitted_at", "scheduled_at"}
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items() if k not in _VOLATILE_CONTEXT_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def result_cache_key(agent_type: str, task: str, context: Optional[Dict[str, Any]]) -> str:
+    """Cache key for a task: hash of agent type, task text and canonicalized context."""
+    payload = json.dumps([agent_type, " ".join(task.split()), _canonical(context or {})],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 class MockAgent:
     """Mock agent for local development when CrewAI is not available."""
-    
+
     def __init__(self, name: str, role: str, goal: str):
         self.name = name
         self.role = role
         self.goal = goal
-    
+
     def run_task(self, task: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Simulate agent task execution."""
         logger.info(f"[{self.name}] Executing task: {task}")
         logger.info(f"[{self.name}] Context: {context}")
-        
+
         return {
             "status": "success",
             "agent": self.name,
@@ -31,160 +92,233 @@ class MockAgent:
         }
 
 
+def build_crewai_crew(agent_type: str):
+    """
+    Build a single-agent crew whose task description is filled in from
+    kickoff(inputs={"task": ...}). Each crew gets its own Agent, since
+    agents keep per-run state.
+    """
+    from crewai import Agent, Task, Crew
+    profile = AGENT_PROFILES[agent_type]
+    agent = Agent(
+        name=profile["name"],
+        role=profile["role"],
+        goal=profile["goal"],
+        backstory=profile["backstory"],
+        verbose=True,
+        allow_delegation=False
+    )
+    crew_task = Task(
+        description="{task}",
+        agent=agent,
+        expected_output=profile["expected_output"]
+    )
+    return Crew(agents=[agent], tasks=[crew_task])
+
+
 class MedicalSchedulerOrchestrator:
     """
     Orchestrator for managing CrewAI agents.
     Uses mock agents when USE_MOCK_AI is True, otherwise uses real CrewAI.
+
+    Args:
+        crew_factory: Builds a crew for an agent type; anything with
+            kickoff(inputs=...) works, which lets tests and benchmarks plug in a fake LLM.
+            Defaults to real CrewAI crews (or mock agents when USE_MOCK_AI is True).
+        max_concurrency: Concurrent kickoffs (and prebuilt crews) per agent type
+        max_workers: Threads shared by all kickoffs
+        timeout: Seconds aexecute() waits for a kickoff
+        result_ttls: Seconds to reuse a successful result, per agent type (0 disables)
+        result_cache_size: Maximum number of memoized results
     """
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        crew_factory: Optional[Callable[[str], Any]] = None,
+        max_concurrency: int = settings.AGENT_MAX_CONCURRENCY,
+        max_workers: int = settings.AGENT_EXECUTOR_WORKERS,
+        timeout: float = settings.AGENT_TIMEOUT_SECONDS,
+        result_ttls: Optional[Dict[str, float]] = None,
+        result_cache_size: int = settings.AGENT_RESULT_CACHE_SIZE,
+    ):
         self.agents: Dict[str, Any] = {}
-        self.use_mock = settings.USE_MOCK_AI
-        
+        self.use_mock = settings.USE_MOCK_AI and crew_factory is None
+        self.crew_factory = crew_factory
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+        # agent_type -> idle prebuilt crews
+        self._crews: Dict[str, "queue.Queue[Any]"] = {}
+        # Per-agent limits for aexecute(), bound to the running event loop
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._limits_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.result_ttls = dict(settings.AGENT_RESULT_CACHE_TTLS if result_ttls is None else result_ttls)
+        self.result_cache = LRUCache(max_entries=result_cache_size)
+        # Identical cacheable tasks already running in aexecute(), keyed like the cache
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
         if self.use_mock:
             self._setup_mock_agents()
         else:
             self._setup_crewai_agents()
-    
+
     def _setup_mock_agents(self):
         """Set up mock agents for local development."""
         logger.info("Setting up mock CrewAI agents (USE_MOCK_AI=True)")
-        
+
         self.agents = {
-            "booking": MockAgent(
-                name="BookingAgent",
-                role="Appointment Manager",
-                goal="Book, reschedule, and cancel appointments."
-            ),
-            "reminder": MockAgent(
-                name="ReminderAgent",
-                role="Notification Handler",
-                goal="Send and manage appointment reminders."
-            ),
-            "previsit": MockAgent(
-                name="PreVisitAgent",
-                role="Questionnaire Coordinator",
-                goal="Collect and summarize pre-consultation patient data."
-            )
+            agent_type: MockAgent(name=profile["name"], role=profile["role"], goal=profile["goal"])
+            for agent_type, profile in AGENT_PROFILES.items()
         }
-    
+
     def _setup_crewai_agents(self):
-        """Set up real CrewAI agents."""
+        """Set up real CrewAI agents as pools of prebuilt crews."""
         try:
-            from crewai import Agent, Task, Crew
-            logger.info("Setting up real CrewAI agents")
-            
-            # Create agents
-            booking_agent = Agent(
-                name="BookingAgent",
-                role="Appointment Manager",
-                goal="Book, reschedule, and cancel appointments efficiently.",
-                backstory="You are an expert appointment scheduler with years of experience managing medical appointments.",
-                verbose=True,
-                allow_delegation=False
-            )
-            
-            reminder_agent = Agent(
-                name="ReminderAgent",
-                role="Notification Handler",
-                goal="Send timely and appropriate appointment reminders.",
-                backstory="You specialize in patient communication and ensure patients never miss their appointments.",
-                verbose=True,
-                allow_delegation=False
-            )
-            
-            previsit_agent = Agent(
-                name="PreVisitAgent",
-                role="Questionnaire Coordinator",
-                goal="Collect and summarize pre-consultation patient data effectively.",
-                backstory="You help prepare patients for their visits by collecting and organizing their pre-visit information.",
-                verbose=True,
-                allow_delegation=False
-            )
-            
-            self.agents = {
-                "booking": booking_agent,
-                "reminder": reminder_agent,
-                "previsit": previsit_agent
-            }
-            
+            if self.crew_factory is None:
+                self.crew_factory = build_crewai_crew
+                logger.info("Setting up real CrewAI agents")
+            for agent_type in AGENT_PROFILES:
+                crews: "queue.Queue[Any]" = queue.Queue()
+                for _ in range(self.max_concurrency):
+                    crews.put(self.crew_factory(agent_type))
+                self._crews[agent_type] = crews
+                self.agents[agent_type] = crews
+
         except ImportError:
             logger.warning("CrewAI not installed, falling back to mock agents")
+            self._crews = {}
             self._setup_mock_agents()
             self.use_mock = True
-    
+
     def get_agent(self, agent_type: str):
-        """Get an agent by type."""
+        """Get an agent by type (a MockAgent, or the pool of prebuilt crews)."""
         return self.agents.get(agent_type)
-    
-    def execute_booking_task(self, task: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a booking-related task."""
-        agent = self.get_agent("booking")
+
+    def _cache_key(self, agent_type: str, task: str, context: Dict[str, Any], cacheable: bool) -> Optional[str]:
+        """Cache key for the task, or None if its result must not be reused."""
+        if not cacheable or self.result_ttls.get(agent_type, 0) <= 0:
+            return None
+        return result_cache_key(agent_type, task, context)
+
+    def _cached_result(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return None
+        result = self.result_cache.get(key)
+        # Callers add fields to results, so never hand out the cached object
+        return copy.deepcopy(result) if result is not None else None
+
+    def _store_result(self, key: Optional[str], agent_type: str, result: Dict[str, Any]):
+        if key is not None and result.get("status") == "success":
+            self.result_cache.set(key, copy.deepcopy(result), ttl_seconds=self.result_ttls[agent_type])
+
+    def _execute(self, agent_type: str, task: str, context: Dict[str, Any], cacheable: bool) -> Dict[str, Any]:
+        key = self._cache_key(agent_type, task, context, cacheable)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+        result = self._kickoff(agent_type, task, context)
+        self._store_result(key, agent_type, result)
+        return result
+
+    def _kickoff(self, agent_type: str, task: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a task on a pooled crew, blocking until the LLM round trip finishes."""
         if self.use_mock:
-            return agent.run_task(task, context)
-        else:
-            # For real CrewAI, create a task and execute it
-            from crewai import Task
-            crew_task = Task(
-                description=task,
-                agent=agent,
-                expected_output="Appointment booking operation result"
-            )
-            crew = Crew(agents=[agent], tasks=[crew_task])
-            result = crew.kickoff()
-            return {
-                "status": "success",
-                "agent": "BookingAgent",
-                "task": task,
-                "result": str(result),
-                "context": context
-            }
-    
-    def execute_reminder_task(self, task: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a reminder-related task."""
-        agent = self.get_agent("reminder")
+            return self.agents[agent_type].run_task(task, context)
+        crews = self._crews[agent_type]
+        crew = crews.get()
+        try:
+            result = crew.kickoff(inputs={"task": task})
+        finally:
+            crews.put(crew)
+        return {
+            "status": "success",
+            "agent": AGENT_PROFILES[agent_type]["name"],
+            "task": task,
+            "result": str(result),
+            "context": context
+        }
+
+    def _get_limit(self, agent_type: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._limits_loop is not loop:
+            self._limits = {}
+            self._limits_loop = loop
+        if agent_type not in self._limits:
+            self._limits[agent_type] = asyncio.Semaphore(self.max_concurrency)
+        return self._limits[agent_type]
+
+    async def aexecute(self, agent_type: str, task: str, context: Dict[str, Any],
+                       timeout: Optional[float] = None, cacheable: bool = True) -> Dict[str, Any]:
+        """
+        Execute an agent task without blocking the event loop.
+        A kickoff that outlives the timeout returns a "timeout" result; its
+        thread finishes in the background and hands the crew back to the pool.
+        Pass cacheable=False for non-idempotent actions so they always run.
+        """
+        if agent_type not in AGENT_PROFILES:
+            raise ValueError(f"Unknown agent type: {agent_type}")
+        key = self._cache_key(agent_type, task, context, cacheable)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
         if self.use_mock:
-            return agent.run_task(task, context)
-        else:
-            from crewai import Task
-            crew_task = Task(
-                description=task,
-                agent=agent,
-                expected_output="Reminder scheduling operation result"
+            result = self.agents[agent_type].run_task(task, context)
+            self._store_result(key, agent_type, result)
+            return result
+
+        if key is None:
+            return await self._aexecute(agent_type, task, context, timeout)
+        # Share one kickoff between identical tasks that arrive together
+        if key in self._in_flight:
+            return copy.deepcopy(await asyncio.shield(self._in_flight[key]))
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._aexecute(agent_type, task, context, timeout)
+            self._store_result(key, agent_type, result)
+            future.set_result(copy.deepcopy(result))
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Don't warn about the exception when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _aexecute(self, agent_type: str, task: str, context: Dict[str, Any],
+                        timeout: Optional[float]) -> Dict[str, Any]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="crewai")
+        async with self._get_limit(agent_type):
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self._kickoff, agent_type, task, context
             )
-            crew = Crew(agents=[agent], tasks=[crew_task])
-            result = crew.kickoff()
-            return {
-                "status": "success",
-                "agent": "ReminderAgent",
-                "task": task,
-                "result": str(result),
-                "context": context
-            }
-    
-    def execute_previsit_task(self, task: str, context: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return await asyncio.wait_for(future, timeout or self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{AGENT_PROFILES[agent_type]['name']} timed out after {timeout or self.timeout}s: {task}")
+                return {
+                    "status": "timeout",
+                    "agent": AGENT_PROFILES[agent_type]["name"],
+                    "task": task,
+                    "result": None,
+                    "context": context
+                }
+
+    def execute_booking_task(self, task: str, context: Dict[str, Any], cacheable: bool = True) -> Dict[str, Any]:
+        """Execute a booking-related task."""
+        return self._execute("booking", task, context, cacheable)
+
+    def execute_reminder_task(self, task: str, context: Dict[str, Any], cacheable: bool = True) -> Dict[str, Any]:
+        """Execute a reminder-related task."""
+        return self._execute("reminder", task, context, cacheable)
+
+    def execute_previsit_task(self, task: str, context: Dict[str, Any], cacheable: bool = True) -> Dict[str, Any]:
         """Execute a pre-visit questionnaire task."""
-        agent = self.get_agent("previsit")
-        if self.use_mock:
-            return agent.run_task(task, context)
-        else:
-            from crewai import Task
-            crew_task = Task(
-                description=task,
-                agent=agent,
-                expected_output="Questionnaire processing result"
-            )
-            crew = Crew(agents=[agent], tasks=[crew_task])
-            result = crew.kickoff()
-            return {
-                "status": "success",
-                "agent": "PreVisitAgent",
-                "task": task,
-                "result": str(result),
-                "context": context
-            }
+        return self._execute("previsit", task, context, cacheable)
 
 
 # Global orchestrator instance
 orchestrator = MedicalSchedulerOrchestrator()
-
@@ -0,0 +1,355 @@
+"""
+In-process reminder scheduler.
+
+Keeps a min-heap of upcoming reminders ordered by scheduled_at and sleeps
+until the earliest one is due, so reminders fire within a second of their
+due time and each wake-up only touches reminders that are actually due.
+
+The heap is loaded with a scheduled_at-ordered range query covering the next
+REMINDER_SCHEDULER_HORIZON_SECONDS, re-scanned every half horizon, and fed
+incrementally by schedule() when reminders are created. A reminder whose
+send fails is re-queued after REMINDER_RETRY_SECONDS, doubling per failure.
+
+Reminder emails are rendered in the background when a reminder is created
+(prerender()) and stored on the reminder, so a burst of due reminders is
+just SMTP sends. Rescheduling an appointment moves its reminders and
+renders them again. Renders that run concurrently (a burst of new
+reminders, or due reminders that weren't pre-rendered) are generated
+several per Gemini call by the email batcher.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from firebase_admin.firestore import DELETE_FIELD
+from backend.core.config import settings
+from backend.core.firestore_client import get_async_firestore, get_in_transaction, run_blocking
+from backend.core.counters import status_deltas, update_with_counters
+from backend.core.response_cache import ADMIN_ANALYTICS_TAG, response_cache
+from backend.core.user_cache import user_profile_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Firestore treats naive datetimes as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def reminder_time(appointment_date: str, appointment_time: str, hours_before: int) -> datetime:
+    """When to send a reminder: hours_before the appointment (treated as UTC), or now if unparseable."""
+    try:
+        time_parts = appointment_time.strip().split(" ")
+        am_pm = (time_parts[1] if len(time_parts) > 1 else "AM").upper()
+        hour, minute = [int(x) for x in time_parts[0].split(":")]
+        if am_pm == "PM" and hour != 12:
+            hour += 12
+        if am_pm == "AM" and hour == 12:
+            hour = 0
+        appointment_at = datetime.strptime(appointment_date, "%Y-%m-%d").replace(hour=hour, minute=minute)
+        return appointment_at.replace(tzinfo=timezone.utc) - timedelta(hours=hours_before)
+    except Exception:
+        return datetime.now(timezone.utc)
+
+
+def _content_matches(data: Dict) -> bool:
+    """Whether a reminder's pre-rendered content is for its current appointment time."""
+    content = data.get("content") or {}
+    return bool(content) and (
+        content.get("appointment_date") == data.get("appointment_date", "")
+        and content.get("appointment_time") == data.get("appointment_time", "")
+    )
+
+
+def _store_content(transaction, reminder_ref, content: Dict):
+    """Save rendered content unless the reminder was rescheduled or sent meanwhile."""
+    data = get_in_transaction(transaction, reminder_ref).to_dict() or {}
+    if data.get("status") != "scheduled":
+        return False
+    if (data.get("appointment_date", ""), data.get("appointment_time", "")) != (
+            content["appointment_date"], content["appointment_time"]):
+        return False
+    transaction.update(reminder_ref, {"content": content})
+    return True
+
+
+class ReminderScheduler:
+    """Min-heap of (scheduled_at, reminder_id) driving reminder delivery."""
+
+    def __init__(self, horizon_seconds: int, retry_seconds: float = 60):
+        self.horizon = timedelta(seconds=horizon_seconds)
+        self.retry = timedelta(seconds=retry_seconds)
+        # reminder_id -> (failed attempts, earliest next attempt) for reminders whose send failed
+        self._retries: Dict[str, Tuple[int, datetime]] = {}
+        self._heap: List[Tuple[datetime, str]] = []
+        # reminder_id -> scheduled_at of its live heap entry; other entries are stale
+        self._queued: Dict[str, datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Background rendering tasks, referenced so they aren't garbage collected
+        self._render_tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, reminder_id: str, scheduled_at: datetime):
+        """
+        Queue a reminder for delivery at scheduled_at.
+        Reminders beyond the loaded horizon are picked up by a later horizon scan.
+        """
+        scheduled_at = _as_utc(scheduled_at)
+        if reminder_id in self._retries:
+            # Horizon scans must not cut a failed reminder's backoff short
+            scheduled_at = max(scheduled_at, self._retries[reminder_id][1])
+        if self._loaded_until is not None and scheduled_at > self._loaded_until:
+            return
+        if self._queued.get(reminder_id) == scheduled_at:
+            return
+        self._queued[reminder_id] = scheduled_at
+        heapq.heappush(self._heap, (scheduled_at, reminder_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def load_horizon(self):
+        """Load scheduled reminders due before the end of the next horizon."""
+        db = get_async_firestore()
+        horizon_end = datetime.now(timezone.utc) + self.horizon
+        query = (
+            db.collection("reminders")
+            .where("status", "==", "scheduled")
+            .where("scheduled_at", "<=", horizon_end)
+            .order_by("scheduled_at")
+        )
+        docs = await query.get()
+        self._loaded_until = horizon_end
+        for doc in docs:
+            scheduled_at = doc.to_dict().get("scheduled_at")
+            if scheduled_at:
+                self.schedule(doc.id, scheduled_at)
+        logger.info(f"Reminder scheduler loaded {len(docs)} reminder(s) due before {horizon_end.isoformat()}")
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            scheduled_at, reminder_id = heapq.heappop(self._heap)
+            if self._queued.get(reminder_id) == scheduled_at:
+                del self._queued[reminder_id]
+                due.append(reminder_id)
+        return due
+
+    async def run(self):
+        """Deliver reminders as they come due. Runs until cancelled."""
+        self._wakeup = asyncio.Event()
+        next_scan = datetime.now(timezone.utc)
+        while True:
+            self._wakeup.clear()
+            try:
+                now = datetime.now(timezone.utc)
+                if now >= next_scan:
+                    await self.load_horizon()
+                    next_scan = now + self.horizon / 2
+                due = self._pop_due(now)
+                if due:
+                    try:
+                        await self._send_due(due)
+                    except Exception as e:
+                        # Failed before sending (e.g. reading the reminders); none were sent
+                        for reminder_id in due:
+                            self._retry_later(reminder_id, e)
+            except Exception as e:
+                logger.warning(f"Reminder scheduler error: {e}")
+
+            now = datetime.now(timezone.utc)
+            wake_at = next_scan
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, (wake_at - now).total_seconds()))
+            except asyncio.TimeoutError:
+                pass
+
+    def prerender(self, reminder_id: str):
+        """Render a reminder's email in the background so sending it is pure SMTP."""
+        task = asyncio.create_task(self._render_content(reminder_id))
+        self._render_tasks.add(task)
+        task.add_done_callback(self._render_tasks.discard)
+
+    async def _render_content(self, reminder_id: str):
+        db = get_async_firestore()
+        reminder_ref = db.collection("reminders").document(reminder_id)
+        try:
+            doc = await reminder_ref.get()
+            if not doc.exists:
+                return
+            data = doc.to_dict()
+            if data.get("status") != "scheduled" or _content_matches(data):
+                return
+            profiles, _ = await user_profile_cache.get_many(db, [data.get("patient_id", ""), data.get("doctor_id", "")])
+            content = await self._render(data, profiles)
+            if await db.run_transaction(_store_content, reminder_ref.sync, content):
+                logger.info(f"Reminder content pre-rendered for {reminder_id}")
+        except Exception as e:
+            # Not fatal: the reminder is rendered at send time instead
+            logger.warning(f"Reminder pre-render failed for {reminder_id}: {e}")
+
+    @staticmethod
+    async def _render(data: Dict, profiles: Dict[str, Dict]) -> Dict:
+        # Concurrent renders (prerender bursts, due sweeps) share batched Gemini calls
+        from backend.core.email_service import arender_appointment_reminder
+        patient = profiles.get(data.get("patient_id", ""), {})
+        doctor = profiles.get(data.get("doctor_id", ""), {})
+        content = await arender_appointment_reminder(
+            patient_name=patient.get("full_name", "Patient"),
+            doctor_name=doctor.get("full_name", "Doctor"),
+            appointment_date=data.get("appointment_date", ""),
+            appointment_time=data.get("appointment_time", ""),
+            specialty=doctor.get("specialty", data.get("specialty", "General")),
+            reason=data.get("reason")
+        )
+        content["appointment_date"] = data.get("appointment_date", "")
+        content["appointment_time"] = data.get("appointment_time", "")
+        return content
+
+    async def reschedule_appointment(self, appointment_id: str, new_date: str, new_time: str):
+        """Move an appointment's pending reminders to its new time and re-render them."""
+        db = get_async_firestore()
+        docs = await (
+            db.collection("reminders")
+            .where("appointment_id", "==", appointment_id)
+            .where("status", "==", "scheduled")
+            .get()
+        )
+        if not docs:
+            return
+        batch = db.batch()
+        moved = []
+        for doc in docs:
+            scheduled_at = reminder_time(new_date, new_time, doc.to_dict().get("hours_before", 24))
+            batch.update(db.collection("reminders").document(doc.id), {
+                "appointment_date": new_date,
+                "appointment_time": new_time,
+                "scheduled_at": scheduled_at,
+                "content": DELETE_FIELD,
+            })
+            moved.append((doc.id, scheduled_at))
+        await batch.commit()
+        for reminder_id, scheduled_at in moved:
+            self.schedule(reminder_id, scheduled_at)
+            self.prerender(reminder_id)
+        logger.info(f"Moved {len(moved)} reminder(s) for rescheduled appointment {appointment_id}")
+
+    async def _send_due(self, reminder_ids: List[str]):
+        """Send reminders that came due, re-checking their current state first."""
+        db = get_async_firestore()
+        reminders_ref = db.collection("reminders")
+        snapshots = await db.get_all([reminders_ref.document(reminder_id) for reminder_id in reminder_ids])
+        now = datetime.now(timezone.utc)
+
+        due = []
+        for doc in snapshots:
+            if not doc.exists:
+                self._retries.pop(doc.id, None)
+                continue
+            data = doc.to_dict()
+            scheduled_at = data.get("scheduled_at")
+            if data.get("status") != "scheduled" or not scheduled_at:
+                self._retries.pop(doc.id, None)
+                continue
+            if _as_utc(scheduled_at) > now:
+                # Moved to a later time since it was queued
+                self.schedule(doc.id, scheduled_at)
+                continue
+            due.append((doc.id, data))
+        if not due:
+            return
+
+        # One batched read for every patient and doctor in this sweep
+        user_ids = set()
+        for _, data in due:
+            user_ids.add(data.get("patient_id", ""))
+            user_ids.add(data.get("doctor_id", ""))
+        # Without profiles nothing can be sent; a failure here retries the whole sweep
+        profiles, round_trips = await user_profile_cache.get_many(db, user_ids)
+        # Previously every reminder read its patient and doctor one by one
+        per_reminder = sum(1 + (1 if data.get("doctor_id") else 0) for _, data in due)
+        logger.info(
+            f"Reminder sweep: {len(due)} due, {len(user_ids - {''})} distinct user(s), "
+            f"{round_trips} user round trip(s), {per_reminder - round_trips} saved"
+        )
+
+        # Render everything that wasn't pre-rendered together, so Gemini sees one batch
+        unrendered = [
+            (reminder_id, data) for reminder_id, data in due
+            if not _content_matches(data) and profiles.get(data.get("patient_id", ""), {}).get("email")
+        ]
+        rendered = await asyncio.gather(
+            *(self._render(data, profiles) for _, data in unrendered), return_exceptions=True
+        )
+        contents = {
+            reminder_id: content for (reminder_id, _), content in zip(unrendered, rendered)
+            if not isinstance(content, BaseException)
+        }
+
+        for reminder_id, data in due:
+            try:
+                await self._send_reminder(db, reminder_id, data, profiles, contents.get(reminder_id))
+                self._retries.pop(reminder_id, None)
+            except Exception as send_err:
+                self._retry_later(reminder_id, send_err)
+
+    def _retry_later(self, reminder_id: str, error: Exception):
+        """Re-queue a reminder whose send failed, backing off exponentially."""
+        attempts = self._retries.get(reminder_id, (0, None))[0] + 1
+        delay = min(self.retry * 2 ** (attempts - 1), self.horizon / 2)
+        retry_at = datetime.now(timezone.utc) + delay
+        self._retries[reminder_id] = (attempts, retry_at)
+        self.schedule(reminder_id, retry_at)
+        logger.warning(
+            f"Reminder send failed for {reminder_id} (attempt {attempts}): {error}; "
+            f"retrying in {delay.total_seconds():.0f}s"
+        )
+
+    async def _send_reminder(self, db, reminder_id: str, data: Dict, profiles: Dict[str, Dict],
+                             content: Optional[Dict] = None):
+        appointment_date = data.get("appointment_date", "")
+        appointment_time = data.get("appointment_time", "")
+        patient = profiles.get(data.get("patient_id", ""), {})
+        doctor = profiles.get(data.get("doctor_id", ""), {})
+        patient_email = patient.get("email", "")
+        patient_name = patient.get("full_name", "Patient")
+        doctor_name = doctor.get("full_name", "Doctor")
+        specialty = doctor.get("specialty", data.get("specialty", "General"))
+        if not patient_email:
+            return
+
+        if _content_matches(data) or content is not None:
+            from backend.core.email_service import send_rendered_email
+            delivered = await run_blocking(send_rendered_email, patient_email, content or data["content"])
+        else:
+            # Rendering in the sweep failed: generate the content now
+            from backend.core.email_service import send_appointment_reminder
+            delivered = await run_blocking(
+                send_appointment_reminder,
+                patient_email=patient_email,
+                patient_name=patient_name,
+                doctor_name=doctor_name,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                specialty=specialty,
+                reason=data.get("reason")
+            )
+        if not delivered:
+            raise RuntimeError(f"email to {patient_email} was not delivered")
+        # Mark sent
+        await update_with_counters(db, db.collection("reminders").document(reminder_id), {
+            "status": "sent",
+            "sent_at": datetime.now(timezone.utc)
+        }, status_deltas("reminders", data.get("status"), "sent"))
+        await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
+        logger.info(f"Reminder sent to {patient_email} for {appointment_date} {appointment_time}")
+
+
+# Global reminder scheduler instance
+reminder_scheduler = ReminderScheduler(
+    horizon_seconds=settings.REMINDER_SCHEDULER_HORIZON_SECONDS,
+    retry_seconds=settings.REMINDER_RETRY_SECONDS,
+)
@@ -0,0 +1,250 @@
+"""
+Stale-while-revalidate cache for read-heavy GET route handlers.
+
+@cached_response keys a handler's result by route, user and role (unless
+the response is the same for everyone) and query parameters. A fresh entry
+is served as is. An entry past its TTL but within the stale window is
+served immediately while one background task recomputes it. Concurrent
+misses for the same key share one computation.
+
+Invalidation is by tag: every cached route names the tags its response
+depends on (e.g. "appointments:{user_id}"), and each tag has a generation
+number that is part of the key. Write paths call
+response_cache.invalidate(...) to bump the generations, so later reads miss
+instead of seeing stale data, and the old entries age out.
+
+Entries are stored JSON-encoded in a pluggable store: MemoryStore (an
+in-process LRU, the default) or RedisStore for multi-replica deployments
+(RESPONSE_CACHE_BACKEND=redis). RedisStore accepts any client speaking the
+redis.asyncio API, so it can be exercised with a local fake.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from fastapi.encoders import jsonable_encoder
+from backend.core.cache import LRUCache
+from backend.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Tag of the admin dashboard, which counts every user, appointment and reminder
+ADMIN_ANALYTICS_TAG = "analytics:admin"
+
+
+class MemoryStore:
+    """In-process store: an LRU of entries plus a dict of tag generations."""
+
+    def __init__(self, max_entries: int = 2000):
+        self.entries = LRUCache(max_entries=max_entries)
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        self.entries.set(key, value, ttl_seconds)
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        return [self._generations.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags: List[str]):
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+
+class RedisStore:
+    """Store in Redis, shared by every replica; generations are INCR counters."""
+
+    def __init__(self, client, prefix: str = "response_cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStore":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url, decode_responses=True))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        await self.client.set(self.prefix + key, value, ex=max(1, int(ttl_seconds + 0.999)))
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        values = await self.client.mget([f"{self.prefix}gen:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, tags: List[str]):
+        await asyncio.gather(*(self.client.incr(f"{self.prefix}gen:{tag}") for tag in tags))
+
+
+class ResponseCache:
+    """Keys, freshness and single-flight recomputation over a store."""
+
+    def __init__(self, store):
+        self.store = store
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Background refreshes, referenced so they aren't garbage collected
+        self._refreshing: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "uncacheable": 0, "errors": 0}
+
+    async def _key(self, route: str, params: Dict[str, Any], tags: List[str]) -> str:
+        generations = await self.store.generations(tags) if tags else []
+        raw = json.dumps([route, params, dict(zip(tags, generations))], sort_keys=True, default=str)
+        return f"{route}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+    async def _compute(self, key: str, compute: Callable, ttl: float, stale_ttl: float,
+                       cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Run compute() once per key at a time and store its JSON-encoded result,
+        unless cacheable(result) says it shouldn't be kept.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = jsonable_encoder(await compute())
+            if cacheable is not None and not cacheable(value):
+                self.stats["uncacheable"] += 1
+            else:
+                now = time.time()
+                entry = {"value": value, "fresh_until": now + ttl, "stale_until": now + ttl + stale_ttl}
+                try:
+                    await self.store.set(key, json.dumps(entry), ttl + stale_ttl)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Response cache write failed for {key}: {e}")
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _refresh(self, key: str, compute: Callable, ttl: float, stale_ttl: float,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        if key in self._in_flight:
+            return
+        self.stats["refreshes"] += 1
+
+        async def refresh():
+            try:
+                await self._compute(key, compute, ttl, stale_ttl, cacheable)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {e}")
+
+        task = asyncio.create_task(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def get_or_compute(self, route: str, params: Dict[str, Any], tags: List[str],
+                             compute: Callable, ttl: float, stale_ttl: float,
+                             cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached response for route and params, computing it when
+        missing, and refreshing it in the background when stale. Results
+        for which cacheable(result) is false are returned but not stored.
+        """
+        try:
+            key = await self._key(route, params, tags)
+            raw = await self.store.get(key)
+        except Exception as e:
+            # The cache is an optimization; serve from the source if it's down
+            self.stats["errors"] += 1
+            logger.warning(f"Response cache read failed for {route}: {e}")
+            return await compute()
+
+        if raw is not None:
+            entry = json.loads(raw)
+            now = time.time()
+            if now < entry["fresh_until"]:
+                self.stats["hits"] += 1
+                return entry["value"]
+            if now < entry["stale_until"]:
+                self.stats["stale_hits"] += 1
+                self._refresh(key, compute, ttl, stale_ttl, cacheable)
+                return entry["value"]
+        self.stats["misses"] += 1
+        return await self._compute(key, compute, ttl, stale_ttl, cacheable)
+
+    async def invalidate(self, *tags: str):
+        """Make every cached response depending on these tags miss from now on."""
+        tags = [tag for tag in dict.fromkeys(tags) if tag]
+        if not tags:
+            return
+        try:
+            await self.store.bump(tags)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Response cache invalidation failed for {tags}: {e}")
+
+
+def cached_response(
+    route: str,
+    ttl: float,
+    stale_ttl: float = 0,
+    tags: Optional[Callable[[Dict[str, Any]], Iterable[str]]] = None,
+    per_user: bool = True,
+    user_param: str = "current_user",
+    cacheable: Optional[Callable[[Any], bool]] = None,
+):
+    """
+    Cache a route handler's response.
+
+    Args:
+        route: Name of the cached route, part of every key
+        ttl: Seconds a response is served as fresh
+        stale_ttl: Further seconds it is served while being recomputed
+        tags: Maps the handler's arguments to the tags the response depends on
+        per_user: Whether responses differ per user (keyed by user ID and role)
+        user_param: Name of the handler argument holding the current user
+        cacheable: Whether a (JSON-encoded) response may be stored, e.g. not
+            degraded ones; all are stored by default
+    """
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            user = kwargs.get(user_param) or {}
+            params = {name: value for name, value in kwargs.items() if name != user_param}
+            if per_user:
+                params["__user__"] = [user.get("user_id"), user.get("role")]
+            return await response_cache.get_or_compute(
+                route, params, sorted(tags(kwargs)) if tags else [],
+                lambda: handler(*args, **kwargs), ttl, stale_ttl, cacheable
+            )
+        return wrapper
+    return decorator
+
+
+def appointment_tags(*user_ids: str) -> List[str]:
+    """Tags of the cached views an appointment or questionnaire write affects."""
+    tags = ["slots", "appointments:all", ADMIN_ANALYTICS_TAG]
+    for user_id in user_ids:
+        if user_id:
+            tags += [f"appointments:{user_id}", f"analytics:{user_id}"]
+    return tags
+
+
+def _create_store():
+    if settings.RESPONSE_CACHE_BACKEND == "redis" and settings.RESPONSE_CACHE_REDIS_URL:
+        try:
+            return RedisStore.from_url(settings.RESPONSE_CACHE_REDIS_URL)
+        except ImportError:
+            logger.warning("redis not installed. Falling back to the in-process response cache.")
+    return MemoryStore(max_entries=settings.RESPONSE_CACHE_SIZE)
+
+
+# Global response cache instance
+response_cache = ResponseCache(_create_store())
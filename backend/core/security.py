@@ -1,17 +1,26 @@
 """
 Security module for JWT authentication and password hashing.
+
+bcrypt is deliberately slow (100-300 ms per call), so routes use the async
+variants, which run it on a dedicated pool of PASSWORD_HASH_WORKERS
+threads; bcrypt releases the GIL, so the event loop keeps serving other
+requests meanwhile.
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from backend.core.config import settings
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes with a different work factor need an update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+_hash_executor: Optional[ThreadPoolExecutor] = None
 
 # JWT Bearer token security
 security = HTTPBearer()
@@ -49,6 +58,40 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if its hash uses outdated settings (e.g. fewer
+    BCRYPT_ROUNDS), return a new hash to store. Returns (valid, new_hash or None).
+    """
+    plain_password = normalize_password(plain_password)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    """Get the thread pool used for bcrypt."""
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="bcrypt"
+        )
+    return _hash_executor
+
+
+async def ahash_password(password: str) -> str:
+    """Hash a password on the bcrypt pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+
+async def averify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the bcrypt pool; see verify_and_update_password()."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), verify_and_update_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -0,0 +1,203 @@
+"""
+Pool of persistent, authenticated SMTP sessions.
+
+Opening a connection, upgrading it with STARTTLS and logging in costs several
+round trips, so sessions are kept open and reused across messages. Idle
+sessions are health-checked with NOOP before reuse, evicted after
+SMTP_POOL_IDLE_SECONDS, and a send that fails on a broken session is
+retried once on a fresh one.
+
+The pool is thread-safe: send_email runs in worker threads via run_blocking.
+"""
+
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from email.message import Message
+from typing import Deque, Optional, Tuple
+from backend.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors where the server rejected the message but the session is still usable
+_REJECTION_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)
+# Errors meaning the session itself is unusable; checked after _REJECTION_ERRORS,
+# since every SMTPException is also an OSError
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, OSError)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of reusable smtplib.SMTP sessions."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        size: int = 4,
+        idle_seconds: float = 60,
+        health_check_seconds: float = 10,
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.health_check_seconds = health_check_seconds
+        self.timeout = timeout
+        # Idle sessions with the time they were returned, most recent last
+        self._idle: Deque[Tuple[smtplib.SMTP, float]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.stats = {"connections_opened": 0, "connections_reused": 0, "health_check_failures": 0,
+                      "evicted_idle": 0, "retries": 0, "messages_sent": 0}
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.stats["connections_opened"] += 1
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> smtplib.SMTP:
+        """Take a healthy idle session, or open a new one."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, returned_at = self._idle.pop()
+            idle_for = time.monotonic() - returned_at
+            if idle_for >= self.idle_seconds:
+                self._close(server)
+                with self._lock:
+                    self.stats["evicted_idle"] += 1
+                continue
+            if idle_for >= self.health_check_seconds and not self._is_alive(server):
+                self._close(server)
+                with self._lock:
+                    self.stats["health_check_failures"] += 1
+                continue
+            with self._lock:
+                self.stats["connections_reused"] += 1
+            return server
+        return self._connect()
+
+    def _release(self, server: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send_message(self, msg: Message):
+        """
+        Send a message over a pooled session.
+        Raises the underlying smtplib error if it cannot be delivered.
+        """
+        self.evict_idle()
+        with self._slots:
+            server = self._acquire()
+            try:
+                server.send_message(msg)
+            except _REJECTION_ERRORS:
+                # Message rejected; reset the session so it can be reused
+                try:
+                    server.rset()
+                    self._release(server)
+                except Exception:
+                    self._close(server)
+                raise
+            except _CONNECTION_ERRORS as e:
+                # Stale session (e.g. server-side timeout): retry once on a fresh one
+                logger.info(f"SMTP session to {self.host} failed ({e}); reconnecting")
+                self._close(server)
+                with self._lock:
+                    self.stats["retries"] += 1
+                server = self._connect()
+                try:
+                    server.send_message(msg)
+                except Exception:
+                    self._close(server)
+                    raise
+            except Exception:
+                self._close(server)
+                raise
+            self._release(server)
+            with self._lock:
+                self.stats["messages_sent"] += 1
+
+    def evict_idle(self):
+        """Close sessions that have been idle longer than idle_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [entry for entry in self._idle if now - entry[1] >= self.idle_seconds]
+            self._idle = deque(entry for entry in self._idle if now - entry[1] < self.idle_seconds)
+            self.stats["evicted_idle"] += len(stale)
+        for server, _ in stale:
+            self._close(server)
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            self._close(server)
+
+
+_pool: Optional[SMTPConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Get the shared SMTP pool built from settings."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool(
+                    host=settings.SMTP_HOST,
+                    port=settings.SMTP_PORT,
+                    username=settings.SMTP_USER,
+                    password=settings.SMTP_PASSWORD,
+                    starttls=settings.SMTP_STARTTLS,
+                    size=settings.SMTP_POOL_SIZE,
+                    idle_seconds=settings.SMTP_POOL_IDLE_SECONDS,
+                )
+    return _pool
+
+
+def close_smtp_pool():
+    """Close the shared pool's sessions (on shutdown)."""
+    if _pool is not None:
+        _pool.close()
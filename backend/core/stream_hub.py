@@ -0,0 +1,108 @@
+"""
+Shared in-flight streams.
+
+When several clients ask for the same generated text at once (e.g. doctors
+opening the same chart), StreamHub runs one producer per key and fans its
+chunks out to every subscriber. Late subscribers first get the chunks
+produced so far. The producer runs as its own task, so it finishes and its
+result is persisted even if every client disconnects.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Broadcast:
+    """Chunks produced so far for one key, plus a wake-up for subscribers."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[str] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[str] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class StreamSubscription:
+    """A subscriber's view: iterate for chunks, then check error."""
+
+    def __init__(self, broadcast: _Broadcast):
+        self._broadcast = broadcast
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._broadcast.follow()
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._broadcast.error
+
+
+class StreamHub:
+    """One producer per key, shared by all concurrent subscribers."""
+
+    def __init__(self):
+        self._streams: Dict[str, _Broadcast] = {}
+        # Running producers, referenced so they aren't garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(
+        self,
+        key: str,
+        produce: Callable[[], AsyncIterator[str]],
+        on_complete: Callable[[str], Awaitable[None]],
+    ) -> StreamSubscription:
+        """
+        Follow the stream for key, starting produce() if none is in flight.
+
+        Args:
+            key: What is being generated, e.g. an appointment ID
+            produce: Starts the generation; yields text chunks
+            on_complete: Awaited once with the full text when produce() succeeds
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            task = asyncio.create_task(self._run(key, broadcast, produce, on_complete))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return StreamSubscription(broadcast)
+
+    async def _run(self, key: str, broadcast: _Broadcast, produce, on_complete):
+        error = None
+        try:
+            async for chunk in produce():
+                broadcast.publish(chunk)
+            await on_complete("".join(broadcast.chunks))
+        except Exception as e:
+            logger.error(f"Stream for {key} failed: {e}")
+            error = str(e)
+        finally:
+            # Later requests start a new stream (or read the persisted result)
+            del self._streams[key]
+            broadcast.finish(error)
@@ -0,0 +1,58 @@
+"""
+Short-lived cache of user profiles for background jobs.
+
+Reminder sweeps look up the same patients and doctors over and over; this
+keeps their profiles for a few minutes and fetches whatever is missing with
+one multi-document read.
+"""
+
+from typing import Any, Dict, Iterable, Tuple
+from backend.core.cache import LRUCache
+from backend.core.config import settings
+from backend.core.firestore_client import AsyncFirestore
+
+_MISSING = object()
+
+
+class UserProfileCache:
+    """TTL cache of users/{id} documents keyed by user ID."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        # user_id -> profile, or None for users that don't exist; the least
+        # recently used entries are dropped beyond max_entries
+        self._entries = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def invalidate(self, user_id: str):
+        self._entries.delete(user_id)
+
+    async def get_many(self, db: AsyncFirestore, user_ids: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """
+        Return profiles for the given user IDs and the number of round trips used.
+        Cache misses are fetched together with a single get_all.
+        """
+        profiles: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for user_id in {uid for uid in user_ids if uid}:
+            profile = self._entries.get(user_id, _MISSING)
+            if profile is _MISSING:
+                missing.append(user_id)
+            elif profile is not None:
+                profiles[user_id] = profile
+
+        if not missing:
+            return profiles, 0
+
+        users_ref = db.collection("users")
+        snapshots = await db.get_all([users_ref.document(user_id) for user_id in missing])
+        found = {}
+        for snapshot in snapshots:
+            if snapshot.exists:
+                found[snapshot.id] = snapshot.to_dict()
+        for user_id in missing:
+            self._entries.set(user_id, found.get(user_id))
+        profiles.update(found)
+        return profiles, 1
+
+
+# Global user profile cache shared by background jobs
+user_profile_cache = UserProfileCache(ttl_seconds=settings.USER_PROFILE_CACHE_TTL_SECONDS)
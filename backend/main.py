@@ -29,9 +29,11 @@ except ImportError:
 
 from backend.core.config import settings
 from backend.core.firestore_client import initialize_firebase, get_firestore
-from datetime import datetime, timezone
+from backend.core.reminder_scheduler import reminder_scheduler
+from backend.core.smtp_pool import close_smtp_pool
+from backend.core.email_outbox import email_outbox
 import asyncio
-from backend.routes import auth, appointments, reminders, questionnaire, analytics, crewai_routes
+from backend.routes import auth, appointments, reminders, questionnaire, analytics, crewai_routes, agent_runs
 
 # Configure logging
 logging.basicConfig(
@@ -41,78 +43,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def _reminder_sender_loop():
-    """Background loop to send due reminders.
-    Checks Firestore every 60 seconds for reminders with status 'scheduled'
-    and scheduled_at <= now, then sends email and marks them as 'sent'.
-    """
-    db = get_firestore()
-    while True:
-        try:
-            now_iso = datetime.now(timezone.utc)
-            reminders_ref = db.collection("reminders")
-            # Fetch scheduled reminders; Firestore cannot filter by time <= now with two inequalities easily,
-            # so fetch a small window and filter in app.
-            query = reminders_ref.where("status", "==", "scheduled").limit(50).stream()
-            for doc in query:
-                data = doc.to_dict()
-                scheduled_at = data.get("scheduled_at")
-                if not scheduled_at:
-                    continue
-                # Firestore returns datetime with tz; ensure comparable
-                try:
-                    if scheduled_at <= now_iso:
-                        # Fetch patient email
-                        patient_id = data.get("patient_id", "")
-                        appointment_date = data.get("appointment_date", "")
-                        appointment_time = data.get("appointment_time", "")
-                        doctor_id = data.get("doctor_id", "")
-                        # Look up patient & doctor
-                        patient_email = ""
-                        patient_name = "Patient"
-                        doctor_name = "Doctor"
-                        specialty = data.get("specialty", "General")
-                        try:
-                            patient_doc = db.collection("users").document(patient_id).get()
-                            if patient_doc.exists:
-                                p = patient_doc.to_dict()
-                                patient_email = p.get("email", "")
-                                patient_name = p.get("full_name", patient_name)
-                        except Exception:
-                            pass
-                        try:
-                            if doctor_id:
-                                doctor_doc = db.collection("users").document(doctor_id).get()
-                                if doctor_doc.exists:
-                                    d = doctor_doc.to_dict()
-                                    doctor_name = d.get("full_name", doctor_name)
-                                    specialty = d.get("specialty", specialty)
-                        except Exception:
-                            pass
-                        if patient_email:
-                            from backend.core.email_service import send_appointment_reminder
-                            send_appointment_reminder(
-                                patient_email=patient_email,
-                                patient_name=patient_name,
-                                doctor_name=doctor_name,
-                                appointment_date=appointment_date,
-                                appointment_time=appointment_time,
-                                specialty=specialty,
-                                reason=data.get("reason")
-                            )
-                            # Mark sent
-                            doc.reference.update({
-                                "status": "sent",
-                                "sent_at": datetime.now(timezone.utc)
-                            })
-                            logger.info(f"Reminder sent to {patient_email} for {appointment_date} {appointment_time}")
-                except Exception as send_err:
-                    logger.warning(f"Reminder send check failed for {doc.id}: {send_err}")
-        except Exception as e:
-            logger.warning(f"Reminder sender loop error: {e}")
-        await asyncio.sleep(60)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
@@ -126,12 +56,19 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize Firebase: {str(e)}")
         logger.warning("Backend will continue, but Firestore operations may fail.")
     
-    # Start background reminder loop
+    # Start background reminder scheduler
     reminder_task = None
     try:
-        reminder_task = asyncio.create_task(_reminder_sender_loop())
+        reminder_task = asyncio.create_task(reminder_scheduler.run())
+    except Exception as e:
+        logger.warning(f"Failed to start reminder scheduler: {e}")
+
+    # Start email outbox workers
+    outbox_task = None
+    try:
+        outbox_task = asyncio.create_task(email_outbox.run())
     except Exception as e:
-        logger.warning(f"Failed to start reminder loop: {e}")
+        logger.warning(f"Failed to start email outbox: {e}")
 
     yield
     
@@ -141,8 +78,11 @@ async def lifespan(app: FastAPI):
     try:
         if reminder_task:
             reminder_task.cancel()
+        if outbox_task:
+            outbox_task.cancel()
     except Exception:
         pass
+    close_smtp_pool()
 
 
 # Create FastAPI app
@@ -172,6 +112,7 @@ app.include_router(reminders.router)
 app.include_router(questionnaire.router)
 app.include_router(analytics.router)
 app.include_router(crewai_routes.router)
+app.include_router(agent_runs.router)
 
 
 @app.get("/", tags=["Root"])
@@ -188,11 +129,27 @@ async def root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint."""
-    return {
+    health = {
         "status": "healthy",
         "firebase_initialized": True,  # Can be enhanced to check actual connection
+        "firestore_backend": settings.FIRESTORE_BACKEND,
         "mock_ai": settings.USE_MOCK_AI
     }
+    if settings.FIRESTORE_BACKEND == "memory":
+        # Round trip / query / read / write counters for load testing
+        health["firestore_stats"] = dict(get_firestore().stats)
+    from backend.core.email_service import email_content_cache, email_batcher
+    health["email_content_cache"] = email_content_cache.stats
+    health["email_batcher"] = email_batcher.stats
+    from backend.core.llm_gateway import llm_gateway
+    health["llm"] = llm_gateway.stats
+    from backend.core.orchestrator import orchestrator
+    health["agent_result_cache"] = {**orchestrator.result_cache.stats, "entries": len(orchestrator.result_cache)}
+    from backend.core.response_cache import response_cache
+    health["response_cache"] = response_cache.stats
+    from backend.core.doctor_directory import doctor_directory
+    health["doctor_directory"] = {**doctor_directory.stats, "doctors": len(doctor_directory)}
+    return health
 
 
 @app.exception_handler(Exception)
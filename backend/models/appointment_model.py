@@ -50,6 +50,7 @@ class AppointmentResponse(BaseModel):
     specialty: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    agent_run_id: Optional[str] = None  # Set when the agent runs in the background
     
     class Config:
         from_attributes = True
@@ -31,6 +31,7 @@ class QuestionnaireResponse(BaseModel):
     additional_notes: Optional[str] = None
     summary: Optional[str] = None
     submitted_at: Optional[datetime] = None
+    agent_run_id: Optional[str] = None  # Set when the pre-visit agent runs in the background
     
     class Config:
         from_attributes = True
@@ -0,0 +1,111 @@
+"""
+Agent run routes for polling background CrewAI agent results.
+"""
+
+from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Dict, Any
+from backend.core.security import get_current_user
+from backend.core.firestore_client import get_async_firestore
+from backend.core.agent_runs import AGENT_RUNS_COLLECTION
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/agent-runs", tags=["Agent Runs"])
+
+
+def _agent_run_to_response(run_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an agent_runs document to a response dict."""
+    response = {"id": run_id, **data}
+    for field in ("created_at", "completed_at"):
+        if hasattr(response.get(field), "isoformat"):
+            response[field] = response[field].isoformat()
+    return response
+
+
+@router.get("/{run_id}")
+async def get_agent_run(
+    run_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Get an agent run. Status is "pending" until the agent finishes, then
+    "completed" or "failed" with the agent result.
+    """
+    db = get_async_firestore()
+
+    try:
+        run_doc = await db.collection(AGENT_RUNS_COLLECTION).document(run_id).get()
+
+        if not run_doc.exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Agent run not found"
+            )
+
+        run_data = run_doc.to_dict()
+
+        # Check permissions
+        if current_user["role"] != "admin" and run_data.get("user_id") != current_user["user_id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to view this agent run"
+            )
+
+        return _agent_run_to_response(run_doc.id, run_data)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching agent run: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch agent run"
+        )
+
+
+@router.get("")
+async def list_agent_runs(
+    appointment_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    List the agent runs of an appointment, e.g. the booking agent's run
+    after POST /api/book.
+    """
+    db = get_async_firestore()
+    user_id = current_user["user_id"]
+
+    try:
+        appointment_doc = await db.collection("appointments").document(appointment_id).get()
+
+        if not appointment_doc.exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Appointment not found"
+            )
+
+        appointment_data = appointment_doc.to_dict()
+
+        # Check permissions
+        if (current_user["role"] != "admin" and
+            appointment_data.get("patient_id") != user_id and
+            appointment_data.get("doctor_id") != user_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to view agent runs for this appointment"
+            )
+
+        runs = await db.collection(AGENT_RUNS_COLLECTION).where("appointment_id", "==", appointment_id).get()
+        results = [_agent_run_to_response(doc.id, doc.to_dict()) for doc in runs]
+        results.sort(key=lambda run: run.get("created_at") or "")
+        return results
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing agent runs: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to list agent runs"
+        )
@@ -2,26 +2,79 @@
 Analytics routes for dashboard statistics and reports.
 """
 
+import asyncio
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import Dict, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
+from backend.core.config import settings
 from backend.core.security import get_current_user, require_role
-from backend.core.firestore_client import get_firestore
+from backend.core.firestore_client import get_async_firestore
+from backend.core.counters import aggregate_shards, specialty_counts
+from backend.core.response_cache import ADMIN_ANALYTICS_TAG, cached_response
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
+# Firestore "in" filters take at most 30 values
+IN_QUERY_LIMIT = 30
+STATS_STATUSES = ("confirmed", "pending", "cancelled", "completed")
+
+
+async def _gather_branches(**branches: Awaitable) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Await independent reads concurrently, each bounded by the branch timeout.
+    A branch that times out yields None and is listed in the returned names.
+    """
+    timeout = settings.ANALYTICS_BRANCH_TIMEOUT_SECONDS
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(branch, timeout) for branch in branches.values()),
+        return_exceptions=True
+    )
+    results: Dict[str, Any] = {}
+    timed_out: List[str] = []
+    for name, outcome in zip(branches, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            logger.warning(f"Analytics branch {name} timed out after {timeout}s")
+            results[name] = None
+            timed_out.append(name)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[name] = outcome
+    return results, timed_out
+
+
+def _flag_partial(result: Dict, timed_out: List[str]) -> Dict:
+    """Mark a response whose missing parts timed out."""
+    result["partial"] = bool(timed_out)
+    result["timed_out"] = timed_out
+    return result
+
+
+def _dashboard_tags(params: Dict) -> List[str]:
+    user = params["current_user"]
+    tags = [f"analytics:{user['user_id']}"]
+    if user["role"] == "admin":
+        tags.append(ADMIN_ANALYTICS_TAG)
+    return tags
+
 
 @router.get("/dashboard")
+@cached_response(
+    "analytics.dashboard", settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_STALE_SECONDS,
+    tags=_dashboard_tags,
+    # A dashboard missing timed-out branches is served once, not for the whole TTL
+    cacheable=lambda result: not result.get("partial")
+)
 async def get_dashboard_analytics(
     current_user: Dict = Depends(get_current_user)
 ):
     """
     Get dashboard analytics based on user role.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
@@ -45,10 +98,12 @@ async def get_dashboard_analytics(
 
 async def _get_patient_analytics(db, user_id: str) -> Dict:
     """Get analytics for patient dashboard."""
-    appointments_ref = db.collection("appointments")
-    
-    # Get all patient appointments
-    appointments = appointments_ref.where("patient_id", "==", user_id).stream()
+    # Appointments and questionnaires are read concurrently
+    results, timed_out = await _gather_branches(
+        appointments=db.collection("appointments").where("patient_id", "==", user_id).get(),
+        questionnaires=db.collection("questionnaires").where("patient_id", "==", user_id).count()
+    )
+    appointments = results["appointments"] or []
     
     total_appointments = 0
     confirmed_appointments = 0
@@ -82,32 +137,31 @@ async def _get_patient_analytics(db, user_id: str) -> Dict:
         except:
             pass
     
-    # Get questionnaires
-    questionnaires_ref = db.collection("questionnaires")
-    questionnaires = questionnaires_ref.where("patient_id", "==", user_id).stream()
-    total_questionnaires = sum(1 for _ in questionnaires)
-    
-    return {
+    return _flag_partial({
         "total_appointments": total_appointments,
         "confirmed_appointments": confirmed_appointments,
         "pending_appointments": pending_appointments,
         "upcoming_appointments": upcoming_appointments[:5],  # Limit to 5
-        "total_questionnaires": total_questionnaires
-    }
+        "total_questionnaires": results["questionnaires"] or 0
+    }, timed_out)
 
 
 async def _get_doctor_analytics(db, user_id: str) -> Dict:
     """Get analytics for doctor dashboard."""
-    appointments_ref = db.collection("appointments")
-    
     # Get all doctor appointments
-    appointments = appointments_ref.where("doctor_id", "==", user_id).stream()
+    results, timed_out = await _gather_branches(
+        appointments=db.collection("appointments").where("doctor_id", "==", user_id).get()
+    )
+    appointments = results["appointments"] or []
     
     total_appointments = 0
     today_appointments = 0
     pending_reviews = 0
     total_patients = set()
     today_schedule = []
+    # Appointments from before has_questionnaire was maintained, until
+    # workers/reconcile_counters.py has flagged them
+    unflagged = []
     
     today = datetime.utcnow().date()
     
@@ -135,81 +189,58 @@ async def _get_doctor_analytics(db, user_id: str) -> Dict:
         except:
             pass
         
-        # Check for pending questionnaires
+        # Pending reviews: confirmed appointments with a questionnaire
         if appointment_data.get("status") == "confirmed":
-            questionnaires_ref = db.collection("questionnaires")
-            questionnaire_query = questionnaires_ref.where("appointment_id", "==", appointment.id).limit(1).stream()
-            has_questionnaire = any(questionnaire_query)
-            if has_questionnaire:
+            if "has_questionnaire" not in appointment_data:
+                unflagged.append(appointment.id)
+            elif appointment_data["has_questionnaire"]:
                 pending_reviews += 1
     
-    return {
+    if unflagged:
+        answered, answered_timed_out = await _gather_branches(
+            questionnaires=_answered_appointments(db, unflagged)
+        )
+        pending_reviews += len(answered["questionnaires"] or ())
+        timed_out += answered_timed_out
+    
+    return _flag_partial({
         "total_appointments": total_appointments,
         "today_appointments": today_appointments,
         "total_patients": len(total_patients),
         "pending_reviews": pending_reviews,
         "today_schedule": sorted(today_schedule, key=lambda x: x.get("time", ""))
-    }
+    }, timed_out)
 
 
-async def _get_admin_analytics(db) -> Dict:
-    """Get analytics for admin dashboard."""
-    appointments_ref = db.collection("appointments")
-    users_ref = db.collection("users")
-    
-    # Get all appointments
-    appointments = appointments_ref.stream()
-    
-    total_appointments = 0
-    total_confirmed = 0
-    total_pending = 0
-    total_cancelled = 0
-    
-    for appointment in appointments:
-        total_appointments += 1
-        status = appointment.to_dict().get("status", "pending")
-        if status == "confirmed":
-            total_confirmed += 1
-        elif status == "pending":
-            total_pending += 1
-        elif status == "cancelled":
-            total_cancelled += 1
-    
-    # Get user counts
-    users = users_ref.stream()
-    total_users = 0
-    total_patients = 0
-    total_doctors = 0
-    
-    for user in users:
-        total_users += 1
-        role = user.to_dict().get("role", "patient")
-        if role == "patient":
-            total_patients += 1
-        elif role == "doctor":
-            total_doctors += 1
-    
-    # Get reminders
-    reminders_ref = db.collection("reminders")
-    reminders = reminders_ref.stream()
-    total_reminders = sum(1 for _ in reminders)
-    
-    # Get questionnaires
+async def _answered_appointments(db, appointment_ids: List[str]) -> Set[str]:
+    """
+    Return which of these appointments have a questionnaire, with batched
+    "in" queries. Read-only: the flags are stored by the reconcile job.
+    """
     questionnaires_ref = db.collection("questionnaires")
-    questionnaires = questionnaires_ref.stream()
-    total_questionnaires = sum(1 for _ in questionnaires)
+    chunks = [appointment_ids[i:i + IN_QUERY_LIMIT] for i in range(0, len(appointment_ids), IN_QUERY_LIMIT)]
+    results = await asyncio.gather(
+        *(questionnaires_ref.where("appointment_id", "in", chunk).get() for chunk in chunks)
+    )
+    return {doc.to_dict().get("appointment_id") for docs in results for doc in docs}
+
+
+async def _get_admin_analytics(db) -> Dict:
+    """Get analytics for admin dashboard from the maintained counters."""
+    results, timed_out = await _gather_branches(counters=aggregate_shards(db))
+    counts = results["counters"] or {}
     
-    return {
-        "total_appointments": total_appointments,
-        "total_confirmed": total_confirmed,
-        "total_pending": total_pending,
-        "total_cancelled": total_cancelled,
-        "total_users": total_users,
-        "total_patients": total_patients,
-        "total_doctors": total_doctors,
-        "total_reminders": total_reminders,
-        "total_questionnaires": total_questionnaires
-    }
+    return _flag_partial({
+        "total_appointments": counts.get("appointments_total", 0),
+        "total_confirmed": counts.get("appointments_confirmed", 0),
+        "total_pending": counts.get("appointments_pending", 0),
+        "total_cancelled": counts.get("appointments_cancelled", 0),
+        "total_users": counts.get("users_total", 0),
+        "total_patients": counts.get("users_patient", 0),
+        "total_doctors": counts.get("users_doctor", 0),
+        "total_reminders": counts.get("reminders_total", 0),
+        "total_questionnaires": counts.get("questionnaires_total", 0)
+    }, timed_out)
 
 
 @router.get("/stats")
@@ -220,49 +251,35 @@ async def get_stats(
     """
     Get detailed statistics for doctors and admins.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        appointments_ref = db.collection("appointments")
-        
-        if user_role == "doctor":
-            query = appointments_ref.where("doctor_id", "==", user_id)
-        else:
-            query = appointments_ref
+        # Count in the datastore: one count() aggregation per status plus the
+        # total, with specialties from the daily rollups
+        query = db.collection("appointments").where("created_at", ">=", start_date)
+        doctor_id = user_id if user_role == "doctor" else None
+        if doctor_id:
+            query = query.where("doctor_id", "==", doctor_id)
         
-        appointments = query.stream()
+        results, timed_out = await _gather_branches(
+            total=query.count(),
+            by_specialty=specialty_counts(db, start_date.date().isoformat(), doctor_id),
+            **{
+                status_name: query.where("status", "==", status_name).count()
+                for status_name in STATS_STATUSES
+            }
+        )
         
-        stats = {
+        return _flag_partial({
             "period_days": days,
-            "total_appointments": 0,
-            "by_status": {
-                "confirmed": 0,
-                "pending": 0,
-                "cancelled": 0,
-                "completed": 0
-            },
-            "by_specialty": {}
-        }
-        
-        for appointment in appointments:
-            appointment_data = appointment.to_dict()
-            created_at = appointment_data.get("created_at")
-            
-            # Filter by date if possible
-            if created_at and isinstance(created_at, datetime) and created_at >= start_date:
-                stats["total_appointments"] += 1
-                status = appointment_data.get("status", "pending")
-                if status in stats["by_status"]:
-                    stats["by_status"][status] += 1
-                
-                specialty = appointment_data.get("specialty", "General")
-                stats["by_specialty"][specialty] = stats["by_specialty"].get(specialty, 0) + 1
-        
-        return stats
+            "total_appointments": results["total"] or 0,
+            "by_status": {status_name: results[status_name] or 0 for status_name in STATS_STATUSES},
+            "by_specialty": results["by_specialty"] or {}
+        }, timed_out)
         
     except Exception as e:
         logger.error(f"Error fetching stats: {str(e)}")
@@ -10,11 +10,21 @@ from backend.models.appointment_model import (
     AppointmentStatus, AvailableSlot
 )
 from backend.core.security import get_current_user
-from backend.core.firestore_client import get_firestore
+from backend.core.firestore_client import get_async_firestore
+from backend.core.response_cache import appointment_tags, cached_response, response_cache
+from backend.core.doctor_directory import doctor_directory
+from backend.core.config import settings
+from backend.core.reminder_scheduler import reminder_scheduler
+from backend.core.agent_runs import run_agent
+from backend.core.email_outbox import OUTBOX_COLLECTION, email_outbox, outbox_message, with_outbox
+from backend.core.occupancy import (
+    DAY_SLOTS, SlotUnavailableError, booked_times, get_day_bitmaps,
+    book_slot, reschedule_slot, cancel_slot
+)
 from backend.agents.booking_agent import (
-    book_appointment as agent_book,
-    reschedule_appointment as agent_reschedule,
-    cancel_appointment as agent_cancel
+    abook_appointment as agent_book,
+    areschedule_appointment as agent_reschedule,
+    acancel_appointment as agent_cancel
 )
 import logging
 
@@ -42,6 +52,10 @@ def _appointment_doc_to_response(doc_id: str, doc_data: dict) -> AppointmentResp
 
 
 @router.get("/slots", response_model=List[AvailableSlot])
+@cached_response(
+    "slots", settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_STALE_SECONDS,
+    tags=lambda params: ["slots"], per_user=False
+)
 async def get_available_slots(
     doctor_id: Optional[str] = None,
     date: Optional[str] = None,
@@ -52,26 +66,24 @@ async def get_available_slots(
     Get available appointment slots with continuous time slots (9am, 9:30am, 10am, etc.).
     Checks existing appointments to show which slots are booked/available.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     
     try:
-        # Get available doctors
-        doctors_ref = db.collection("users").where("role", "==", "doctor")
-        
+        # Get available doctors from the in-memory directory
+        await doctor_directory.ensure_fresh(db)
         if doctor_id:
-            doctors_ref = doctors_ref.where("__name__", "==", doctor_id)
-        if specialty:
-            doctors_ref = doctors_ref.where("specialty", "==", specialty)
+            doctor_data = doctor_directory.get(doctor_id)
+            matches = doctor_data is not None and (not specialty or doctor_data.get("specialty") == specialty)
+            doctors_cursor = [(doctor_id, doctor_data)] if matches else []
+        elif specialty:
+            doctors_cursor = doctor_directory.by_specialty(specialty)
+        else:
+            doctors_cursor = doctor_directory.all()
         
-        # Stream doctors; if specialty filter yields none, fallback to all doctors
-        doctors_cursor = list(doctors_ref.stream())
+        # If specialty filter yields none, fallback to all doctors
         if not doctors_cursor and specialty:
-            try:
-                fallback_ref = db.collection("users").where("role", "==", "doctor")
-                doctors_cursor = list(fallback_ref.stream())
-                logger.info(f"No doctors found for specialty '{specialty}', falling back to all doctors")
-            except Exception:
-                doctors_cursor = []
+            doctors_cursor = doctor_directory.all()
+            logger.info(f"No doctors found for specialty '{specialty}', falling back to all doctors")
         
         # Generate continuous time slots: 9:00 AM to 5:00 PM, 30-minute intervals
         from datetime import datetime, timedelta
@@ -84,19 +96,7 @@ async def get_available_slots(
             slot_date = datetime.utcnow()
         
         # Generate all possible time slots (9:00 AM to 5:00 PM)
-        all_times = []
-        start_hour = 9
-        end_hour = 17
-        for hour in range(start_hour, end_hour + 1):
-            for minute in [0, 30]:
-                if hour == end_hour and minute == 30:  # Skip 5:30 PM
-                    break
-                time_str = f"{hour}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
-                if hour > 12:
-                    time_str = f"{hour-12}:{minute:02d} PM"
-                elif hour == 12:
-                    time_str = f"12:{minute:02d} PM"
-                all_times.append(time_str)
+        all_times = list(DAY_SLOTS)
         
         # Filter out past times if date is today
         from datetime import datetime as dt
@@ -131,43 +131,23 @@ async def get_available_slots(
                     from datetime import timedelta as _td
                     next_day = slot_date + _td(days=1)
                     base_date = next_day.strftime("%Y-%m-%d")
-                    all_times = []
-                    for hour in range(start_hour, end_hour + 1):
-                        for minute in [0, 30]:
-                            if hour == end_hour and minute == 30:
-                                break
-                            ts = f"{hour}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
-                            if hour > 12:
-                                ts = f"{hour-12}:{minute:02d} PM"
-                            elif hour == 12:
-                                ts = f"12:{minute:02d} PM"
-                            all_times.append(ts)
+                    all_times = list(DAY_SLOTS)
         except Exception as e:
             logger.warning(f"Error filtering past times: {str(e)}")
             # Keep all times if filtering fails
         
         slots = []
         
-        # Get existing appointments for the date to check availability
-        appointments_ref = db.collection("appointments")
-        existing_appointments = appointments_ref.where("date", "==", base_date).where("status", "==", "confirmed").stream()
-        
-        booked_slots = {}  # {(doctor_id, time): True}
-        for apt in existing_appointments:
-            apt_data = apt.to_dict()
-            apt_doctor_id = apt_data.get("doctor_id", "")
-            apt_time = apt_data.get("time", "")
-            if apt_doctor_id and apt_time:
-                booked_slots[(apt_doctor_id, apt_time)] = True
+        # Get each doctor's occupancy bitmap for the date (one batched point read)
+        bitmaps = await get_day_bitmaps(db, [doctor_id_val for doctor_id_val, _ in doctors_cursor], base_date)
         
         # Create slots for each doctor
-        for doctor in doctors_cursor:
-            doctor_data = doctor.to_dict()
-            doctor_id_val = doctor.id
+        for doctor_id_val, doctor_data in doctors_cursor:
+            doctor_booked_times = booked_times(bitmaps.get(doctor_id_val, 0))
             
             # Add all time slots for this doctor
             for time in all_times:
-                is_booked = booked_slots.get((doctor_id_val, time), False)
+                is_booked = time in doctor_booked_times
                 
                 # Add all slots (both booked and available) with availability flag
                 slots.append(AvailableSlot(
@@ -218,7 +198,7 @@ async def book_appointment(
     Book a new appointment.
     Triggers booking agent and stores appointment in Firestore.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
@@ -229,10 +209,6 @@ async def book_appointment(
                 detail="Cannot book appointments for other users"
             )
         
-        # Trigger booking agent
-        agent_result = agent_book(appointment.dict())
-        logger.info(f"Booking agent result: {agent_result}")
-        
         # Create appointment document
         appointment_doc = {
             "patient_id": appointment.patient_id,
@@ -245,43 +221,51 @@ async def book_appointment(
             "reason": appointment.reason,
             "specialty": appointment.specialty,
             "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "updated_at": datetime.utcnow(),
+            "has_questionnaire": False
         }
         
-        # Add to Firestore
+        # Add to Firestore, claiming the doctor's slot and queueing the
+        # confirmation email in the same transaction
         appointments_ref = db.collection("appointments")
         appointment_ref = appointments_ref.document()
         appointment_id = appointment_ref.id
-        appointment_ref.set(appointment_doc)
+        outbox_ref = db.collection(OUTBOX_COLLECTION).document()
+        confirmation = outbox_message("appointment_confirmation", appointment.patient_id, {
+            "patient_name": appointment.patient_name,
+            "doctor_name": appointment.doctor_name,
+            "appointment_date": appointment.date,
+            "appointment_time": appointment.time,
+            "specialty": appointment.specialty or "General",
+            "reason": appointment.reason,
+            "questionnaire_required": True  # Always require questionnaire
+        })
+        try:
+            await db.run_transaction(
+                with_outbox(book_slot), outbox_ref.sync, confirmation,
+                db.sync, appointment_ref.sync, appointment_doc
+            )
+        except SlotUnavailableError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="This time slot is no longer available"
+            )
+        email_outbox.notify()
+        await response_cache.invalidate(*appointment_tags(appointment.patient_id, appointment.doctor_id))
         
         logger.info(f"Appointment booked: {appointment_id}")
         
-        # Send confirmation email with Gemini-generated content
-        try:
-            from backend.core.email_service import send_appointment_confirmation
-            # Get patient email
-            patient_doc = db.collection("users").document(appointment.patient_id).get()
-            if patient_doc.exists:
-                patient_data = patient_doc.to_dict()
-                patient_email = patient_data.get("email", "")
-                if patient_email:
-                    send_appointment_confirmation(
-                        patient_email=patient_email,
-                        patient_name=appointment.patient_name,
-                        doctor_name=appointment.doctor_name,
-                        appointment_date=appointment.date,
-                        appointment_time=appointment.time,
-                        specialty=appointment.specialty or "General",
-                        reason=appointment.reason,
-                        questionnaire_required=True  # Always require questionnaire
-                    )
-                    logger.info(f"Confirmation email sent to {patient_email} (with Gemini-generated content)")
-        except Exception as e:
-            logger.error(f"Failed to send confirmation email: {str(e)}")
+        # Trigger booking agent
+        agent_result = await run_agent(
+            "book", lambda: agent_book(appointment.dict()), user_id, appointment_id
+        )
+        logger.info(f"Booking agent result: {agent_result}")
         
         # Return appointment response
-        appointment_data = appointment_ref.get().to_dict()
-        return _appointment_doc_to_response(appointment_id, appointment_data)
+        appointment_data = (await appointment_ref.get()).to_dict()
+        response = _appointment_doc_to_response(appointment_id, appointment_data)
+        response.agent_run_id = agent_result.get("agent_run_id")
+        return response
         
     except HTTPException:
         raise
@@ -305,13 +289,13 @@ async def reschedule_appointment(
     Reschedule an existing appointment.
     Triggers booking agent and updates appointment in Firestore.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
         # Get appointment
         appointment_ref = db.collection("appointments").document(appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -330,22 +314,38 @@ async def reschedule_appointment(
                 detail="Not authorized to reschedule this appointment"
             )
         
+        # Update appointment and move its slot atomically
+        try:
+            await db.run_transaction(reschedule_slot, db.sync, appointment_ref.sync, new_date, new_time)
+        except SlotUnavailableError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The requested time slot is not available"
+            )
+        await response_cache.invalidate(
+            *appointment_tags(appointment_data.get("patient_id"), appointment_data.get("doctor_id"))
+        )
+        
+        logger.info(f"Appointment rescheduled: {appointment_id}")
+        
         # Trigger booking agent
-        agent_result = agent_reschedule(appointment_id, new_date, new_time, reason or "")
+        agent_result = await run_agent(
+            "reschedule", lambda: agent_reschedule(appointment_id, new_date, new_time, reason or ""),
+            user_id, appointment_id
+        )
         logger.info(f"Reschedule agent result: {agent_result}")
         
-        # Update appointment
-        appointment_ref.update({
-            "date": new_date,
-            "time": new_time,
-            "updated_at": datetime.utcnow()
-        })
-        
-        logger.info(f"Appointment rescheduled: {appointment_id}")
+        # Move pending reminders to the new time; their emails are re-rendered in the background
+        try:
+            await reminder_scheduler.reschedule_appointment(appointment_id, new_date, new_time)
+        except Exception as e:
+            logger.error(f"Failed to update reminders for rescheduled appointment: {str(e)}")
         
         # Return updated appointment
-        updated_data = appointment_ref.get().to_dict()
-        return _appointment_doc_to_response(appointment_id, updated_data)
+        updated_data = (await appointment_ref.get()).to_dict()
+        response = _appointment_doc_to_response(appointment_id, updated_data)
+        response.agent_run_id = agent_result.get("agent_run_id")
+        return response
         
     except HTTPException:
         raise
@@ -367,13 +367,13 @@ async def cancel_appointment(
     Cancel an appointment.
     Triggers booking agent and updates appointment status in Firestore.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
         # Get appointment
         appointment_ref = db.collection("appointments").document(appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -392,19 +392,24 @@ async def cancel_appointment(
                 detail="Not authorized to cancel this appointment"
             )
         
-        # Trigger booking agent
-        agent_result = agent_cancel(appointment_id, reason or "")
-        logger.info(f"Cancel agent result: {agent_result}")
-        
-        # Update appointment status
-        appointment_ref.update({
-            "status": "cancelled",
-            "updated_at": datetime.utcnow()
-        })
+        # Update appointment status and free its slot atomically
+        await db.run_transaction(cancel_slot, db.sync, appointment_ref.sync)
+        await response_cache.invalidate(
+            *appointment_tags(appointment_data.get("patient_id"), appointment_data.get("doctor_id"))
+        )
         
         logger.info(f"Appointment cancelled: {appointment_id}")
         
-        return {"message": "Appointment cancelled successfully", "appointment_id": appointment_id}
+        # Trigger booking agent
+        agent_result = await run_agent(
+            "cancel", lambda: agent_cancel(appointment_id, reason or ""), user_id, appointment_id
+        )
+        logger.info(f"Cancel agent result: {agent_result}")
+        
+        response = {"message": "Appointment cancelled successfully", "appointment_id": appointment_id}
+        if agent_result.get("agent_run_id"):
+            response["agent_run_id"] = agent_result["agent_run_id"]
+        return response
         
     except HTTPException:
         raise
@@ -416,7 +421,18 @@ async def cancel_appointment(
         )
 
 
+def _appointments_tags(params: Dict) -> List[str]:
+    user = params["current_user"]
+    if user["role"] == "admin":
+        return ["appointments:all"]
+    return [f"appointments:{user['user_id']}"]
+
+
 @router.get("/appointments", response_model=List[AppointmentResponse])
+@cached_response(
+    "appointments", settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_STALE_SECONDS,
+    tags=_appointments_tags
+)
 async def get_appointments(
     role: Optional[str] = None,
     current_user: Dict = Depends(get_current_user)
@@ -425,7 +441,7 @@ async def get_appointments(
     Get appointments for the current user.
     Patients see their appointments, doctors see their appointments.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
@@ -443,7 +459,7 @@ async def get_appointments(
             query = appointments_ref.where("patient_id", "==", user_id)
         
         appointments = []
-        for doc in query.stream():
+        for doc in await query.get():
             appointments.append(_appointment_doc_to_response(doc.id, doc.to_dict()))
         
         return appointments
@@ -6,9 +6,15 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import timedelta, datetime
 from backend.models.user_model import UserCreate, UserLogin, Token, UserResponse, UserRole
 from backend.core.security import (
-    verify_password, get_password_hash, create_access_token, get_current_user as get_current_user_dep
+    ahash_password, averify_and_update_password, create_access_token, get_current_user as get_current_user_dep
 )
-from backend.core.firestore_client import get_firestore
+from backend.core.firestore_client import get_async_firestore
+from backend.core.email_index import (
+    EMAIL_INDEX_COLLECTION, EmailAlreadyRegisteredError, email_registered, find_user_by_email,
+    normalize_email, register_user
+)
+from backend.core.doctor_directory import doctor_directory
+from backend.core.response_cache import ADMIN_ANALYTICS_TAG, response_cache
 from backend.core.config import settings
 from typing import Dict
 import logging
@@ -25,25 +31,22 @@ async def register(user_data: UserCreate):
     Register a new user.
     Creates user in Firestore and returns JWT token.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     
     try:
-        # Check if user already exists
-        users_ref = db.collection("users")
-        existing_users = users_ref.where("email", "==", user_data.email).stream()
-        
-        if any(existing_users):
+        # Check if user already exists (re-checked atomically when the user is created)
+        if await email_registered(db, user_data.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
         # Hash password
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await ahash_password(user_data.password)
         
         # Create user document
         user_doc = {
-            "email": user_data.email,
+            "email": normalize_email(user_data.email),
             "password_hash": hashed_password,
             "full_name": user_data.full_name,
             "role": user_data.role.value,
@@ -52,10 +55,23 @@ async def register(user_data: UserCreate):
             "created_at": firestore.SERVER_TIMESTAMP
         }
         
-        # Add user to Firestore
-        user_ref = users_ref.document()
+        # Add user to Firestore, claiming the email address in the same transaction
+        user_ref = db.collection("users").document()
         user_id = user_ref.id
-        user_ref.set(user_doc)
+        index_ref = db.collection(EMAIL_INDEX_COLLECTION).document(normalize_email(user_data.email))
+        try:
+            await db.run_transaction(register_user, db.sync, index_ref.sync, user_ref.sync, user_doc)
+        except EmailAlreadyRegisteredError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        if user_data.role == UserRole.DOCTOR:
+            # New doctors show up in slot listings and automatic booking
+            await doctor_directory.invalidate(db)
+            await response_cache.invalidate(ADMIN_ANALYTICS_TAG, "slots")
+        else:
+            await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
         
         # Create access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -67,7 +83,7 @@ async def register(user_data: UserCreate):
         # Return token and user info
         user_response = UserResponse(
             id=user_id,
-            email=user_data.email,
+            email=normalize_email(user_data.email),
             full_name=user_data.full_name,
             role=user_data.role,
             phone=user_data.phone,
@@ -98,20 +114,12 @@ async def login(credentials: UserLogin):
     Login an existing user.
     Validates credentials and returns JWT token.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     
     try:
-        # Find user by email
-        users_ref = db.collection("users")
-        user_query = users_ref.where("email", "==", credentials.email).limit(1).stream()
-        
-        user_doc = None
-        user_id = None
-        
-        for doc in user_query:
-            user_doc = doc.to_dict()
-            user_id = doc.id
-            break
+        # Find user by email (email index point read)
+        found = await find_user_by_email(db, credentials.email)
+        user_id, user_doc = found if found else (None, None)
         
         if not user_doc or not user_id:
             raise HTTPException(
@@ -120,11 +128,18 @@ async def login(credentials: UserLogin):
             )
         
         # Verify password
-        if not verify_password(credentials.password, user_doc.get("password_hash", "")):
+        valid, new_hash = await averify_and_update_password(credentials.password, user_doc.get("password_hash", ""))
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
             )
+        if new_hash:
+            # Hashed with an outdated work factor: store the upgraded hash
+            try:
+                await db.collection("users").document(user_id).update({"password_hash": new_hash})
+            except Exception as e:
+                logger.warning(f"Could not rehash password for user {user_id}: {e}")
         
         # Create access token
         user_role = user_doc.get("role", "patient")
@@ -167,11 +182,11 @@ async def get_current_user_info(current_user: Dict = Depends(get_current_user_de
     """
     Get current authenticated user information.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
-        user_doc = db.collection("users").document(user_id).get()
+        user_doc = await db.collection("users").document(user_id).get()
         
         if not user_doc.exists:
             raise HTTPException(
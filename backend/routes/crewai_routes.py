@@ -7,10 +7,20 @@ from typing import Dict, Optional, List
 from datetime import datetime
 from pydantic import BaseModel
 from backend.core.security import get_current_user
-from backend.core.firestore_client import get_firestore
-from backend.agents.booking_agent import book_appointment as agent_book
-from backend.agents.reminder_agent import schedule_reminder as agent_schedule_reminder
-from backend.agents.previsit_agent import process_questionnaire as agent_process_questionnaire
+from backend.core.firestore_client import get_async_firestore
+from backend.core.counters import create_with_counters, created_deltas
+from backend.core.response_cache import ADMIN_ANALYTICS_TAG, appointment_tags, response_cache
+from backend.core.doctor_directory import doctor_directory
+from backend.core.reminder_scheduler import reminder_scheduler, reminder_time
+from backend.core.agent_runs import run_agent
+from backend.core.email_outbox import OUTBOX_COLLECTION, email_outbox, outbox_message, with_outbox
+from backend.core.occupancy import DAY_SLOTS, SlotUnavailableError, booked_times, get_day_bitmaps, book_slot
+from backend.agents.booking_agent import abook_appointment as agent_book
+from backend.agents.reminder_agent import aschedule_reminder as agent_schedule_reminder
+from backend.agents.previsit_agent import (
+    aprocess_questionnaire as agent_process_questionnaire, placeholder_questionnaire,
+    has_clinical_content, summary_is_current, _create_simple_summary
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,7 +55,7 @@ async def automatic_booking_with_crewai(
     Automatic appointment booking using CrewAI agents.
     Books appointment, schedules reminders, and sends questionnaires automatically.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
 
     try:
@@ -56,35 +66,27 @@ async def automatic_booking_with_crewai(
                 detail="Cannot book appointments for other users"
             )
 
-        # Get available slots - Query users collection for doctors
-        users_ref = db.collection("users")
-        doctors_query = users_ref.where("role", "==", "doctor")
+        # Get available doctors from the in-memory directory
+        await doctor_directory.ensure_fresh(db)
         
         # Filter by specialty if provided
         if request.preferred_specialty:
-            doctors_query = doctors_query.where("specialty", "==", request.preferred_specialty)
+            doctors = doctor_directory.by_specialty(request.preferred_specialty)[:10]
+        else:
+            doctors = doctor_directory.all()[:10]
         
-        doctors_query = doctors_query.limit(10).stream()
+        # If no doctors found for specialty, get any doctor
+        if not doctors and request.preferred_specialty:
+            doctors = doctor_directory.all()[:5]
         
-        doctors_list = []
-        for doctor in doctors_query:
-            doctor_data = doctor.to_dict()
-            doctors_list.append({
-                "id": doctor.id,
+        doctors_list = [
+            {
+                "id": doctor_id,
                 "name": doctor_data.get("full_name", "Dr. Unknown"),
                 "specialty": doctor_data.get("specialty", "General")
-            })
-        
-        # If no doctors found for specialty, get any doctor
-        if not doctors_list and request.preferred_specialty:
-            doctors_query = users_ref.where("role", "==", "doctor").limit(5).stream()
-            for doctor in doctors_query:
-                doctor_data = doctor.to_dict()
-                doctors_list.append({
-                    "id": doctor.id,
-                    "name": doctor_data.get("full_name", "Dr. Unknown"),
-                    "specialty": doctor_data.get("specialty", "General")
-                })
+            }
+            for doctor_id, doctor_data in doctors
+        ]
         
         # If still no doctors, use default
         if not doctors_list:
@@ -109,31 +111,13 @@ async def automatic_booking_with_crewai(
         next_date = datetime.utcnow() + timedelta(days=1)
         appointment_date = request.preferred_date or next_date.strftime("%Y-%m-%d")
         
-        # Get actual available slots for this doctor and date
-        appointments_ref = db.collection("appointments")
-        existing_appointments = appointments_ref.where("date", "==", appointment_date).where("status", "==", "confirmed").stream()
-        
-        booked_times = set()
-        for apt in existing_appointments:
-            apt_data = apt.to_dict()
-            if apt_data.get("doctor_id") == doctor_id:
-                booked_times.add(apt_data.get("time", ""))
+        # Get actual available slots for this doctor and date (single occupancy read)
+        bitmaps = await get_day_bitmaps(db, [doctor_id], appointment_date)
+        booked = booked_times(bitmaps.get(doctor_id, 0))
         
         # Generate available time slots (9am-5pm, 30min intervals)
         from datetime import datetime as dt
-        all_times = []
-        start_hour = 9
-        end_hour = 17
-        for hour in range(start_hour, end_hour + 1):
-            for minute in [0, 30]:
-                if hour == end_hour and minute == 30:
-                    break
-                time_str = f"{hour}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
-                if hour > 12:
-                    time_str = f"{hour-12}:{minute:02d} PM"
-                elif hour == 12:
-                    time_str = f"12:{minute:02d} PM"
-                all_times.append(time_str)
+        all_times = list(DAY_SLOTS)
         
         # Filter past times if date is today
         try:
@@ -160,7 +144,7 @@ async def automatic_booking_with_crewai(
             pass
         
         # Get available slots (not booked)
-        available_times = [t for t in all_times if t not in booked_times]
+        available_times = [t for t in all_times if t not in booked]
         
         if not available_times:
             # If no slots available, try next day
@@ -191,7 +175,7 @@ async def automatic_booking_with_crewai(
         
         # Trigger Booking Agent
         logger.info("Triggering Booking Agent for automatic booking")
-        booking_result = agent_book(appointment_data)
+        booking_result = await agent_book(appointment_data)
         
         # Extract agent explanation from result
         agent_explanation = booking_result.get("result", "Agent processed the booking request")
@@ -218,44 +202,61 @@ async def automatic_booking_with_crewai(
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
             "automatic": True,  # Mark as automatic
+            "has_questionnaire": False,  # Set when the questionnaire document is created
         }
 
         appointments_ref = db.collection("appointments")
         appointment_ref = appointments_ref.document()
         appointment_id = appointment_ref.id
-        appointment_ref.set(appointment_doc)
+        if request.auto_send_questionnaire:
+            # Written to questionnaires only when the patient opens it
+            appointment_doc["questionnaire_placeholder"] = placeholder_questionnaire(
+                appointment_id, request.patient_id, request.reason
+            )
+
+        # Claim the slot atomically; without a preferred time, fall back to the next free slot
+        candidate_times = [appointment_time]
+        if not request.preferred_time:
+            candidate_times += [t for t in available_times if t != appointment_time]
+        # The confirmation email is queued in the booking transaction
+        outbox_ref = db.collection(OUTBOX_COLLECTION).document()
+        for candidate_time in candidate_times:
+            appointment_doc["time"] = candidate_time
+            confirmation = outbox_message("appointment_confirmation", request.patient_id, {
+                "patient_name": request.patient_name,
+                "doctor_name": doctor_name,
+                "appointment_date": appointment_date,
+                "appointment_time": candidate_time,
+                "specialty": specialty,
+                "reason": request.reason,
+                "questionnaire_required": True
+            })
+            try:
+                await db.run_transaction(
+                    with_outbox(book_slot), outbox_ref.sync, confirmation,
+                    db.sync, appointment_ref.sync, appointment_doc
+                )
+                appointment_time = candidate_time
+                break
+            except SlotUnavailableError:
+                continue
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="No available time slot could be booked"
+            )
 
         logger.info(f"Automatic appointment booked: {appointment_id}")
 
-        # Send confirmation email immediately after booking
-        try:
-            from backend.core.email_service import send_appointment_confirmation
-            # Get patient email
-            patient_doc = db.collection("users").document(request.patient_id).get()
-            if patient_doc.exists:
-                patient_data = patient_doc.to_dict()
-                patient_email = patient_data.get("email", "")
-                if patient_email:
-                    send_appointment_confirmation(
-                        patient_email=patient_email,
-                        patient_name=request.patient_name,
-                        doctor_name=doctor_name,
-                        appointment_date=appointment_date,
-                        appointment_time=appointment_time,
-                        specialty=specialty,
-                        reason=request.reason,
-                        questionnaire_required=True
-                    )
-                    logger.info(f"Automatic booking confirmation email sent to {patient_email} (with Gemini-generated content)")
-        except Exception as e:
-            logger.error(f"Failed to send automatic booking confirmation email: {str(e)}")
+        email_outbox.notify()
+        await response_cache.invalidate(*appointment_tags(request.patient_id, doctor_id))
 
         # Schedule reminder if requested
         reminder_scheduled = False
         if request.auto_schedule_reminders:
             try:
                 logger.info("Triggering Reminder Agent for automatic reminder")
-                reminder_result = agent_schedule_reminder(
+                reminder_result = await agent_schedule_reminder(
                     appointment_id=appointment_id,
                     patient_name=request.patient_name,
                     doctor_name=doctor_name,
@@ -266,19 +267,7 @@ async def automatic_booking_with_crewai(
                 )
 
                 # Compute scheduled_at = appointment_datetime - 24 hours
-                from datetime import datetime as dt, timezone, timedelta
-                try:
-                    hh_mm, am_pm = appointment_time.split(" ")
-                    hour, minute = [int(x) for x in hh_mm.split(":")]
-                    if am_pm.upper() == "PM" and hour != 12:
-                        hour += 12
-                    if am_pm.upper() == "AM" and hour == 12:
-                        hour = 0
-                    appt_dt_naive = dt.strptime(appointment_date, "%Y-%m-%d").replace(hour=hour, minute=minute)
-                    appt_dt = appt_dt_naive.replace(tzinfo=timezone.utc)
-                    scheduled_at = appt_dt - timedelta(hours=24)
-                except Exception:
-                    scheduled_at = dt.now(timezone.utc)
+                scheduled_at = reminder_time(appointment_date, appointment_time, 24)
 
                 # Save reminder to Firestore
                 reminder_doc = {
@@ -296,62 +285,24 @@ async def automatic_booking_with_crewai(
                 }
 
                 reminders_ref = db.collection("reminders")
-                reminders_ref.document().set(reminder_doc)
+                reminder_ref = reminders_ref.document()
+                await create_with_counters(db, reminder_ref, reminder_doc, created_deltas("reminders", reminder_doc["status"]))
+                await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
                 reminder_scheduled = True
                 
                 # Do not send immediately; background scheduler will send at scheduled_at
+                reminder_scheduler.schedule(reminder_ref.id, scheduled_at)
+                reminder_scheduler.prerender(reminder_ref.id)
                 
                 logger.info("Automatic reminder scheduled")
             except Exception as e:
                 logger.error(f"Failed to schedule automatic reminder: {str(e)}")
 
-        # Send questionnaire if requested
-        questionnaire_sent = False
-        if request.auto_send_questionnaire:
-            try:
-                logger.info("Triggering Pre-Visit Agent for automatic questionnaire")
-                
-                # Create basic questionnaire data
-                questionnaire_data = {
-                    "appointment_id": appointment_id,
-                    "patient_id": request.patient_id,
-                    "chief_complaint": request.reason or "Automatic questionnaire - Please fill out",
-                    "symptoms": "",
-                    "medical_history": "",
-                    "current_medications": "",
-                    "allergies": "",
-                    "additional_notes": "This questionnaire was automatically generated. Please update with your details.",
-                }
-
-                questionnaire_result = agent_process_questionnaire(
-                    questionnaire_data, appointment_id
-                )
-
-                # Save questionnaire to Firestore
-                questionnaires_ref = db.collection("questionnaires")
-                questionnaire_ref = questionnaires_ref.document()
-                questionnaire_id = questionnaire_ref.id
-
-                # Get summary from agent result
-                summary = questionnaire_result.get("summary", "")
-                if not summary:
-                    # Generate summary using Gemini if available
-                    from backend.agents.previsit_agent import summarize_questionnaire
-                    summary = summarize_questionnaire(questionnaire_data)
-
-                questionnaire_doc = {
-                    **questionnaire_data,
-                    "submitted_at": datetime.utcnow(),
-                    "summary": summary,
-                    "automatic": True,
-                }
-
-                questionnaire_ref.set(questionnaire_doc)
-                questionnaire_sent = True
-                questionnaire_result["summary"] = summary  # Store for response
-                logger.info(f"Automatic questionnaire created with summary: {summary[:50]}...")
-            except Exception as e:
-                logger.error(f"Failed to create automatic questionnaire: {str(e)}")
+        # Send questionnaire if requested: the placeholder was stored with the
+        # appointment, and there is nothing to summarize until the patient answers
+        questionnaire_sent = request.auto_send_questionnaire
+        if questionnaire_sent:
+            logger.info("Automatic questionnaire sent with the booking")
 
         # Prepare agent explanation with slot analysis
         slots_analyzed = ", ".join([f"{s['date']} {s['time']}" for s in available_slots_info[:3]])
@@ -361,37 +312,20 @@ async def automatic_booking_with_crewai(
             f"This was chosen as the optimal slot based on doctor availability, specialty match, and your preferences."
         )
         
-        # Prepare questionnaire questions if sent - fetch actual data
+        # Prepare questionnaire questions if sent
         questionnaire_questions = []
         questionnaire_summary = None
         if questionnaire_sent:
-            # Fetch the actual questionnaire data from Firestore
-            try:
-                questionnaires_ref = db.collection("questionnaires")
-                questionnaire_query = questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).stream()
-                
-                for doc in questionnaire_query:
-                    q_data = doc.to_dict()
-                    questionnaire_questions = [
-                        {"question": "Chief Complaint", "answer": q_data.get("chief_complaint", "Not provided")},
-                        {"question": "Symptoms", "answer": q_data.get("symptoms", "Not provided")},
-                        {"question": "Medical History", "answer": q_data.get("medical_history", "Not provided")},
-                        {"question": "Current Medications", "answer": q_data.get("current_medications", "Not provided")},
-                        {"question": "Allergies", "answer": q_data.get("allergies", "Not provided")},
-                        {"question": "Additional Notes", "answer": q_data.get("additional_notes", "None")},
-                    ]
-                    questionnaire_summary = q_data.get("summary", "")
-                    break
-            except Exception as e:
-                logger.error(f"Failed to fetch questionnaire data: {str(e)}")
-                # Fallback to basic data
-                questionnaire_questions = [
-                    {"question": "Chief Complaint", "answer": request.reason or "Not provided"},
-                    {"question": "Symptoms", "answer": "Not provided"},
-                    {"question": "Medical History", "answer": "Not provided"},
-                    {"question": "Current Medications", "answer": "Not provided"},
-                    {"question": "Allergies", "answer": "Not provided"},
-                ]
+            q_data = appointment_doc["questionnaire_placeholder"]
+            questionnaire_questions = [
+                {"question": "Chief Complaint", "answer": q_data.get("chief_complaint") or "Not provided"},
+                {"question": "Symptoms", "answer": q_data.get("symptoms") or "Not provided"},
+                {"question": "Medical History", "answer": q_data.get("medical_history") or "Not provided"},
+                {"question": "Current Medications", "answer": q_data.get("current_medications") or "Not provided"},
+                {"question": "Allergies", "answer": q_data.get("allergies") or "Not provided"},
+                {"question": "Additional Notes", "answer": q_data.get("additional_notes") or "None"},
+            ]
+            questionnaire_summary = _create_simple_summary(q_data)
 
         return {
             "success": True,
@@ -416,7 +350,7 @@ async def automatic_booking_with_crewai(
                 "reminder_scheduled": reminder_scheduled,
                 "questionnaire_data": {
                     "questions": questionnaire_questions,
-                    "summary": questionnaire_summary or questionnaire_result.get("summary") if questionnaire_sent else None
+                    "summary": questionnaire_summary
                 } if questionnaire_sent else None
             },
             "message": "Automatic booking completed successfully with CrewAI agents",
@@ -440,13 +374,13 @@ async def trigger_agents_for_appointment(
     """
     Trigger CrewAI agents for an existing appointment.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
 
     try:
         # Get appointment
         appointment_ref = db.collection("appointments").document(request.appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
 
         if not appointment_doc.exists:
             raise HTTPException(
@@ -470,17 +404,6 @@ async def trigger_agents_for_appointment(
         # Trigger reminder agent if requested
         if "reminder" in request.operations:
             try:
-                reminder_result = agent_schedule_reminder(
-                    appointment_id=request.appointment_id,
-                    patient_name=appointment_data.get("patient_name", ""),
-                    doctor_name=appointment_data.get("doctor_name", ""),
-                    appointment_date=appointment_data.get("date", ""),
-                    appointment_time=appointment_data.get("time", ""),
-                    reminder_type="sms",
-                    hours_before=24
-                )
-                agent_results["reminder"] = reminder_result
-
                 # Save reminder
                 reminder_doc = {
                     "appointment_id": request.appointment_id,
@@ -496,7 +419,25 @@ async def trigger_agents_for_appointment(
                     "automatic": True,
                 }
 
-                db.collection("reminders").document().set(reminder_doc)
+                reminder_ref = db.collection("reminders").document()
+                await create_with_counters(db, reminder_ref, reminder_doc, created_deltas("reminders", reminder_doc["status"]))
+                await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
+                reminder_scheduler.schedule(reminder_ref.id, reminder_doc["scheduled_at"])
+                reminder_scheduler.prerender(reminder_ref.id)
+
+                agent_results["reminder"] = await run_agent(
+                    "schedule_reminder",
+                    lambda: agent_schedule_reminder(
+                        appointment_id=request.appointment_id,
+                        patient_name=appointment_data.get("patient_name", ""),
+                        doctor_name=appointment_data.get("doctor_name", ""),
+                        appointment_date=appointment_data.get("date", ""),
+                        appointment_time=appointment_data.get("time", ""),
+                        reminder_type="sms",
+                        hours_before=24
+                    ),
+                    user_id, request.appointment_id
+                )
             except Exception as e:
                 logger.error(f"Failed to trigger reminder agent: {str(e)}")
                 agent_results["reminder"] = {"error": str(e)}
@@ -504,35 +445,45 @@ async def trigger_agents_for_appointment(
         # Trigger questionnaire agent if requested
         if "questionnaire" in request.operations:
             try:
-                questionnaire_data = {
-                    "appointment_id": request.appointment_id,
-                    "patient_id": appointment_data.get("patient_id", ""),
-                    "chief_complaint": "",
-                    "symptoms": "",
-                    "medical_history": "",
-                    "current_medications": "",
-                    "allergies": "",
-                    "additional_notes": "",
-                }
-
-                questionnaire_result = agent_process_questionnaire(
-                    questionnaire_data, request.appointment_id
-                )
-                agent_results["questionnaire"] = questionnaire_result
-
-                # Save questionnaire
                 questionnaires_ref = db.collection("questionnaires")
-                questionnaire_ref = questionnaires_ref.document()
-                questionnaire_id = questionnaire_ref.id
-
-                questionnaire_doc = {
-                    **questionnaire_data,
-                    "submitted_at": datetime.utcnow(),
-                    "summary": questionnaire_result.get("summary", ""),
-                    "automatic": True,
-                }
+                existing_query = await questionnaires_ref.where("appointment_id", "==", request.appointment_id).limit(1).get()
+                questionnaire_ref = None
+                questionnaire_doc = None
+                for doc in existing_query:
+                    questionnaire_ref = questionnaires_ref.document(doc.id)
+                    questionnaire_doc = doc.to_dict()
+                    break
 
-                questionnaire_ref.set(questionnaire_doc)
+                if questionnaire_doc is None:
+                    # Written to questionnaires only when the patient opens it
+                    await appointment_ref.update({
+                        "questionnaire_placeholder": placeholder_questionnaire(
+                            request.appointment_id, appointment_data.get("patient_id", "")
+                        )
+                    })
+                    agent_results["questionnaire"] = {
+                        "status": "skipped",
+                        "message": "Questionnaire sent; nothing to summarize until the patient answers",
+                    }
+                elif not has_clinical_content(questionnaire_doc) or summary_is_current(questionnaire_doc):
+                    agent_results["questionnaire"] = {
+                        "status": "skipped",
+                        "message": "Questionnaire summary is up to date",
+                        "summary": questionnaire_doc.get("summary"),
+                    }
+                else:
+                    async def store_summary(questionnaire_result: Dict):
+                        if questionnaire_result.get("summary"):
+                            await questionnaire_ref.update({
+                                "summary": questionnaire_result["summary"],
+                                "summary_hash": questionnaire_result.get("summary_hash"),
+                            })
+
+                    agent_results["questionnaire"] = await run_agent(
+                        "process_questionnaire",
+                        lambda: agent_process_questionnaire(questionnaire_doc, request.appointment_id),
+                        user_id, request.appointment_id, on_complete=store_summary
+                    )
             except Exception as e:
                 logger.error(f"Failed to trigger questionnaire agent: {str(e)}")
                 agent_results["questionnaire"] = {"error": str(e)}
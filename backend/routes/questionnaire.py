@@ -2,21 +2,46 @@
 Questionnaire routes for pre-visit questionnaires.
 """
 
+import json
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Dict, Optional
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from datetime import datetime
 from backend.models.questionnaire_model import (
     QuestionnaireSubmit, QuestionnaireResponse
 )
 from backend.core.security import get_current_user
-from backend.core.firestore_client import get_firestore
-from backend.agents.previsit_agent import process_questionnaire as agent_process
+from backend.core.firestore_client import get_async_firestore
+from backend.core.counters import created_deltas, stage_counters
+from backend.core.response_cache import appointment_tags, response_cache
+from backend.core.agent_runs import run_agent
+from backend.core.stream_hub import StreamHub
+from backend.agents.previsit_agent import (
+    aprocess_questionnaire as agent_process, astream_questionnaire_summary, questionnaire_hash,
+    has_clinical_content, summary_is_current, EMPTY_SUMMARY
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/questionnaire", tags=["Questionnaires"])
 
+# In-flight streamed summaries, shared by everyone viewing the same questionnaire
+summary_streams = StreamHub()
+
+
+async def _create_questionnaire(db, questionnaire_ref, questionnaire_doc: Dict, appointment_ref, appointment_data: Dict):
+    """Create a questionnaire, flag its appointment and count it in one batched write."""
+    batch = db.batch()
+    batch.set(questionnaire_ref, questionnaire_doc)
+    batch.update(appointment_ref, {"has_questionnaire": True})
+    stage_counters(batch, db, created_deltas("questionnaires"))
+    await batch.commit()
+    # Dashboards count questionnaires and pending reviews
+    await response_cache.invalidate(
+        *appointment_tags(appointment_data.get("patient_id"), appointment_data.get("doctor_id"))
+    )
+
 
 def _questionnaire_doc_to_response(doc_id: str, doc_data: dict) -> QuestionnaireResponse:
     """Convert Firestore document to QuestionnaireResponse."""
@@ -43,14 +68,14 @@ async def get_questionnaire(
     """
     Get questionnaire for a specific appointment.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
     try:
         # Check appointment exists and user has access
         appointment_ref = db.collection("appointments").document(appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -69,7 +94,7 @@ async def get_questionnaire(
         
         # Get questionnaire
         questionnaires_ref = db.collection("questionnaires")
-        questionnaire_query = questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).stream()
+        questionnaire_query = await questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).get()
         
         questionnaire_doc = None
         questionnaire_id = None
@@ -79,6 +104,18 @@ async def get_questionnaire(
             questionnaire_id = doc.id
             break
         
+        placeholder = appointment_data.get("questionnaire_placeholder")
+        if not questionnaire_doc and placeholder and appointment_data["patient_id"] == user_id:
+            # First time the patient opens an automatically sent questionnaire
+            questionnaire_id = appointment_id
+            questionnaire_doc = {
+                **placeholder, "submitted_at": None, "summary": None, "automatic": True, "placeholder": True
+            }
+            await _create_questionnaire(
+                db, questionnaires_ref.document(questionnaire_id), questionnaire_doc, appointment_ref, appointment_data
+            )
+            logger.info(f"Placeholder questionnaire materialized: {questionnaire_id}")
+        
         if not questionnaire_doc:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -106,14 +143,14 @@ async def submit_questionnaire(
     Submit a pre-visit questionnaire.
     Triggers pre-visit agent for processing and summarization.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
     try:
         # Check appointment exists and user has access
         appointment_ref = db.collection("appointments").document(questionnaire.appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -132,41 +169,70 @@ async def submit_questionnaire(
         
         # Check if questionnaire already exists
         questionnaires_ref = db.collection("questionnaires")
-        existing_query = questionnaires_ref.where("appointment_id", "==", questionnaire.appointment_id).limit(1).stream()
+        existing_query = await questionnaires_ref.where("appointment_id", "==", questionnaire.appointment_id).limit(1).get()
         
         questionnaire_id = None
+        existing_data = {}
         for doc in existing_query:
             questionnaire_id = doc.id
+            existing_data = doc.to_dict()
             break
         
         # Prepare questionnaire data
         questionnaire_dict = questionnaire.dict()
         questionnaire_dict["patient_id"] = user_id
         questionnaire_dict["submitted_at"] = datetime.utcnow()
-        
-        # Trigger pre-visit agent for processing
-        agent_result = agent_process(questionnaire_dict, questionnaire.appointment_id)
-        logger.info(f"Pre-visit agent result: {agent_result}")
-        
-        # Add summary from agent result
-        if agent_result.get("summary"):
-            questionnaire_dict["summary"] = agent_result["summary"]
+        summary_hash = questionnaire_hash(questionnaire_dict)
+        if existing_data.get("summary") and existing_data.get("summary_hash") == summary_hash:
+            # Answers unchanged since the last summary: keep it
+            stored_dict = {**questionnaire_dict, "placeholder": False}
+            needs_summary = False
+        elif not has_clinical_content(questionnaire_dict):
+            # Nothing to summarize
+            stored_dict = {**questionnaire_dict, "summary": None, "summary_hash": summary_hash, "placeholder": False}
+            needs_summary = False
+        else:
+            # The summary is filled in by the pre-visit agent below
+            stored_dict = {**questionnaire_dict, "summary": None, "summary_hash": None, "placeholder": False}
+            needs_summary = True
         
         # Save to Firestore
         if questionnaire_id:
             # Update existing questionnaire
-            questionnaires_ref.document(questionnaire_id).update(questionnaire_dict)
+            await questionnaires_ref.document(questionnaire_id).update(stored_dict)
             logger.info(f"Questionnaire updated: {questionnaire_id}")
         else:
             # Create new questionnaire
             questionnaire_ref = questionnaires_ref.document()
             questionnaire_id = questionnaire_ref.id
-            questionnaire_ref.set(questionnaire_dict)
+            await _create_questionnaire(db, questionnaire_ref, stored_dict, appointment_ref, appointment_data)
             logger.info(f"Questionnaire created: {questionnaire_id}")
         
+        async def store_summary(agent_result: Dict):
+            # Add summary from agent result
+            if agent_result.get("summary"):
+                await questionnaires_ref.document(questionnaire_id).update({
+                    "summary": agent_result["summary"],
+                    "summary_hash": agent_result.get("summary_hash"),
+                })
+        
+        agent_result = {}
+        if needs_summary:
+            # Trigger pre-visit agent for processing
+            agent_result = await run_agent(
+                "process_questionnaire",
+                lambda: agent_process(questionnaire_dict, questionnaire.appointment_id),
+                user_id, questionnaire.appointment_id, on_complete=store_summary
+            )
+            logger.info(f"Pre-visit agent result: {agent_result}")
+        else:
+            logger.info(f"Questionnaire {questionnaire_id} summary is up to date; pre-visit agent skipped")
+        
         # Return questionnaire response
-        saved_doc = questionnaires_ref.document(questionnaire_id).get()
-        return _questionnaire_doc_to_response(questionnaire_id, saved_doc.to_dict())
+        saved_doc = await questionnaires_ref.document(questionnaire_id).get()
+        response = _questionnaire_doc_to_response(questionnaire_id, saved_doc.to_dict())
+        response.agent_run_id = agent_result.get("agent_run_id")
+        return response
         
     except HTTPException:
         raise
@@ -178,6 +244,44 @@ async def submit_questionnaire(
         )
 
 
+async def _get_questionnaire_for_summary(db, appointment_id: str, current_user: Dict) -> Tuple[str, Dict]:
+    """Load an appointment's questionnaire for its summary, checking the viewer may see it."""
+    user_id = current_user["user_id"]
+    user_role = current_user["role"]
+    
+    # Check appointment exists
+    appointment_ref = db.collection("appointments").document(appointment_id)
+    appointment_doc = await appointment_ref.get()
+    
+    if not appointment_doc.exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Appointment not found"
+        )
+    
+    appointment_data = appointment_doc.to_dict()
+    
+    # Check permissions (doctors and admins can view summaries)
+    if (user_role == "patient" and appointment_data["patient_id"] != user_id):
+        if user_role not in ["doctor", "admin"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to view this summary"
+            )
+    
+    # Get questionnaire
+    questionnaires_ref = db.collection("questionnaires")
+    questionnaire_query = await questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).get()
+    
+    for doc in questionnaire_query:
+        return doc.id, doc.to_dict()
+    
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Questionnaire not found for this appointment"
+    )
+
+
 @router.get("/appointment/{appointment_id}/summary")
 async def get_questionnaire_summary(
     appointment_id: str,
@@ -186,58 +290,26 @@ async def get_questionnaire_summary(
     """
     Get AI-generated summary of a questionnaire.
     """
-    db = get_firestore()
-    user_id = current_user["user_id"]
-    user_role = current_user["role"]
+    db = get_async_firestore()
     
     try:
-        # Check appointment exists
-        appointment_ref = db.collection("appointments").document(appointment_id)
-        appointment_doc = appointment_ref.get()
-        
-        if not appointment_doc.exists:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Appointment not found"
-            )
-        
-        appointment_data = appointment_doc.to_dict()
-        
-        # Check permissions (doctors and admins can view summaries)
-        if (user_role == "patient" and appointment_data["patient_id"] != user_id):
-            if user_role not in ["doctor", "admin"]:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Not authorized to view this summary"
-                )
-        
-        # Get questionnaire
+        questionnaire_id, questionnaire_doc = await _get_questionnaire_for_summary(db, appointment_id, current_user)
         questionnaires_ref = db.collection("questionnaires")
-        questionnaire_query = questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).stream()
-        
-        questionnaire_doc = None
-        for doc in questionnaire_query:
-            questionnaire_doc = doc.to_dict()
-            break
-        
-        if not questionnaire_doc:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Questionnaire not found for this appointment"
-            )
         
         summary = questionnaire_doc.get("summary")
         
-        if not summary:
+        if not has_clinical_content(questionnaire_doc):
+            summary = EMPTY_SUMMARY
+        elif not summary_is_current(questionnaire_doc):
             # Generate summary on the fly
-            agent_result = agent_process(questionnaire_doc, appointment_id)
-            summary = agent_result.get("summary", "No summary available")
+            agent_result = await agent_process(questionnaire_doc, appointment_id)
+            summary = agent_result.get("summary", EMPTY_SUMMARY)
             
             # Save the generated summary
-            doc_ref = questionnaires_ref.where("appointment_id", "==", appointment_id).limit(1).stream()
-            for doc in doc_ref:
-                doc.reference.update({"summary": summary})
-                break
+            await questionnaires_ref.document(questionnaire_id).update({
+                "summary": summary,
+                "summary_hash": agent_result.get("summary_hash"),
+            })
         
         return {
             "appointment_id": appointment_id,
@@ -254,3 +326,76 @@ async def get_questionnaire_summary(
             detail="Failed to fetch questionnaire summary"
         )
 
+
+def _sse(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event; data is JSON so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/appointment/{appointment_id}/summary/stream")
+async def stream_questionnaire_summary(
+    appointment_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Stream the AI-generated summary of a questionnaire as Server-Sent Events.
+    
+    Events: "token" ({"text": ...}) for each chunk as Gemini writes it, then
+    "done" ({"summary": ...}) or "error" ({"detail": ...}). A stored summary
+    that is still current arrives as a single token. Viewers of the same
+    questionnaire share one generation, which is saved once it completes.
+    """
+    db = get_async_firestore()
+    
+    try:
+        questionnaire_id, questionnaire_doc = await _get_questionnaire_for_summary(db, appointment_id, current_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching questionnaire summary: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch questionnaire summary"
+        )
+    
+    if not has_clinical_content(questionnaire_doc):
+        chunks, subscription = [EMPTY_SUMMARY], None
+    elif summary_is_current(questionnaire_doc):
+        chunks, subscription = [questionnaire_doc["summary"]], None
+    else:
+        summary_hash = questionnaire_hash(questionnaire_doc)
+        
+        async def store_summary(summary: str):
+            await db.collection("questionnaires").document(questionnaire_id).update({
+                "summary": summary,
+                "summary_hash": summary_hash,
+            })
+            logger.info(f"Streamed summary saved for questionnaire {questionnaire_id}")
+        
+        chunks = None
+        subscription = summary_streams.subscribe(
+            f"{questionnaire_id}:{summary_hash}",
+            lambda: astream_questionnaire_summary(questionnaire_doc),
+            store_summary
+        )
+    
+    async def events() -> AsyncIterator[str]:
+        parts = []
+        async for chunk in (subscription if subscription is not None else _iterate(chunks)):
+            parts.append(chunk)
+            yield _sse("token", {"text": chunk})
+        if subscription is not None and subscription.error:
+            yield _sse("error", {"detail": "Summary generation failed; please retry"})
+        else:
+            yield _sse("done", {"appointment_id": appointment_id, "summary": "".join(parts)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _iterate(chunks: List[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
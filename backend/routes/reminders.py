@@ -7,10 +7,14 @@ from typing import List, Dict, Optional
 from datetime import datetime
 from pydantic import BaseModel
 from backend.core.security import get_current_user
-from backend.core.firestore_client import get_firestore
+from backend.core.firestore_client import get_async_firestore
+from backend.core.counters import create_with_counters, created_deltas
+from backend.core.response_cache import ADMIN_ANALYTICS_TAG, response_cache
+from backend.core.reminder_scheduler import reminder_scheduler, reminder_time
+from backend.core.agent_runs import run_agent
 from backend.agents.reminder_agent import (
-    schedule_reminder as agent_schedule,
-    send_immediate_reminder as agent_send_immediate
+    aschedule_reminder as agent_schedule,
+    asend_immediate_reminder as agent_send_immediate
 )
 import logging
 
@@ -35,13 +39,13 @@ async def schedule_reminder(
     Schedule a reminder for an appointment.
     Triggers reminder agent and stores reminder in Firestore.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
         # Get appointment
         appointment_ref = db.collection("appointments").document(request.appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -58,7 +62,7 @@ async def schedule_reminder(
         
         if patient_id:
             try:
-                patient_doc = db.collection("users").document(patient_id).get()
+                patient_doc = await db.collection("users").document(patient_id).get()
                 if patient_doc.exists:
                     patient_data = patient_doc.to_dict()
                     patient_email = patient_data.get("email", "")
@@ -79,41 +83,10 @@ async def schedule_reminder(
         if reminder_type not in ["sms", "email"]:
             reminder_type = "sms"
         
-        # Trigger reminder agent
-        agent_result = agent_schedule(
-            appointment_id=request.appointment_id,
-            patient_name=appointment_data.get("patient_name", ""),
-            doctor_name=appointment_data.get("doctor_name", ""),
-            appointment_date=appointment_data.get("date", ""),
-            appointment_time=appointment_data.get("time", ""),
-            reminder_type=reminder_type,
-            hours_before=request.hours_before
-        )
-        
-        logger.info(f"Reminder agent result: {agent_result}")
-        
         # Compute scheduled_at = appointment_datetime - hours_before
-        try:
-            from datetime import datetime as dt, timezone, timedelta
-            appt_date_str = appointment_data.get("date", "")  # YYYY-MM-DD
-            appt_time_str = appointment_data.get("time", "")  # e.g., "10:00 AM"
-            # Parse time
-            time_parts = appt_time_str.strip().split(" ")
-            hh_mm = time_parts[0]
-            am_pm = (time_parts[1] if len(time_parts) > 1 else "AM").upper()
-            hour, minute = [int(x) for x in hh_mm.split(":")]
-            if am_pm == "PM" and hour != 12:
-                hour += 12
-            if am_pm == "AM" and hour == 12:
-                hour = 0
-            appt_dt_naive = dt.strptime(appt_date_str, "%Y-%m-%d").replace(hour=hour, minute=minute)
-            # Treat as UTC for simplicity in local dev
-            appt_dt = appt_dt_naive.replace(tzinfo=timezone.utc)
-            scheduled_at = appt_dt - timedelta(hours=request.hours_before)
-        except Exception:
-            # Fallback: schedule immediately
-            from datetime import datetime as dt, timezone
-            scheduled_at = dt.now(timezone.utc)
+        scheduled_at = reminder_time(
+            appointment_data.get("date", ""), appointment_data.get("time", ""), request.hours_before
+        )
 
         # Store reminder in Firestore
         reminder_doc = {
@@ -132,34 +105,32 @@ async def schedule_reminder(
         reminders_ref = db.collection("reminders")
         reminder_ref = reminders_ref.document()
         reminder_id = reminder_ref.id
-        reminder_ref.set(reminder_doc)
+        await create_with_counters(db, reminder_ref, reminder_doc, created_deltas("reminders", reminder_doc["status"]))
+        await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
         
         logger.info(f"Reminder scheduled: {reminder_id}")
         
-        # Send immediately only if scheduled time has already passed
-        try:
-            from backend.core.email_service import send_appointment_reminder
-            from datetime import datetime as dt, timezone
-            now_utc = dt.now(timezone.utc)
-            if patient_email and scheduled_at <= now_utc:
-                # Small delay to ensure confirmation email is delivered first
-                try:
-                    import asyncio
-                    await asyncio.sleep(2)
-                except Exception:
-                    pass
-                send_appointment_reminder(
-                    patient_email=patient_email,
-                    patient_name=appointment_data.get("patient_name", ""),
-                    doctor_name=appointment_data.get("doctor_name", ""),
-                    appointment_date=appointment_data.get("date", ""),
-                    appointment_time=appointment_data.get("time", ""),
-                    specialty=appointment_data.get("specialty", "General"),
-                    reason=appointment_data.get("reason")
-                )
-                logger.info(f"Reminder email sent immediately to {patient_email} for appointment on {appointment_data.get('date')} (with Gemini-generated content)")
-        except Exception as e:
-            logger.error(f"Failed to send reminder email: {str(e)}")
+        # Hand the reminder to the scheduler; one whose time has already
+        # passed is sent within a second
+        reminder_scheduler.schedule(reminder_id, scheduled_at)
+        reminder_scheduler.prerender(reminder_id)
+        
+        # Trigger reminder agent
+        agent_result = await run_agent(
+            "schedule_reminder",
+            lambda: agent_schedule(
+                appointment_id=request.appointment_id,
+                patient_name=appointment_data.get("patient_name", ""),
+                doctor_name=appointment_data.get("doctor_name", ""),
+                appointment_date=appointment_data.get("date", ""),
+                appointment_time=appointment_data.get("time", ""),
+                reminder_type=reminder_type,
+                hours_before=request.hours_before
+            ),
+            user_id, request.appointment_id
+        )
+        
+        logger.info(f"Reminder agent result: {agent_result}")
         
         return {
             "message": "Reminder scheduled successfully",
@@ -197,13 +168,13 @@ async def send_immediate_reminder(
     Send an immediate reminder for an appointment.
     Triggers reminder agent and logs the reminder.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     
     try:
         # Get appointment
         appointment_ref = db.collection("appointments").document(appointment_id)
-        appointment_doc = appointment_ref.get()
+        appointment_doc = await appointment_ref.get()
         
         if not appointment_doc.exists:
             raise HTTPException(
@@ -225,18 +196,6 @@ async def send_immediate_reminder(
         if reminder_type not in ["sms", "email"]:
             reminder_type = "sms"
         
-        # Trigger reminder agent
-        agent_result = agent_send_immediate(
-            appointment_id=appointment_id,
-            patient_name=appointment_data.get("patient_name", ""),
-            doctor_name=appointment_data.get("doctor_name", ""),
-            appointment_date=appointment_data.get("date", ""),
-            appointment_time=appointment_data.get("time", ""),
-            reminder_type=reminder_type
-        )
-        
-        logger.info(f"Immediate reminder agent result: {agent_result}")
-        
         # Store reminder log in Firestore
         reminder_doc = {
             "appointment_id": appointment_id,
@@ -254,10 +213,27 @@ async def send_immediate_reminder(
         reminders_ref = db.collection("reminders")
         reminder_ref = reminders_ref.document()
         reminder_id = reminder_ref.id
-        reminder_ref.set(reminder_doc)
+        await create_with_counters(db, reminder_ref, reminder_doc, created_deltas("reminders", reminder_doc["status"]))
+        await response_cache.invalidate(ADMIN_ANALYTICS_TAG)
         
         logger.info(f"Immediate reminder sent: {reminder_id}")
         
+        # Trigger reminder agent
+        agent_result = await run_agent(
+            "send_immediate_reminder",
+            lambda: agent_send_immediate(
+                appointment_id=appointment_id,
+                patient_name=appointment_data.get("patient_name", ""),
+                doctor_name=appointment_data.get("doctor_name", ""),
+                appointment_date=appointment_data.get("date", ""),
+                appointment_time=appointment_data.get("time", ""),
+                reminder_type=reminder_type
+            ),
+            user_id, appointment_id
+        )
+        
+        logger.info(f"Immediate reminder agent result: {agent_result}")
+        
         return {
             "message": "Reminder sent successfully",
             "reminder_id": reminder_id,
@@ -283,7 +259,7 @@ async def get_reminder_logs(
     Get reminder logs.
     Returns all reminders for appointments accessible by the current user.
     """
-    db = get_firestore()
+    db = get_async_firestore()
     user_id = current_user["user_id"]
     user_role = current_user["role"]
     
@@ -305,7 +281,7 @@ async def get_reminder_logs(
                 query = reminders_ref.where("patient_id", "==", user_id)
         
         reminders = []
-        for doc in query.order_by("scheduled_at", direction="DESCENDING").limit(50).stream():
+        for doc in await query.order_by("scheduled_at", direction="DESCENDING").limit(50).get():
             reminder_data = doc.to_dict()
             reminders.append({
                 "id": doc.id,
@@ -0,0 +1,96 @@
+"""
+Backfill email_index/{normalized email} for users registered before the
+index existed. Safe to re-run: users already indexed are skipped, and an
+address claimed by a different user is reported, not overwritten.
+
+Once it reports no missing entries, set EMAIL_INDEX_LEGACY_FALLBACK=false
+so login and registration stop falling back to email queries.
+
+Usage: python backend/scripts/backfill_email_index.py [--page-size N] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+from backend.core.firestore_client import get_firestore, initialize_firebase
+from backend.core.email_index import EMAIL_INDEX_COLLECTION, index_entry, normalize_email
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def backfill(page_size: int = 400, dry_run: bool = False):
+    """Index every user's email address; returns counts of what was found."""
+    initialize_firebase()
+    db = get_firestore()
+    users_ref = db.collection("users")
+    index_ref = db.collection(EMAIL_INDEX_COLLECTION)
+    totals = {"users": 0, "indexed": 0, "already_indexed": 0, "conflicts": 0, "no_email": 0}
+
+    last_doc = None
+    while True:
+        query = users_ref.order_by("__name__")
+        if last_doc is not None:
+            query = query.where("__name__", ">", last_doc.reference)
+        users = list(query.limit(page_size).stream())
+        if not users:
+            break
+
+        # One batched read of this page's index entries
+        emails = {}
+        for user in users:
+            email = (user.to_dict() or {}).get("email")
+            if email:
+                emails.setdefault(normalize_email(email), []).append(user.id)
+            else:
+                totals["no_email"] += 1
+        entries = {
+            snapshot.id: snapshot.to_dict()
+            for snapshot in db.get_all([index_ref.document(email) for email in emails])
+            if snapshot.exists
+        }
+
+        batch = db.batch()
+        for email, user_ids in emails.items():
+            indexed_user = (entries.get(email) or {}).get("user_id")
+            owner = indexed_user or user_ids[0]
+            for user_id in user_ids:
+                if user_id != owner:
+                    logger.warning(f"{email} is claimed by user {owner}; user {user_id} has the same address")
+                    totals["conflicts"] += 1
+                elif indexed_user:
+                    totals["already_indexed"] += 1
+                else:
+                    batch.set(index_ref.document(email), index_entry(user_id))
+                    totals["indexed"] += 1
+        if not dry_run:
+            batch.commit()
+
+        totals["users"] += len(users)
+        last_doc = users[-1]
+        logger.info(f"{totals['users']} users scanned, {totals['indexed']} indexed")
+        if len(users) < page_size:
+            break
+
+    logger.info(
+        f"Email index backfill {'dry run ' if dry_run else ''}complete: {totals['users']} users, "
+        f"{totals['indexed']} {'to index' if dry_run else 'indexed'}, {totals['already_indexed']} already indexed, "
+        f"{totals['conflicts']} conflicts, {totals['no_email']} without email"
+    )
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the email -> user index.")
+    parser.add_argument("--page-size", type=int, default=400, help="Users per batch (at most 500)")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    backfill(min(args.page_size, 500), args.dry_run)
@@ -0,0 +1,66 @@
+"""
+Benchmark: blocking Firestore calls vs. the async Firestore facade.
+Simulates route handlers that each perform one Firestore query against the
+in-memory stand-in with a fixed network latency, and reports throughput and
+tail latency at several concurrency levels.
+
+Usage: python backend/scripts/bench_async_firestore.py [latency_ms]
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+from backend.core.firestore_client import AsyncFirestore
+from backend.core.memory_firestore import MemoryFirestoreClient
+
+CONCURRENCY_LEVELS = [50, 200, 1000]
+
+
+async def _blocking_handler(client: MemoryFirestoreClient):
+    """Handler calling the sync client directly (the old data path)."""
+    list(client.collection("appointments").where("patient_id", "==", "p1").stream())
+
+
+async def _async_handler(db: AsyncFirestore):
+    """Handler using the async facade."""
+    await db.collection("appointments").where("patient_id", "==", "p1").get()
+
+
+async def _run(handler, target, concurrency: int):
+    latencies = []
+    started = time.perf_counter()
+
+    async def one():
+        # All requests arrive at once, so latency includes time spent queued
+        await handler(target)
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return concurrency / elapsed, p99
+
+
+async def main(latency_ms: float):
+    client = MemoryFirestoreClient(indexed_fields=["patient_id"], latency_ms=latency_ms)
+    db = AsyncFirestore(client)
+    print(f"Simulated Firestore latency: {latency_ms:.0f} ms")
+    print(f"{'concurrency':>11} | {'mode':>8} | {'req/s':>9} | {'p99 ms':>9}")
+    for concurrency in CONCURRENCY_LEVELS:
+        for mode, handler, target in (("blocking", _blocking_handler, client), ("async", _async_handler, db)):
+            rps, p99 = await _run(handler, target, concurrency)
+            print(f"{concurrency:>11} | {mode:>8} | {rps:>9.1f} | {p99 * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    asyncio.run(main(latency))
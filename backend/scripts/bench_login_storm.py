@@ -0,0 +1,99 @@
+"""
+Benchmark: bcrypt on the event loop vs. on the password hashing pool.
+Runs the app in-process on the in-memory Firestore stand-in, fires a burst
+of concurrent logins, and meanwhile polls /health (an unrelated endpoint)
+one request after another. Reports login throughput and /health tail
+latency with password verification blocking the loop (the old data path)
+and offloaded to PASSWORD_HASH_WORKERS threads.
+
+Usage: python backend/scripts/bench_login_storm.py [logins]
+"""
+
+import sys
+import os
+import time
+import asyncio
+import logging
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+
+import httpx
+from backend.main import app
+from backend.core.config import settings
+from backend.core import security
+from backend.routes import auth
+
+PASSWORD = "storm-password-1"
+HEALTH_INTERVAL = 0.01  # Seconds between /health requests
+
+
+async def _blocking_verify(plain_password: str, hashed_password: str):
+    """Verification on the event loop, as login did before the hashing pool."""
+    return security.verify_and_update_password(plain_password, hashed_password)
+
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def _storm(client: httpx.AsyncClient, logins: int):
+    health_latencies = []
+    done = asyncio.Event()
+
+    async def poll_health():
+        while not done.is_set():
+            # Latency counts from when the request was due, so time the loop
+            # was too busy to even send it is included
+            due = time.perf_counter() + HEALTH_INTERVAL
+            await asyncio.sleep(HEALTH_INTERVAL)
+            await client.get("/health")
+            health_latencies.append(time.perf_counter() - due)
+
+    async def login(i: int):
+        response = await client.post("/auth/login", json={"email": f"storm{i}@example.com", "password": PASSWORD})
+        response.raise_for_status()
+
+    poller = asyncio.create_task(poll_health())
+    await asyncio.sleep(0.05)  # Let the poller get going before the storm
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await poller
+    return logins / elapsed, health_latencies
+
+
+async def main(logins: int):
+    logging.disable(logging.INFO)  # Per-request logs would dominate the output
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(logins):
+            response = await client.post("/auth/register", json={
+                "email": f"storm{i}@example.com", "password": PASSWORD,
+                "full_name": f"Storm User {i}", "role": "patient",
+            })
+            response.raise_for_status()
+
+        print(f"{logins} concurrent logins, bcrypt rounds {settings.BCRYPT_ROUNDS}, "
+              f"{settings.PASSWORD_HASH_WORKERS} hashing thread(s)")
+        print(f"{'mode':>9} | {'logins/s':>8} | {'health n':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'max ms':>8}")
+        offloaded = auth.averify_and_update_password
+        for mode, verify in (("blocking", _blocking_verify), ("offloaded", offloaded)):
+            auth.averify_and_update_password = verify
+            try:
+                rate, latencies = await _storm(client, logins)
+            finally:
+                auth.averify_and_update_password = offloaded
+            print(f"{mode:>9} | {rate:>8.1f} | {len(latencies):>8} | {_percentile(latencies, 0.5) * 1000:>8.1f} | "
+                  f"{_percentile(latencies, 0.99) * 1000:>8.1f} | {max(latencies) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 16))
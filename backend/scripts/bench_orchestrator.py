@@ -0,0 +1,88 @@
+"""
+Benchmark: per-request CrewAI crews kicked off on the event loop vs. the
+async orchestrator API with prebuilt crews.
+A deterministic fake LLM stands in for CrewAI: building a crew and each
+kickoff take a fixed amount of time, so the numbers are reproducible and
+no API key is needed.
+
+Usage: python backend/scripts/bench_orchestrator.py [requests] [llm_latency_ms] [crew_build_ms]
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+from backend.core.orchestrator import MedicalSchedulerOrchestrator
+
+CONCURRENCY_LEVELS = [1, 4, 16]
+
+
+class FakeLLMCrew:
+    """Crew stand-in whose kickoff blocks for a fixed LLM latency."""
+
+    def __init__(self, agent_type: str, llm_latency_s: float, build_s: float):
+        time.sleep(build_s)  # Agent/Task/Crew construction
+        self.agent_type = agent_type
+        self.llm_latency_s = llm_latency_s
+
+    def kickoff(self, inputs=None):
+        time.sleep(self.llm_latency_s)
+        return f"[{self.agent_type}] done: {(inputs or {}).get('task', '')}"
+
+
+async def _run(handler, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    started = time.perf_counter()
+
+    async def one(i):
+        async with semaphore:
+            await handler(i)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return requests / elapsed, p50, p99
+
+
+async def main(requests: int, llm_latency_ms: float, crew_build_ms: float):
+    llm_latency_s, build_s = llm_latency_ms / 1000, crew_build_ms / 1000
+
+    def factory(agent_type: str):
+        return FakeLLMCrew(agent_type, llm_latency_s, build_s)
+
+    async def per_request_crew(i):
+        # The old data path: build a fresh crew and block the loop on kickoff
+        crew = factory("booking")
+        crew.kickoff(inputs={"task": f"Book appointment {i}"})
+
+    print(f"{requests} requests, fake LLM latency {llm_latency_ms:.0f} ms, crew build {crew_build_ms:.0f} ms")
+    print(f"{'concurrency':>11} | {'mode':>12} | {'req/s':>8} | {'p50 ms':>8} | {'p99 ms':>8}")
+    for concurrency in CONCURRENCY_LEVELS:
+        orchestrator = MedicalSchedulerOrchestrator(
+            crew_factory=factory, max_concurrency=concurrency, max_workers=concurrency, timeout=60
+        )
+
+        async def pooled(i):
+            await orchestrator.aexecute("booking", f"Book appointment {i}", {"action": "book"})
+
+        for mode, handler in (("per-request", per_request_crew), ("aexecute", pooled)):
+            rps, p50, p99 = await _run(handler, requests, concurrency)
+            print(f"{concurrency:>11} | {mode:>12} | {rps:>8.1f} | {p50 * 1000:>8.1f} | {p99 * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    build = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    asyncio.run(main(total, latency, build))
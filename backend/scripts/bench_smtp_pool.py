@@ -0,0 +1,112 @@
+"""
+Benchmark: a new SMTP connection per message vs. the pooled SMTP sessions.
+Runs against a local aiosmtpd stand-in (pip install aiosmtpd) that requires
+AUTH and can add a fixed delay to each server reply to mimic a remote relay,
+then reports throughput in messages/second.
+
+Usage: python backend/scripts/bench_smtp_pool.py [messages] [threads] [reply_latency_ms]
+"""
+
+import sys
+import os
+import time
+import smtplib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    print("aiosmtpd is required for this benchmark: pip install aiosmtpd")
+    sys.exit(1)
+
+from backend.core.smtp_pool import SMTPConnectionPool
+
+HOST = "127.0.0.1"
+PORT = 8025
+USER = "bench"
+PASSWORD = "bench-password"
+
+
+class SlowRelayHandler:
+    """Accepts every message, delaying handshake and data replies."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency_s)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency_s)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def _authenticator(server, session, envelope, mechanism, auth_data):
+    ok = auth_data.login == USER.encode() and auth_data.password == PASSWORD.encode()
+    return AuthResult(success=ok)
+
+
+def _message(i: int) -> MIMEText:
+    msg = MIMEText(f"Reminder {i}: your appointment is tomorrow at 10:00 AM.")
+    msg["Subject"] = f"Appointment reminder {i}"
+    msg["From"] = "clinic@medscheduler.test"
+    msg["To"] = f"patient{i}@medscheduler.test"
+    return msg
+
+
+def _send_unpooled(i: int):
+    """The old data path: connect, authenticate and quit for every message."""
+    with smtplib.SMTP(HOST, PORT) as server:
+        server.ehlo()
+        server.login(USER, PASSWORD)
+        server.send_message(_message(i))
+
+
+def _run(send, messages: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(send, range(messages)))
+    return messages / (time.perf_counter() - started)
+
+
+def main(messages: int, threads: int, latency_ms: float):
+    # aiosmtpd logs a deprecation warning about its own internals on every AUTH
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    handler = SlowRelayHandler(latency_ms / 1000)
+    controller = Controller(
+        handler, hostname=HOST, port=PORT,
+        authenticator=_authenticator, auth_require_tls=False,
+    )
+    controller.start()
+    try:
+        pool = SMTPConnectionPool(HOST, PORT, USER, PASSWORD, starttls=False, size=threads)
+        print(f"{messages} messages, {threads} sender threads, {latency_ms:.0f} ms relay reply latency")
+        print(f"{'mode':>10} | {'msg/s':>9}")
+        print(f"{'unpooled':>10} | {_run(_send_unpooled, messages, threads):>9.1f}")
+        print(f"{'pooled':>10} | {_run(lambda i: pool.send_message(_message(i)), messages, threads):>9.1f}")
+        pool.close()
+        print(f"pool stats: {pool.stats}")
+        print(f"messages received by relay (both modes): {handler.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    main(total, workers, latency)
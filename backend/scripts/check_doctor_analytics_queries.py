@@ -0,0 +1,96 @@
+"""
+Regression check: the doctor dashboard's query count must not grow with
+the number of appointments.
+
+Seeds a doctor with an increasing number of confirmed appointments (a third
+of them with a questionnaire) in the in-memory Firestore stand-in and counts
+the queries one dashboard load issues. Appointments stored before
+has_questionnaire was maintained cost one batched "in" query per 30, and the
+dashboard doesn't write, until the reconcile job's backfill has flagged them.
+
+Usage: python backend/scripts/check_doctor_analytics_queries.py
+"""
+
+import sys
+import os
+import math
+import asyncio
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+from backend.core.firestore_client import AsyncFirestore
+from backend.core.memory_firestore import MemoryFirestoreClient
+from backend.routes.analytics import IN_QUERY_LIMIT, _get_doctor_analytics
+from backend.workers.reconcile_counters import _flag_appointments, backfill_questionnaire_flags
+
+APPOINTMENT_COUNTS = [10, 100, 1000]
+
+
+def _seed(client: MemoryFirestoreClient, count: int, flagged: bool) -> int:
+    """Create count confirmed appointments for doctor d1; returns how many have a questionnaire."""
+    answered = 0
+    for i in range(count):
+        has_questionnaire = i % 3 == 0
+        appointment = {"doctor_id": "d1", "patient_id": f"p{i}", "status": "confirmed", "date": "2026-01-01"}
+        if flagged:
+            appointment["has_questionnaire"] = has_questionnaire
+        client.collection("appointments").document(f"a{i}").set(appointment)
+        if has_questionnaire:
+            client.collection("questionnaires").document(f"q{i}").set({"appointment_id": f"a{i}"})
+            answered += 1
+    return answered
+
+
+async def _load(db: AsyncFirestore, client: MemoryFirestoreClient):
+    client.reset_stats()
+    result = await _get_doctor_analytics(db, "d1")
+    return result, client.stats["queries"]
+
+
+async def main() -> bool:
+    ok = True
+    print(f"{'appointments':>12} | {'flagged':>7} | {'1st load':>8} | {'2nd load':>8} | {'backfilled':>10} | reviews")
+    for flagged in (True, False):
+        for count in APPOINTMENT_COUNTS:
+            client = MemoryFirestoreClient(indexed_fields=["doctor_id", "appointment_id"])
+            db = AsyncFirestore(client)
+            answered = _seed(client, count, flagged)
+            first, first_queries = await _load(db, client)
+            writes = client.stats["writes"]
+            second, second_queries = await _load(db, client)
+            writes += client.stats["writes"]
+            await backfill_questionnaire_flags(db, page_size=500, dry_run=False)
+            third, third_queries = await _load(db, client)
+            print(f"{count:>12} | {str(flagged):>7} | {first_queries:>8} | {second_queries:>8} | "
+                  f"{third_queries:>10} | {first['pending_reviews']}")
+
+            expected = 1 if flagged else 1 + math.ceil(count / IN_QUERY_LIMIT)
+            if (first_queries, second_queries, third_queries) != (expected, expected, 1):
+                print(f"  FAIL: expected {expected}, {expected} then 1 queries")
+                ok = False
+            if writes:
+                print(f"  FAIL: dashboard loads wrote {writes} document(s)")
+                ok = False
+            if any(result["pending_reviews"] != answered for result in (first, second, third)):
+                print(f"  FAIL: expected {answered} pending reviews")
+                ok = False
+
+    # A questionnaire created after the backfill scanned questionnaires has
+    # already flagged its appointment; the backfill must not clear the flag
+    client = MemoryFirestoreClient(indexed_fields=["doctor_id", "appointment_id"])
+    db = AsyncFirestore(client)
+    appointment_ref = db.collection("appointments").document("late")
+    await appointment_ref.set({"doctor_id": "d1", "status": "confirmed", "has_questionnaire": True})
+    await db.run_transaction(_flag_appointments, [appointment_ref.sync], set())
+    if not (await appointment_ref.get()).to_dict()["has_questionnaire"]:
+        print("FAIL: backfill cleared the flag of a questionnaire created during the scan")
+        ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,131 @@
+"""
+Check: the response cache works on RedisStore, the store used with
+RESPONSE_CACHE_BACKEND=redis.
+
+Runs ResponseCache over RedisStore with a small in-process fake of the
+redis.asyncio calls it makes (GET, SET with EX, MGET, INCR), so no Redis
+server is needed. Checks that a response is computed once and then served
+from Redis, that bumping a tag makes readers miss, that an expired entry
+is served stale while one background refresh runs, that entries are
+given a Redis expiry, and that results rejected by cacheable() aren't stored.
+
+Usage: python backend/scripts/check_response_cache_redis.py
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+from backend.core.response_cache import RedisStore, ResponseCache
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis (decode_responses=True) that RedisStore uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.commands = 0
+
+    def _live(self, key):
+        if key in self.expires and time.monotonic() >= self.expires[key]:
+            self.values.pop(key, None)
+            del self.expires[key]
+        return self.values.get(key)
+
+    async def get(self, key):
+        self.commands += 1
+        return self._live(key)
+
+    async def set(self, key, value, ex=None):
+        self.commands += 1
+        assert isinstance(ex, int) and ex > 0, f"EX must be a positive integer, got {ex!r}"
+        self.values[key] = value
+        self.expires[key] = time.monotonic() + ex
+
+    async def mget(self, keys):
+        self.commands += 1
+        return [self._live(key) for key in keys]
+
+    async def incr(self, key):
+        self.commands += 1
+        value = int(self._live(key) or 0) + 1
+        self.values[key] = str(value)
+        return value
+
+
+def _check(ok: bool, what: str) -> bool:
+    print(f"{'ok  ' if ok else 'FAIL'} {what}")
+    return ok
+
+
+async def main() -> bool:
+    redis = FakeRedis()
+    cache = ResponseCache(RedisStore(redis, prefix="test:"))
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        await asyncio.sleep(0.01)
+        return {"count": len(computed)}
+
+    async def read(ttl=10.0, stale_ttl=0.0):
+        return await cache.get_or_compute("dashboard", {"user": "u1"}, ["analytics:u1"], compute, ttl, stale_ttl)
+
+    ok = True
+    first = await asyncio.gather(*(read() for _ in range(5)))
+    ok &= _check(len(computed) == 1 and all(value == {"count": 1} for value in first),
+                 "concurrent misses share one computation")
+    ok &= _check(await read() == {"count": 1} and cache.stats["hits"] == 1, "second read is a Redis hit")
+    ok &= _check(any(key.startswith("test:dashboard:") for key in redis.values), "entries use the key prefix")
+
+    await cache.invalidate("analytics:u1", "analytics:u1")
+    ok &= _check(redis.values.get("test:gen:analytics:u1") == "1", "invalidate bumps each tag once")
+    ok &= _check(await read() == {"count": 2}, "read after invalidation recomputes")
+
+    # Fresh for 0.05s, then stale for 2s
+    await cache.invalidate("analytics:u1")
+    await read(ttl=0.05, stale_ttl=2)
+    await asyncio.sleep(0.1)
+    stale = await read(ttl=0.05, stale_ttl=2)
+    await asyncio.sleep(0.05)
+    ok &= _check(stale == {"count": 3} and cache.stats["stale_hits"] == 1, "expired entry is served stale")
+    ok &= _check(len(computed) == 4 and await read(ttl=0.05, stale_ttl=2) == {"count": 4},
+                 "stale read refreshed the entry in the background")
+
+    # Redis drops the entry once fresh + stale time has passed (EX is rounded up to whole seconds)
+    await cache.invalidate("analytics:u1")
+    before = set(redis.values)
+    await read(ttl=0.1, stale_ttl=0)
+    written = set(redis.values) - before
+    await asyncio.sleep(1.1)
+    ok &= _check(len(written) == 1 and redis._live(written.pop()) is None, "entries expire in Redis")
+
+    # Degraded results (e.g. a dashboard with timed-out branches) are not stored
+    partial_reads = []
+
+    async def compute_partial():
+        partial_reads.append(1)
+        return {"partial": True}
+
+    def read_partial():
+        return cache.get_or_compute("partial", {}, [], compute_partial, 10, 10,
+                                    cacheable=lambda result: not result.get("partial"))
+
+    await read_partial()
+    await read_partial()
+    ok &= _check(len(partial_reads) == 2 and cache.stats["uncacheable"] == 2, "uncacheable results are not stored")
+
+    print(f"{redis.commands} Redis commands, stats: {cache.stats}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,161 @@
+"""
+Load test the API in-process against the in-memory Firestore backend.
+Seeds doctors and patients, then drives each endpoint at a fixed concurrency
+and reports throughput, latency percentiles and Firestore work per request.
+No Firebase project or network is needed.
+
+Usage: python backend/scripts/load_test.py [requests_per_endpoint] [concurrency] [latency_ms]
+"""
+
+import sys
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+# Add project root to path (parent of backend directory)
+current_dir = os.path.dirname(os.path.abspath(__file__))  # backend/scripts
+backend_dir = os.path.dirname(current_dir)  # backend
+project_root = os.path.dirname(backend_dir)  # project root
+sys.path.insert(0, project_root)
+
+# Select the in-memory datastore before any backend module reads settings
+os.environ["FIRESTORE_BACKEND"] = "memory"
+if len(sys.argv) > 3:
+    os.environ["MEMORY_FIRESTORE_LATENCY_MS"] = sys.argv[3]
+
+import logging
+import httpx
+from backend.main import app
+from backend.core.firestore_client import get_firestore
+from backend.core.security import create_access_token, get_password_hash
+
+PATIENT_COUNT = 50
+PASSWORD = "Patient@123"
+SPECIALTIES = ["Cardiologist", "General Physician", "Neurologist", "Dermatologist"]
+
+
+def seed(db):
+    """Create doctors and patients directly in the datastore."""
+    password_hash = get_password_hash(PASSWORD)
+    doctors = []
+    for i, specialty in enumerate(SPECIALTIES * 2):
+        ref = db.collection("users").document()
+        ref.set({
+            "email": f"doctor{i}@medscheduler-loadtest.com",
+            "password_hash": password_hash,
+            "full_name": f"Dr. Load {i}",
+            "role": "doctor",
+            "specialty": specialty,
+            "created_at": datetime.utcnow(),
+        })
+        doctors.append((ref.id, f"Dr. Load {i}", specialty))
+    patients = []
+    for i in range(PATIENT_COUNT):
+        ref = db.collection("users").document()
+        ref.set({
+            "email": f"patient{i}@medscheduler-loadtest.com",
+            "password_hash": password_hash,
+            "full_name": f"Patient {i}",
+            "role": "patient",
+            "created_at": datetime.utcnow(),
+        })
+        patients.append((ref.id, f"Patient {i}", f"patient{i}@medscheduler-loadtest.com"))
+    return doctors, patients
+
+
+def _token(user_id: str, role: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id, 'role': role})}"}
+
+
+async def run_endpoint(client, db, name, make_request, total: int, concurrency: int):
+    """Issue `total` requests with bounded concurrency and print a summary line."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    db.reset_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stats = dict(db.stats)
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(
+        f"{name:<28} {total / elapsed:>8.1f} {pct(0.5):>8.1f} {pct(0.99):>8.1f} "
+        f"{stats['round_trips'] / total:>7.1f} {stats['queries'] / total:>7.1f} "
+        f"{stats['documents_scanned'] / total:>8.1f} {errors:>6}"
+    )
+
+
+async def main(total: int, concurrency: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    db = get_firestore()
+    doctors, patients = seed(db)
+    date = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+    times = ["9:00 AM", "9:30 AM", "10:00 AM", "10:30 AM", "11:00 AM", "11:30 AM", "12:00 PM"]
+
+    async def book(client, i):
+        patient_id, patient_name, _ = patients[i % len(patients)]
+        doctor_id, doctor_name, specialty = doctors[i % len(doctors)]
+        return await client.post("/api/book", headers=_token(patient_id, "patient"), json={
+            "patient_id": patient_id,
+            "doctor_id": doctor_id,
+            "doctor_name": doctor_name,
+            "patient_name": patient_name,
+            "date": date,
+            "time": times[(i // len(doctors)) % len(times)],
+            "specialty": specialty,
+        })
+
+    async def slots(client, i):
+        patient_id = patients[i % len(patients)][0]
+        return await client.get("/api/slots", params={"date": date}, headers=_token(patient_id, "patient"))
+
+    async def appointments(client, i):
+        patient_id = patients[i % len(patients)][0]
+        return await client.get("/api/appointments", headers=_token(patient_id, "patient"))
+
+    async def doctor_dashboard(client, i):
+        doctor_id = doctors[i % len(doctors)][0]
+        return await client.get("/api/analytics/dashboard", headers=_token(doctor_id, "doctor"))
+
+    async def admin_dashboard(client, i):
+        return await client.get("/api/analytics/dashboard", headers=_token("loadtest-admin", "admin"))
+
+    async def reminder_logs(client, i):
+        patient_id = patients[i % len(patients)][0]
+        return await client.get("/api/reminder/logs", headers=_token(patient_id, "patient"))
+
+    async def login(client, i):
+        email = patients[i % len(patients)][2]
+        return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+    print(f"{'endpoint':<28} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'rt/req':>7} {'q/req':>7} {'scan/req':>8} {'errors':>6}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        await run_endpoint(client, db, "POST /api/book", book, total, concurrency)
+        await run_endpoint(client, db, "GET /api/slots", slots, total, concurrency)
+        await run_endpoint(client, db, "GET /api/appointments", appointments, total, concurrency)
+        await run_endpoint(client, db, "GET /api/reminder/logs", reminder_logs, total, concurrency)
+        await run_endpoint(client, db, "GET dashboard (doctor)", doctor_dashboard, total, concurrency)
+        await run_endpoint(client, db, "GET dashboard (admin)", admin_dashboard, total, concurrency)
+        await run_endpoint(client, db, "POST /auth/login", login, max(1, total // 10), concurrency)
+
+
+if __name__ == "__main__":
+    requests_per_endpoint = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency_level = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(requests_per_endpoint, concurrency_level))
@@ -13,6 +13,9 @@ project_root = os.path.dirname(backend_dir)  # project root
 sys.path.insert(0, project_root)
 
 from backend.core.firestore_client import get_firestore, initialize_firebase
+from backend.core.counters import created_deltas, stage_counters
+from backend.core.doctor_directory import bump_version
+from backend.core.email_index import EMAIL_INDEX_COLLECTION, index_entry, normalize_email
 from datetime import datetime
 import logging
 
@@ -211,13 +214,25 @@ def seed_doctors():
                 "updated_at": datetime.utcnow()
             }
             
-            users_ref.document().set(doctor_user)
+            batch = db.batch()
+            doctor_ref = users_ref.document()
+            batch.set(doctor_ref, doctor_user)
+            batch.set(
+                db.collection(EMAIL_INDEX_COLLECTION).document(normalize_email(doctor_data["email"])),
+                index_entry(doctor_ref.id)
+            )
+            stage_counters(batch, db, created_deltas("users", "doctor"))
+            batch.commit()
             logger.info(f"Created doctor: {doctor_data['full_name']} ({doctor_data['specialty']})")
             created_count += 1
             
         except Exception as e:
             logger.error(f"Error creating doctor {doctor_data['full_name']}: {str(e)}")
     
+    if created_count:
+        # Running servers reload their doctor directory
+        bump_version(db)
+    
     logger.info(f"\n✅ Seeding complete!")
     logger.info(f"   Created: {created_count} doctors")
     logger.info(f"   Skipped: {skipped_count} doctors (already exist)")
@@ -0,0 +1,2 @@
+# Offline workers package
+
@@ -0,0 +1,197 @@
+"""
+Rebuild the dashboard counters from scratch and report drift.
+
+The sharded counters (core/counters.py) are maintained incrementally, so
+writes that bypass the routes (seed scripts, console edits, a crash between
+requests) make them drift. This job recounts appointments, users, reminders
+and questionnaires page by page, compares the totals with the counter
+shards, and, unless --dry-run, writes the difference as one correcting
+increment. The daily appointment rollups are recounted the same way and
+rewritten where they differ, which also backfills them for appointments
+booked before they existed. Writes that land while the scan runs can show
+up as small drift; the next run evens it out.
+
+It also stores has_questionnaire on appointments from before the flag was
+maintained, so the doctor dashboard stops looking their questionnaires up.
+
+Usage: python -m backend.workers.reconcile_counters [--page-size N] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+from backend.core.counters import (
+    ROLLUPS_COLLECTION, aggregate_shards, rollup_day, rollup_id, stage_counters
+)
+from backend.core.firestore_client import get_async_firestore, get_in_transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Collection -> (field counted per value, default when the field is missing),
+# matching how the dashboards have always bucketed documents
+COUNTED_COLLECTIONS: Dict[str, Optional[Tuple[str, str]]] = {
+    "appointments": ("status", "pending"),
+    "users": ("role", "patient"),
+    "reminders": ("status", "scheduled"),
+    "questionnaires": None,
+}
+# Firestore write batches hold at most 500 operations
+MAX_BATCH_WRITES = 500
+
+
+async def _scan(db, collection: str, page_size: int) -> AsyncIterator[Any]:
+    """Yield every document of a collection, one page at a time in ID order."""
+    collection_ref = db.collection(collection)
+    last_ref = None
+    while True:
+        query = collection_ref.order_by("__name__")
+        if last_ref is not None:
+            query = query.where("__name__", ">", last_ref)
+        docs = await query.limit(page_size).get()
+        for doc in docs:
+            yield doc
+        if len(docs) < page_size:
+            return
+        last_ref = collection_ref.document(docs[-1].id).sync
+
+
+async def count_collection(db, collection: str, page_size: int) -> Dict[str, int]:
+    """Count a collection's documents, in total and per status or role."""
+    bucket = COUNTED_COLLECTIONS[collection]
+    counts = {f"{collection}_total": 0}
+    async for doc in _scan(db, collection, page_size):
+        counts[f"{collection}_total"] += 1
+        if bucket:
+            field, default = bucket
+            value = doc.to_dict().get(field) or default
+            counts[f"{collection}_{value}"] = counts.get(f"{collection}_{value}", 0) + 1
+    return counts
+
+
+async def reconcile_rollups(db, page_size: int, dry_run: bool) -> int:
+    """Recount the daily appointment rollups and rewrite the ones that differ; returns how many."""
+    actual: Dict[str, Dict[str, Any]] = {}
+    async for doc in _scan(db, "appointments", page_size):
+        data = doc.to_dict()
+        day = rollup_day(data.get("created_at"))
+        if day is None:
+            continue
+        doctor_id = data.get("doctor_id", "")
+        rollup = actual.setdefault(rollup_id(day, doctor_id), {"day": day, "doctor_id": doctor_id, "by_specialty": {}})
+        specialty = data.get("specialty") or "General"
+        rollup["by_specialty"][specialty] = rollup["by_specialty"].get(specialty, 0) + 1
+
+    stored = {doc.id: doc.to_dict() async for doc in _scan(db, ROLLUPS_COLLECTION, page_size)}
+    rollups_ref = db.collection(ROLLUPS_COLLECTION)
+    changed = [
+        rollup_key for rollup_key in sorted(set(actual) | set(stored))
+        if (stored.get(rollup_key) or {}).get("by_specialty") != (actual.get(rollup_key) or {}).get("by_specialty")
+    ]
+    for rollup_key in changed:
+        logger.warning(
+            f"Rollup drift: {rollup_key} is {(stored.get(rollup_key) or {}).get('by_specialty')}, "
+            f"actual {(actual.get(rollup_key) or {}).get('by_specialty')}"
+        )
+    if not dry_run:
+        for start in range(0, len(changed), MAX_BATCH_WRITES):
+            batch = db.batch()
+            for rollup_key in changed[start:start + MAX_BATCH_WRITES]:
+                if rollup_key in actual:
+                    batch.set(rollups_ref.document(rollup_key), actual[rollup_key])
+                else:
+                    batch.delete(rollups_ref.document(rollup_key))
+            await batch.commit()
+    return len(changed)
+
+
+def _flag_appointments(transaction, appointment_refs, answered: Set[str]) -> int:
+    """
+    Set has_questionnaire on the appointments that still lack it. Creating a
+    questionnaire sets the flag on its appointment, so one created since the
+    questionnaires were scanned either shows up here or conflicts and retries.
+    """
+    snapshots = [get_in_transaction(transaction, ref) for ref in appointment_refs]
+    flagged = 0
+    for ref, snapshot in zip(appointment_refs, snapshots):
+        if snapshot.exists and "has_questionnaire" not in (snapshot.to_dict() or {}):
+            transaction.update(ref, {"has_questionnaire": ref.id in answered})
+            flagged += 1
+    return flagged
+
+
+async def backfill_questionnaire_flags(db, page_size: int, dry_run: bool) -> int:
+    """Store has_questionnaire on appointments missing it; returns how many were missing."""
+    answered = {doc.to_dict().get("appointment_id") async for doc in _scan(db, "questionnaires", page_size)}
+    unflagged = [
+        doc.id async for doc in _scan(db, "appointments", page_size)
+        if "has_questionnaire" not in doc.to_dict()
+    ]
+    if unflagged:
+        logger.warning(f"{len(unflagged)} appointment(s) have no has_questionnaire flag")
+    if not dry_run:
+        appointments_ref = db.collection("appointments")
+        for start in range(0, len(unflagged), MAX_BATCH_WRITES):
+            refs = [appointments_ref.document(appointment_id).sync
+                    for appointment_id in unflagged[start:start + MAX_BATCH_WRITES]]
+            await db.run_transaction(_flag_appointments, refs, answered)
+    return len(unflagged)
+
+
+async def run(page_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Recount every counted collection and correct the counters.
+
+    Returns:
+        Drift per counter field (actual count minus counter value)
+    """
+    db = get_async_firestore()
+    started = time.monotonic()
+
+    actual: Dict[str, int] = {}
+    for collection in COUNTED_COLLECTIONS:
+        actual.update(await count_collection(db, collection, page_size))
+    counters = await aggregate_shards(db)
+
+    prefixes = tuple(f"{collection}_" for collection in COUNTED_COLLECTIONS)
+    fields = set(actual) | {field for field in counters if field.startswith(prefixes)}
+    drift = {
+        field: actual.get(field, 0) - counters.get(field, 0)
+        for field in sorted(fields)
+        if actual.get(field, 0) != counters.get(field, 0)
+    }
+
+    for field, amount in drift.items():
+        logger.warning(
+            f"Counter drift: {field} is {counters.get(field, 0)}, actual {actual.get(field, 0)} ({amount:+d})"
+        )
+    if drift and not dry_run:
+        batch = db.batch()
+        stage_counters(batch, db, drift)
+        await batch.commit()
+    rollups_changed = await reconcile_rollups(db, page_size, dry_run)
+    unflagged = await backfill_questionnaire_flags(db, page_size, dry_run)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Counter reconciliation {'dry run ' if dry_run else ''}finished in {elapsed:.1f}s: "
+        f"{len(drift)} field(s) and {rollups_changed} rollup(s) drifted, "
+        f"{unflagged} appointment(s) without has_questionnaire"
+        f"{'' if dry_run or not (drift or rollups_changed or unflagged) else ', corrected'}"
+    )
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount the dashboard counters and rollups and correct drift.")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without correcting it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args.page_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
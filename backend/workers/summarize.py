@@ -0,0 +1,188 @@
+"""
+Offline bulk summarization of questionnaires.
+
+Pages through questionnaires in document ID order and summarizes every one
+with clinical answers whose summary is missing or stale (its summary_hash
+doesn't match the current answers), so summaries are ready before clinic
+hours instead of being generated while a doctor waits.
+
+- Gemini calls run with bounded parallelism and a rate limit, on top of the
+  LLM gateway's own limits.
+- Each page's summaries are written in one batched write, together with the
+  checkpoint, so a restarted run resumes after the last committed page.
+- Questionnaires whose Gemini call fails are left for the next run.
+
+Usage: python -m backend.workers.summarize [--page-size N] [--concurrency N]
+           [--rate PER_SECOND] [--restart] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from backend.core.config import settings
+from backend.core.firestore_client import get_async_firestore
+from backend.core.llm_gateway import LLMUnavailable
+from backend.agents.previsit_agent import (
+    asummarize_questionnaire, has_clinical_content, questionnaire_hash, summary_is_current
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_COLLECTION = "worker_checkpoints"
+CHECKPOINT_ID = "summarize_questionnaires"
+# Firestore write batches hold at most 500 operations (one is the checkpoint)
+MAX_BATCH_WRITES = 499
+
+
+class RateLimiter:
+    """Spaces out acquire() calls to at most rate per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def needs_summary(questionnaire_doc: Dict[str, Any]) -> bool:
+    """Whether a questionnaire has answers and no summary made from them."""
+    if not has_clinical_content(questionnaire_doc):
+        return False
+    # Summaries stored before hashing are refreshed too
+    return not (summary_is_current(questionnaire_doc) and questionnaire_doc.get("summary_hash"))
+
+
+async def _summarize_page(
+    docs: List[Any], semaphore: asyncio.Semaphore, limiter: RateLimiter
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+    """Summarize the questionnaires of one page that need it; returns (updates, failures)."""
+
+    async def summarize(doc) -> Optional[Tuple[str, Dict[str, Any]]]:
+        data = doc.to_dict()
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                summary = await asummarize_questionnaire(data, fallback=False)
+            except LLMUnavailable as e:
+                logger.warning(f"Summary for questionnaire {doc.id} failed: {e}")
+                return None
+        return doc.id, {
+            "summary": summary,
+            "summary_hash": questionnaire_hash(data),
+            "summarized_at": datetime.now(timezone.utc),
+        }
+
+    results = await asyncio.gather(*(summarize(doc) for doc in docs))
+    updates = [result for result in results if result is not None]
+    return updates, len(results) - len(updates)
+
+
+async def run(
+    page_size: int = settings.SUMMARY_WORKER_PAGE_SIZE,
+    concurrency: int = settings.SUMMARY_WORKER_CONCURRENCY,
+    rate: float = settings.SUMMARY_WORKER_RATE_PER_SECOND,
+    restart: bool = False,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Summarize every questionnaire that needs it, resuming from the checkpoint.
+
+    Returns:
+        Counts for this run: scanned, stale, summarized, failed, pages
+    """
+    db = get_async_firestore()
+    questionnaires_ref = db.collection("questionnaires")
+    checkpoint_ref = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_ID)
+    page_size = min(page_size, MAX_BATCH_WRITES)
+
+    last_id = None
+    if not restart:
+        checkpoint = await checkpoint_ref.get()
+        if checkpoint.exists:
+            last_id = checkpoint.to_dict().get("last_id")
+    if last_id:
+        logger.info(f"Resuming after questionnaire {last_id}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    totals = {"scanned": 0, "stale": 0, "summarized": 0, "failed": 0, "pages": 0}
+    started = time.monotonic()
+
+    while True:
+        query = questionnaires_ref.order_by("__name__")
+        if last_id:
+            query = query.where("__name__", ">", questionnaires_ref.document(last_id).sync)
+        docs = await query.limit(page_size).get()
+        if not docs:
+            break
+
+        stale = [doc for doc in docs if needs_summary(doc.to_dict())]
+        updates, failed = await _summarize_page(stale, semaphore, limiter) if not dry_run else ([], 0)
+        last_id = docs[-1].id
+
+        totals["pages"] += 1
+        totals["scanned"] += len(docs)
+        totals["stale"] += len(stale)
+        totals["failed"] += failed
+        if not dry_run:
+            # The page's summaries and the checkpoint commit together
+            batch = db.batch()
+            for questionnaire_id, update in updates:
+                batch.update(questionnaires_ref.document(questionnaire_id), update)
+            batch.set(checkpoint_ref, {
+                "last_id": last_id,
+                "updated_at": datetime.now(timezone.utc),
+            }, merge=True)
+            await batch.commit()
+            totals["summarized"] += len(updates)
+
+        logger.info(
+            f"Page {totals['pages']}: {len(docs)} scanned, {len(stale)} stale, "
+            f"{len(updates)} summarized, {failed} failed (through {last_id})"
+        )
+        if len(docs) < page_size:
+            break
+
+    if not dry_run:
+        # A finished pass starts from the beginning next time
+        await checkpoint_ref.set({
+            "last_id": None,
+            "completed_at": datetime.now(timezone.utc),
+            "last_run": totals,
+        }, merge=True)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Summarization {'dry run ' if dry_run else ''}finished in {elapsed:.1f}s: "
+        f"{totals['scanned']} scanned, {totals['stale']} stale, "
+        f"{totals['summarized']} summarized, {totals['failed']} failed"
+    )
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize questionnaires with missing or stale summaries.")
+    parser.add_argument("--page-size", type=int, default=settings.SUMMARY_WORKER_PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.SUMMARY_WORKER_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=settings.SUMMARY_WORKER_RATE_PER_SECOND,
+                        help="Gemini calls started per second")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true", help="Count stale questionnaires without summarizing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args.page_size, args.concurrency, args.rate, args.restart, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()